@@ -1,9 +1,18 @@
 import configparser
+import os
 import sys
 
 def main():
     config = configparser.ConfigParser()
-    config.read("config.ini")
+    config.read(os.environ.get("BEE_CAM_CONFIG", "config.ini"))
+
+    backend = config["general"].get("backend", "hardware").strip().lower()
+    if backend == "sim":
+        # fake hardware modules have to be in place before utilities/ imports them
+        from utilities import sim
+        sim.install(config)
+        sim.start_replay(config)
+        print("Using simulated hardware backends...")
 
     mode = config["general"].get("mode", "camera").strip().lower()
 
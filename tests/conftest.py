@@ -0,0 +1,15 @@
+import logging
+import os
+import sys
+
+PACKAGE_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, PACKAGE_ROOT)
+
+# utilities.logger reads [general] log_level at import and only adds its
+# data/system.log handler if "Main" has none, so give it one first
+os.environ.setdefault("BEE_CAM_CONFIG", os.path.join(PACKAGE_ROOT, "setup", "example_config.ini"))
+logging.getLogger("Main").addHandler(logging.NullHandler())
+
+# fake hardware modules must be in place before utilities.sensors is imported
+from utilities import sim
+sim.install()
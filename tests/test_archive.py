@@ -0,0 +1,74 @@
+import os
+
+from utilities.archive import ShardWriter, ShardReader, rebuild_index, INDEX_EXT
+
+
+def shards(archive_dir):
+    return sorted(f for f in os.listdir(archive_dir) if f.endswith(".shard"))
+
+
+def test_frames_round_trip_through_the_reader(tmp_path):
+    writer = ShardWriter(str(tmp_path))
+    writer.open()
+    for i in range(5):
+        writer.append(f"frame_{i}.jpg", bytes([i]) * (100 + i))
+    writer.close()
+
+    with ShardReader(str(tmp_path)) as reader:
+        assert len(reader) == 5
+        assert reader.get("frame_3.jpg") == bytes([3]) * 103
+
+
+def test_rolls_to_a_new_shard_at_max_bytes(tmp_path):
+    writer = ShardWriter(str(tmp_path), max_bytes=250)
+    writer.open()
+    for i in range(6):
+        writer.append(f"frame_{i}.jpg", b"x" * 100)
+    writer.close()
+    assert shards(tmp_path) == ["shard_00000.shard", "shard_00001.shard"]
+
+
+def test_each_run_starts_a_new_shard(tmp_path):
+    for run in range(3):
+        writer = ShardWriter(str(tmp_path))
+        writer.open()
+        writer.append(f"frame_{run}.jpg", b"data")
+        writer.close()
+    assert shards(tmp_path) == ["shard_00000.shard", "shard_00001.shard", "shard_00002.shard"]
+
+
+def test_numbering_continues_after_older_shards_are_deleted(tmp_path):
+    for run in range(3):
+        writer = ShardWriter(str(tmp_path))
+        writer.open()
+        writer.append(f"frame_{run}.jpg", b"data")
+        writer.close()
+    for name in ("shard_00000", "shard_00001"):
+        os.remove(tmp_path / (name + ".shard"))
+        os.remove(tmp_path / (name + INDEX_EXT))
+
+    writer = ShardWriter(str(tmp_path))
+    writer.open()
+    writer.append("frame_new.jpg", b"new")
+    writer.close()
+    assert shards(tmp_path) == ["shard_00002.shard", "shard_00003.shard"]
+    with ShardReader(str(tmp_path)) as reader:
+        assert reader.get("frame_2.jpg") == b"data"
+        assert reader.get("frame_new.jpg") == b"new"
+
+
+def test_index_is_rebuilt_ignoring_a_partial_record(tmp_path):
+    writer = ShardWriter(str(tmp_path))
+    writer.open()
+    writer.append("a.jpg", b"aaaa")
+    writer.append("b.jpg", b"bbbbbb")
+    writer.close()
+    shard = tmp_path / "shard_00000.shard"
+    with open(shard, "ab") as f:
+        f.write(b"BCF1\x05") # crash in the middle of a header
+    os.remove(tmp_path / ("shard_00000" + INDEX_EXT))
+
+    entries = rebuild_index(str(shard))
+    assert [e[0] for e in entries] == ["a.jpg", "b.jpg"]
+    with ShardReader(str(tmp_path)) as reader:
+        assert reader.get("b.jpg") == b"bbbbbb"
@@ -0,0 +1,113 @@
+import threading
+import time
+
+from utilities.capture import FrameScheduler, CaptureWorker, AdaptiveRate, interpolate_log, parse_curve
+
+
+def test_scheduler_keeps_a_fixed_rate():
+    scheduler = FrameScheduler(0.05)
+    stop = threading.Event()
+    start = time.monotonic()
+    for _ in range(6):
+        assert scheduler.wait(stop)
+    # first frame is immediate, then five intervals
+    assert 0.24 <= time.monotonic() - start < 0.4
+    assert scheduler.stats()["frames"] == 6
+    assert scheduler.stats()["missed"] == 0
+
+
+def test_scheduler_skips_deadlines_it_fell_behind_on():
+    scheduler = FrameScheduler(0.05)
+    stop = threading.Event()
+    scheduler.wait(stop)
+    time.sleep(0.18) # a slow capture
+    scheduler.wait(stop)
+    assert scheduler.missed >= 2
+
+
+def test_set_stop_event_ends_the_wait():
+    scheduler = FrameScheduler(0.05)
+    stop = threading.Event()
+    stop.set()
+    assert not scheduler.wait(stop)
+
+
+def test_shorter_interval_wakes_a_waiting_worker():
+    scheduler = FrameScheduler(10)
+    stop = threading.Event()
+    scheduler.wait(stop)
+    threading.Timer(0.1, scheduler.set_interval, args=(0.3,)).start()
+    start = time.monotonic()
+    assert scheduler.wait(stop)
+    assert time.monotonic() - start < 1.0
+
+
+def test_stop_event_interrupts_the_wait():
+    scheduler = FrameScheduler(10, stop_poll=0.05)
+    stop = threading.Event()
+    scheduler.wait(stop)
+    threading.Timer(0.1, stop.set).start()
+    start = time.monotonic()
+    assert not scheduler.wait(stop)
+    assert time.monotonic() - start < 1.0
+
+
+def test_capture_worker_counts_frames_and_reports_errors():
+    stop = threading.Event()
+    calls = []
+
+    def capture():
+        calls.append(time.monotonic())
+        if len(calls) == 3:
+            raise RuntimeError("camera gone")
+
+    worker = CaptureWorker(capture, FrameScheduler(0.01), stop)
+    worker.start()
+    worker.join(2)
+    assert not worker.is_alive()
+    assert worker.count == 2
+    assert isinstance(worker.error, RuntimeError)
+
+
+def test_hung_reports_a_capture_that_has_not_returned():
+    stop = threading.Event()
+    release = threading.Event()
+    worker = CaptureWorker(lambda: release.wait(2), FrameScheduler(10), stop)
+    worker.start()
+    time.sleep(0.15)
+    assert worker.hung(0.1)
+    assert not worker.hung(5)
+    stop.set()
+    release.set()
+    worker.join(2)
+    assert not worker.hung(0.1)
+
+
+def test_interpolate_log_is_clamped():
+    curve = parse_curve("10:5, 1000:1")
+    assert interpolate_log(curve, 0) == 5
+    assert interpolate_log(curve, 100000) == 1
+    assert 1 < interpolate_log(curve, 100) < 5
+
+
+def test_adaptive_rate_ignores_changes_within_hysteresis():
+    rate = AdaptiveRate(1.0, parse_curve("10:10, 1000:1"), hysteresis=0.1)
+    interval, exposure = rate.update(5)
+    assert interval == 10
+    assert exposure is None
+    assert rate.update(6) == (None, None) # still clamped at 10
+    interval, _ = rate.update(1000)
+    assert interval == 1
+
+
+def test_adaptive_rate_uses_the_base_interval_during_activity():
+    rate = AdaptiveRate(1.0, parse_curve("10:10, 1000:1"), activity_boost=30)
+    assert rate.update(5, last_activity=time.monotonic() - 60) == (10, None)
+    interval, _ = rate.update(5, last_activity=time.monotonic())
+    assert interval == 1.0
+
+
+def test_adaptive_rate_caps_exposure_from_its_curve():
+    rate = AdaptiveRate(1.0, parse_curve("10:10, 1000:1"), exposure_curve=parse_curve("10:100000, 1000:1000"))
+    _, exposure = rate.update(1000)
+    assert exposure == 1000
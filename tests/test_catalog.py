@@ -0,0 +1,79 @@
+import sqlite3
+from datetime import datetime
+
+from utilities.catalog import FrameCatalog
+from utilities.pipeline import Frame
+
+
+def frame(seq):
+    f = Frame(seq, datetime(2026, 6, 1, 12, 0, 0, seq * 1000), None, {"ExposureTime": 1000, "AnalogueGain": 1.5}, 0.1, 42.0)
+    f.data = b"\xff\xd8" + bytes(seq)
+    return f
+
+
+def rows(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute("SELECT seq, path, exposure, gain, lux, size, activity FROM frames ORDER BY seq").fetchall()
+
+
+def test_rows_are_written_in_batches(tmp_path):
+    db_path = str(tmp_path / "day" / "catalog.db")
+    catalog = FrameCatalog(db_path, batch_size=3, flush_interval=3600)
+    catalog.open()
+    catalog.add(frame(0), "a.jpg")
+    catalog.add(frame(1), "b.jpg")
+    assert rows(db_path) == []
+    catalog.add(frame(2), "c.jpg")
+    assert [r[0] for r in rows(db_path)] == [0, 1, 2]
+    catalog.close()
+    assert rows(db_path)[1] == (1, "b.jpg", 1000, 1.5, 42.0, 3, 0.1)
+
+
+def test_close_flushes_the_remainder(tmp_path):
+    db_path = str(tmp_path / "catalog.db")
+    catalog = FrameCatalog(db_path, batch_size=50)
+    catalog.open()
+    catalog.add(frame(0), "a.jpg")
+    catalog.close()
+    assert len(rows(db_path)) == 1
+    assert catalog.rows == 1
+
+
+def test_failed_flush_keeps_the_rows(tmp_path):
+    db_path = str(tmp_path / "catalog.db")
+    catalog = FrameCatalog(db_path, batch_size=50)
+    catalog.open()
+    catalog.add(frame(0), "a.jpg")
+    catalog.add(frame(1), "b.jpg")
+    catalog.conn.execute("ALTER TABLE frames RENAME TO frames_moved")
+    catalog.flush()
+    assert len(catalog._pending) == 2
+    assert catalog.rows == 0
+    catalog.conn.execute("ALTER TABLE frames_moved RENAME TO frames")
+    catalog.flush()
+    assert catalog._pending == []
+    assert [r[0] for r in rows(db_path)] == [0, 1]
+
+
+def test_failed_flush_drops_the_oldest_beyond_max_pending(tmp_path):
+    db_path = str(tmp_path / "catalog.db")
+    catalog = FrameCatalog(db_path, batch_size=50, max_pending=3)
+    catalog.open()
+    catalog.conn.execute("DROP TABLE frames")
+    for seq in range(5):
+        catalog.add(frame(seq), f"{seq}.jpg")
+    catalog.flush()
+    assert [r[0] for r in catalog._pending] == [2, 3, 4]
+    assert catalog.dropped == 2
+
+
+def test_last_seq_continues_after_existing_frames(tmp_path):
+    db_path = str(tmp_path / "catalog.db")
+    assert FrameCatalog(db_path).last_seq() == -1
+    catalog = FrameCatalog(db_path)
+    catalog.open()
+    assert catalog.last_seq() == -1
+    for seq in (0, 1, 7):
+        catalog.add(frame(seq), f"{seq}.jpg")
+    catalog.close()
+    assert FrameCatalog(db_path).last_seq() == 7
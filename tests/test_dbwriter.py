@@ -0,0 +1,111 @@
+import sqlite3
+import time
+
+import pytest
+
+from utilities.dbwriter import BatchWriter
+
+INSERT = "INSERT INTO t (x) VALUES (?)"
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "test.db")
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("CREATE TABLE t (x INTEGER)")
+    conn.commit()
+    conn.close()
+    return path
+
+
+def count(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT count(*) FROM t").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def start_writer(db_path, **kwargs):
+    writer = BatchWriter(db_path, flush_interval=0.05, **kwargs)
+    writer.start()
+    assert writer.wait_ready(2)
+    return writer
+
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_rows_and_hooks_are_written_together(db_path):
+    writer = start_writer(db_path)
+    seen = []
+    writer.on_flush.append(lambda conn, batch: seen.append(sum(len(rows) for rows in batch.values())))
+    writer.submit(INSERT, [(1,), (2,)])
+    writer.submit(INSERT, [(3,)])
+    assert writer.flush(timeout=2)
+    writer.stop()
+    assert count(db_path) == 3
+    assert sum(seen) == 3
+    assert writer.stats()["rows"] == 3
+
+
+def test_failed_flush_is_retried_once_the_lock_clears(db_path):
+    writer = start_writer(db_path, busy_timeout=0.05, retry_backoff=0.05, max_retries=20)
+    blocker = sqlite3.connect(db_path)
+    blocker.execute("BEGIN IMMEDIATE")
+    writer.submit(INSERT, [(1,), (2,)])
+    assert wait_until(lambda: writer.stats()["retries"] >= 1)
+    writer.submit(INSERT, [(3,)]) # queued while the batch is backing off
+    blocker.rollback()
+    blocker.close()
+
+    assert wait_until(lambda: count(db_path) == 3)
+    writer.stop()
+    stats = writer.stats()
+    assert stats["dropped"] == 0
+    assert stats["errors"] >= 1
+
+
+def test_rows_are_dropped_after_max_retries(db_path):
+    writer = start_writer(db_path, busy_timeout=0.02, retry_backoff=0.02, max_retries=2)
+    blocker = sqlite3.connect(db_path)
+    blocker.execute("BEGIN IMMEDIATE")
+    writer.submit(INSERT, [(1,), (2,)])
+    assert wait_until(lambda: writer.stats()["dropped"] == 2)
+    blocker.rollback()
+    blocker.close()
+
+    writer.submit(INSERT, [(3,)]) # the writer carries on with new rows
+    assert wait_until(lambda: count(db_path) == 1)
+    writer.stop()
+    assert writer.stats()["retries"] == 2
+
+
+def test_failing_hook_rolls_back_and_retries_the_batch(db_path):
+    writer = start_writer(db_path, retry_backoff=0.02)
+    calls = []
+
+    def flaky(conn, batch):
+        calls.append(len(batch[INSERT]))
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("disk I/O error")
+
+    writer.on_flush.append(flaky)
+    writer.submit(INSERT, [(1,)])
+    assert wait_until(lambda: count(db_path) == 1)
+    writer.stop()
+    assert calls[0] == 1 and len(calls) == 2
+
+
+def test_full_queue_rejects_rows(db_path):
+    writer = BatchWriter(db_path, max_queue=1) # not started, so nothing drains the queue
+    assert writer.submit(INSERT, [(1,)])
+    assert not writer.submit(INSERT, [(2,), (3,)])
+    assert writer.stats()["rejected"] == 2
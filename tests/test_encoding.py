@@ -0,0 +1,60 @@
+import json
+import zlib
+
+import pytest
+
+from utilities import encoding
+from utilities.uplink import encode_json_zlib
+
+COLUMNS = ["id", "name", "time", "temperature", "lux", "internal_temp", "wind_speed"]
+
+
+def test_sensor_batch_round_trip():
+    rows = [
+        [101, "hub1", "20260601_120000", 21.37, 0.04, 45.7, None],
+        [102, "hub1", "20260601_120005", -3.25, 12345.678, 45.71, 2.5],
+        [110, None, "20260601_115959", None, None, None, 0.0],
+    ]
+    decoded = encoding.decode(encoding.encode_sensor_batch(COLUMNS, rows))
+    assert decoded["cols"] == COLUMNS
+    assert decoded["rows"] == rows
+
+
+def test_sensor_batch_is_smaller_than_json():
+    rows = [[i, "hub1", f"20260601_12{i // 60:02d}{i % 60:02d}", round(20 + i / 100, 2), 500.0, 45.0, 1.5] for i in range(500)]
+    binary = encoding.encode_sensor_batch(COLUMNS, rows)
+    assert len(binary) < len(encode_json_zlib(COLUMNS, rows))
+    assert encoding.decode(binary)["rows"] == rows
+
+
+def test_camera_status_round_trip():
+    for status in ("good", "DOWN", "something new"):
+        payload = encoding.encode_camera_status("cam1", "2026-06-01T12:00:00.250000", status, True)
+        assert encoding.decode(payload) == {
+            "camera": "cam1", "last_seen": "2026-06-01T12:00:00", "sync_status": status, "camera_on": True
+        }
+
+
+def test_heartbeat_round_trip():
+    payload = encoding.encode_heartbeat("cam1", "2026-06-01T12:00:00.123456", 1)
+    assert encoding.decode(payload) == {"name": "cam1", "timestamp": "2026-06-01T12:00:00.123", "cam_on": 1}
+
+
+def test_decode_accepts_json_and_zlib_json():
+    doc = {"name": "cam1", "timestamp": "2026-06-01T12:00:00", "cam_on": 1}
+    assert encoding.decode(json.dumps(doc)) == doc
+    assert encoding.decode(zlib.compress(json.dumps(doc).encode())) == doc
+
+
+def test_decode_rejects_bad_payloads():
+    status = bytearray(encoding.encode_camera_status("cam1", "2026-06-01T12:00:00", "good", False))
+    status[-2] = 7 # sync status code past the end of SYNC_STATUS
+    with pytest.raises(encoding.DecodeError):
+        encoding.decode(bytes(status))
+
+    batch = encoding.encode_sensor_batch(COLUMNS, [[1, "hub1", "20260601_120000", 1.0, 1.0, 1.0, 1.0]])
+    with pytest.raises(encoding.DecodeError):
+        encoding.decode(batch[:-3])
+
+    with pytest.raises(encoding.DecodeError):
+        encoding.decode(encoding.MAGIC + bytes((encoding.VERSION + 1, 1, 0)))
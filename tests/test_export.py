@@ -0,0 +1,94 @@
+import csv
+import glob
+import gzip
+import os
+import sqlite3
+
+import pytest
+
+from utilities import export as export_module
+from utilities.export import ColumnarExporter, TableSource, row_day
+
+INSERT = "INSERT INTO sensor_data (name, time, lux) VALUES (?, ?, ?)"
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "sensor.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE sensor_data (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT, time TEXT, lux REAL)")
+    return path
+
+
+def add_rows(db_path, rows):
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany(INSERT, rows)
+
+
+def exported(out_dir):
+    rows = []
+    for path in sorted(glob.glob(os.path.join(out_dir, "sensor_data", "*", "*.csv.gz"))):
+        with gzip.open(path, "rt", newline="") as f:
+            rows += [row for row in csv.DictReader(f)]
+    return rows
+
+
+def exporter(out_dir, **kwargs):
+    return ColumnarExporter(str(out_dir), fmt="csv", **kwargs)
+
+
+def test_row_day_accepts_both_time_formats():
+    assert row_day("20260601_120000") == "20260601"
+    assert row_day("2026-06-01T12:00:00") == "20260601"
+    assert row_day(None) == "unknown"
+
+
+def test_rows_are_split_into_day_directories(tmp_path, db_path):
+    add_rows(db_path, [("cam1", "20260601_235959", 1.0), ("cam1", "20260602_000001", 2.0)])
+    out = tmp_path / "export"
+    assert exporter(out).export(TableSource("sensor_data", db_path, "sensor_data", "time")) == 2
+    assert sorted(os.listdir(out / "sensor_data")) == ["20260601", "20260602"]
+
+
+def test_a_new_run_resumes_after_the_saved_mark(tmp_path, db_path):
+    source = TableSource("sensor_data", db_path, "sensor_data", "time")
+    out = tmp_path / "export"
+    add_rows(db_path, [("cam1", "20260601_120000", 1.0), ("cam1", "20260601_120002", 2.0)])
+    assert exporter(out).export(source) == 2
+
+    add_rows(db_path, [("cam1", "20260601_120004", 3.0)])
+    resumed = exporter(out) # reloads the mark from export_state.json
+    assert resumed.state["sensor_data"] == 2
+    assert resumed.export(source) == 1
+    assert resumed.export(source) == 0
+    assert [row["lux"] for row in exported(out)] == ["1.0", "2.0", "3.0"]
+    assert len(os.listdir(out / "sensor_data" / "20260601")) == 2 # one part file per run
+
+
+def test_an_interrupted_run_leaves_no_parts_and_keeps_the_mark(tmp_path, db_path, monkeypatch):
+    source = TableSource("sensor_data", db_path, "sensor_data", "time")
+    out = tmp_path / "export"
+    add_rows(db_path, [("cam1", f"20260601_1200{s:02d}", float(s)) for s in range(5)])
+
+    writes = []
+
+    def failing_write(self, rows):
+        writes.append(len(rows))
+        if len(writes) == 2:
+            raise OSError("disk full")
+        self._writer.writerows(rows)
+
+    monkeypatch.setattr(export_module.CsvSink, "write", failing_write)
+    broken = exporter(out, chunk_rows=2)
+    assert broken.run([source]) == 0
+    assert exported(out) == []
+    assert glob.glob(str(out / "sensor_data" / "*" / "*.tmp")) == []
+    monkeypatch.undo()
+
+    assert exporter(out).export(source) == 5
+    assert len(exported(out)) == 5
+
+
+def test_unknown_format_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        ColumnarExporter(str(tmp_path), fmt="xlsx")
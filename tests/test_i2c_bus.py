@@ -0,0 +1,104 @@
+import threading
+import time
+
+import pytest
+
+from utilities.i2c_bus import I2CBusManager
+
+
+class FakeI2C:
+    def __init__(self):
+        self.calls = []
+
+    def readfrom_into(self, address, buffer, **kwargs):
+        self.calls.append(("read", address))
+        buffer[0] = 0x42
+
+    def writeto(self, address, buffer, **kwargs):
+        if address == 0x77:
+            raise OSError(121, "Remote I/O error")
+        self.calls.append(("write", address))
+
+    def writeto_then_readfrom(self, address, buffer_out, buffer_in, **kwargs):
+        self.calls.append(("write_read", address))
+
+    def scan(self):
+        return [0x08, 0x44]
+
+    def deinit(self):
+        pass
+
+
+def hold_bus(bus, seconds):
+    """Hold the bus from another thread; returns once it is held."""
+    held = threading.Event()
+
+    def holder():
+        with bus:
+            held.set()
+            time.sleep(seconds)
+
+    thread = threading.Thread(target=holder)
+    thread.start()
+    held.wait(1)
+    return thread
+
+
+def test_proxy_reads_and_writes_are_timed_per_device():
+    bus = I2CBusManager(FakeI2C())
+    i2c = bus.i2c()
+    assert i2c.try_lock()
+    buffer = bytearray(1)
+    i2c.readfrom_into(0x44, buffer)
+    i2c.writeto(0x44, b"\x00")
+    with pytest.raises(OSError):
+        i2c.writeto(0x77, b"\x00")
+    i2c.unlock()
+    devices = bus.stats()["devices"]
+    assert buffer[0] == 0x42
+    assert devices["sht31d"]["n"] == 2
+    assert devices["sht31d"]["errors"] == 0
+    assert devices["bmp3xx"]["errors"] == 1
+
+
+def test_lock_is_reentrant_for_the_holder():
+    bus = I2CBusManager(FakeI2C())
+    with bus:
+        with bus.transaction(0x08):
+            pass
+    assert bus.stats()["devices"]["wittypi"]["n"] == 1
+
+
+def test_busy_bus_times_out_and_is_counted():
+    bus = I2CBusManager(FakeI2C(), lock_timeout=0.05)
+    holder = hold_bus(bus, 0.3)
+    with pytest.raises(TimeoutError):
+        with bus.transaction(0x08):
+            pass
+    assert not bus.acquire(timeout=0.01)
+    holder.join()
+    stats = bus.stats()
+    assert stats["lock_timeouts"] == 2
+    assert "wittypi" not in stats["devices"]
+
+
+def test_waits_for_the_bus_are_recorded():
+    bus = I2CBusManager(FakeI2C(), lock_timeout=2)
+    holder = hold_bus(bus, 0.1)
+    assert bus.acquire()
+    bus.release()
+    holder.join()
+    assert bus.stats()["lock_wait_ms"]["max"] >= 50
+
+
+def test_transaction_failure_is_recorded_and_releases_the_bus():
+    bus = I2CBusManager(FakeI2C(), lock_timeout=0.05)
+    with pytest.raises(OSError):
+        with bus.transaction(0x08):
+            raise OSError(5, "I/O error")
+    assert bus.stats()["devices"]["wittypi"]["errors"] == 1
+    done = []
+    thread = threading.Thread(target=lambda: done.append(bus.acquire(timeout=0.5)))
+    thread.start()
+    thread.join()
+    assert done == [True]
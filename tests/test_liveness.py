@@ -0,0 +1,89 @@
+import threading
+import time
+
+import pytest
+
+from utilities.liveness import LivenessTracker
+
+
+class Events:
+    def __init__(self):
+        self.items = []
+        self.changed = threading.Condition()
+
+    def down(self, name, age):
+        with self.changed:
+            self.items.append(("down", name))
+            self.changed.notify_all()
+
+    def up(self, name):
+        with self.changed:
+            self.items.append(("up", name))
+            self.changed.notify_all()
+
+    def wait_for(self, count, timeout=2.0):
+        with self.changed:
+            return self.changed.wait_for(lambda: len(self.items) >= count, timeout)
+
+
+@pytest.fixture
+def tracker():
+    events = Events()
+    tracker = LivenessTracker(0.2, events.down, events.up)
+    tracker.events = events
+    tracker.start()
+    yield tracker
+    tracker.stop()
+    tracker.join(2)
+
+
+def test_down_fires_at_the_deadline_and_up_on_the_next_heartbeat(tracker):
+    start = time.monotonic()
+    tracker.heartbeat("cam1")
+    assert tracker.events.wait_for(1)
+    assert 0.15 <= time.monotonic() - start < 1.0
+    assert tracker.events.items == [("down", "cam1")]
+    assert tracker.is_down("cam1")
+
+    tracker.heartbeat("cam1")
+    assert tracker.events.wait_for(2)
+    assert tracker.events.items[-1] == ("up", "cam1")
+    assert not tracker.is_down("cam1")
+
+
+def test_regular_heartbeats_keep_a_camera_up(tracker):
+    for _ in range(10):
+        tracker.heartbeat("cam1")
+        time.sleep(0.05)
+    assert tracker.events.items == []
+    assert not tracker.is_down("cam1")
+
+
+def test_heap_holds_at_most_one_entry_per_camera(tracker):
+    for _ in range(1000):
+        for name in ("cam1", "cam2", "cam3"):
+            tracker.heartbeat(name)
+    stats = tracker.stats()
+    assert stats["cameras"] == 3
+    assert stats["heap"] <= 3
+
+
+def test_seeded_down_camera_does_not_fire_again(tracker):
+    tracker.track("cam1", age=10, down=True)
+    tracker.track("cam2", age=10)
+    assert tracker.events.wait_for(1)
+    time.sleep(0.1)
+    assert tracker.events.items == [("down", "cam2")]
+
+
+def test_grace_period_delays_the_first_down():
+    events = Events()
+    tracker = LivenessTracker(0.05, events.down, events.up, grace=0.4)
+    tracker.start()
+    try:
+        start = time.monotonic()
+        tracker.track("cam1", age=60)
+        assert events.wait_for(1)
+        assert time.monotonic() - start >= 0.35
+    finally:
+        tracker.stop()
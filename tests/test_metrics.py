@@ -0,0 +1,77 @@
+import time
+
+from utilities.metrics import Histogram, LatencyRecorder
+
+
+def test_empty_histogram():
+    hist = Histogram()
+    assert hist.percentile(50) is None
+    assert hist.summary() == {"n": 0}
+
+
+def test_values_land_in_their_buckets():
+    hist = Histogram(bounds_ms=(10, 20))
+    for ms in (5, 10, 15, 25):
+        hist.record(ms)
+    assert hist.counts == [2, 1, 1] # bounds are inclusive upper limits, then overflow
+
+
+def test_percentiles_interpolate_within_a_bucket():
+    hist = Histogram(bounds_ms=(10, 20, 50))
+    for _ in range(50):
+        hist.record(5)
+    for _ in range(50):
+        hist.record(15)
+    assert hist.percentile(50) == 10 # top of the first bucket
+    assert hist.percentile(95) == 14.5 # second bucket spans 10..15, capped at the max seen
+
+
+def test_percentiles_never_exceed_the_maximum():
+    hist = Histogram(bounds_ms=(10, 100))
+    hist.record(12)
+    assert hist.percentile(99) <= 12
+    hist.record(500) # overflow bucket
+    assert hist.percentile(100) == 500
+
+
+def test_summary_fields():
+    hist = Histogram()
+    for ms in (1, 2, 3, 4):
+        hist.record(ms)
+    summary = hist.summary()
+    assert summary["n"] == 4
+    assert summary["mean"] == 2.5
+    assert summary["max"] == 4
+    assert summary["p50"] <= summary["p95"] <= summary["p99"] <= summary["max"]
+
+
+def test_recorder_keeps_stages_apart_and_resets():
+    latency = LatencyRecorder()
+    latency.record("encode", 0.004)
+    latency.record("encode", 0.006)
+    latency.record("write", 0.001)
+    summary = latency.summary()
+    assert summary["encode"]["n"] == 2
+    assert summary["encode"]["mean"] == 5.0
+    assert summary["write"]["n"] == 1
+    assert latency.summary() == {}
+
+
+def test_recorder_summary_without_reset_keeps_the_window():
+    latency = LatencyRecorder()
+    latency.record("encode", 0.004)
+    latency.summary(reset=False)
+    assert latency.summary()["encode"]["n"] == 1
+
+
+def test_time_records_even_when_the_block_raises():
+    latency = LatencyRecorder()
+    try:
+        with latency.time("acquire"):
+            time.sleep(0.01)
+            raise RuntimeError
+    except RuntimeError:
+        pass
+    summary = latency.summary()["acquire"]
+    assert summary["n"] == 1
+    assert summary["max"] >= 10
@@ -0,0 +1,67 @@
+import numpy as np
+
+from utilities.motion import MotionDetector
+
+
+def still(value=100):
+    return np.full((48, 64), value, dtype=np.uint8)
+
+
+def with_object(value=100):
+    frame = still(value)
+    frame[10:30, 20:40] = 250 # 400 of 3072 pixels change
+    return frame
+
+
+def warmed_up(**kwargs):
+    detector = MotionDetector(**kwargs)
+    for _ in range(detector.warmup + 1):
+        detector.update(still())
+    return detector
+
+
+def test_static_scene_scores_zero():
+    detector = warmed_up()
+    score = detector.update(still())
+    assert score == 0.0
+    assert not detector.active(score, now=100.0)
+
+
+def test_moving_object_scores_the_changed_fraction():
+    detector = warmed_up()
+    score = detector.update(with_object())
+    assert abs(score - 400 / (48 * 64)) < 1e-9
+    assert detector.active(score, now=100.0)
+
+
+def test_small_changes_below_pixel_delta_are_ignored():
+    detector = warmed_up(pixel_delta=20)
+    assert detector.update(still(110)) == 0.0
+
+
+def test_activity_is_held_after_the_last_trigger():
+    detector = warmed_up(hold=2.0)
+    assert detector.active(detector.update(with_object()), now=100.0)
+    quiet = detector.update(still())
+    assert detector.active(quiet, now=101.5)
+    assert not detector.active(quiet, now=102.5)
+    assert detector.last_trigger == 100.0
+
+
+def test_no_trigger_during_warmup():
+    detector = MotionDetector(warmup=5)
+    detector.update(still())
+    assert not detector.active(detector.update(with_object()), now=100.0)
+
+
+def test_background_adapts_to_a_lasting_change():
+    detector = warmed_up(alpha=0.5)
+    scores = [detector.update(with_object()) for _ in range(10)]
+    assert scores[0] > 0
+    assert scores[-1] == 0.0 # the object has become part of the background
+
+
+def test_resolution_change_reallocates_the_buffers():
+    detector = warmed_up()
+    assert detector.update(np.zeros((24, 32), dtype=np.uint8)) == 0.0
+    assert detector.background.shape == (24, 32)
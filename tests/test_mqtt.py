@@ -0,0 +1,65 @@
+import configparser
+import os
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+from utilities.mqtt import MQTTManager
+
+PACKAGE_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+@pytest.fixture
+def manager_config(tmp_path, monkeypatch):
+    config = configparser.ConfigParser()
+    config.read(os.path.join(PACKAGE_ROOT, "setup", "example_config.ini"))
+    config["general"]["name"] = "server1"
+    config["communication"]["mqtt_db"] = str(tmp_path / "heartbeat.db")
+    config["communication"]["sensor_db"] = str(tmp_path / "sensor.db")
+    config["communication"]["hb_flush_interval"] = "3600" # only explicit flushes write
+    path = tmp_path / "config.ini"
+    with open(path, "w") as f:
+        config.write(f)
+    monkeypatch.setenv("BEE_CAM_CONFIG", str(path))
+    return tmp_path
+
+
+def heartbeat(name="cam1", cam_on=1):
+    return {"name": name, "timestamp": datetime.now().isoformat(), "cam_on": cam_on}
+
+
+def query(path, sql):
+    with sqlite3.connect(path) as conn:
+        return conn.execute(sql).fetchall()
+
+
+def test_heartbeats_are_written_behind_the_in_memory_state(manager_config):
+    db_path = str(manager_config / "heartbeat.db")
+    manager = MQTTManager()
+    try:
+        for _ in range(3):
+            manager._handle_heartbeat(heartbeat())
+        # visible immediately in memory, not yet on disk
+        assert manager.camera_status()["cam1"][1:] == ("good", 1)
+        assert query(db_path, "SELECT count(*) FROM heartbeats") == [(0,)]
+
+        assert manager.hb_writer.flush(timeout=5)
+        assert query(db_path, "SELECT count(*) FROM heartbeats") == [(3,)]
+        assert query(db_path, "SELECT camera_name, sync_status, camera_on FROM camera_status") == [("cam1", "good", 1)]
+        assert query(db_path, "SELECT sum(heartbeats) FROM camera_uptime_hourly") == [(3,)]
+    finally:
+        manager.stop()
+
+
+def test_stop_writes_out_queued_heartbeats_and_state_is_restored(manager_config):
+    manager = MQTTManager()
+    manager._handle_heartbeat(heartbeat(cam_on=0))
+    manager.stop()
+    assert query(str(manager_config / "heartbeat.db"), "SELECT count(*) FROM heartbeats") == [(1,)]
+
+    restarted = MQTTManager()
+    try:
+        assert restarted.camera_status()["cam1"][1:] == ("good", 0)
+    finally:
+        restarted.stop()
@@ -0,0 +1,64 @@
+import os
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from utilities.pipeline import CapturePipeline, Frame
+
+
+def frame(seq):
+    return Frame(seq, datetime(2026, 6, 1, 12, 0, 0, seq * 1000), np.full((16, 16, 3), seq, dtype=np.uint8))
+
+
+def queued_seqs(pipeline):
+    return [f.seq for f in list(pipeline.encode_queue.queue)]
+
+
+def make_pipeline(tmp_path, **kwargs):
+    out_dir = tmp_path / "day" / "images"
+    return CapturePipeline(str(out_dir), "cam1", queue_size=2, **kwargs)
+
+
+def test_unknown_drop_policy_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        make_pipeline(tmp_path, drop_policy="random")
+
+
+def test_newest_policy_discards_the_incoming_frame(tmp_path):
+    pipeline = make_pipeline(tmp_path, drop_policy="newest") # not started: nothing drains the queue
+    assert pipeline.submit(frame(1))
+    assert pipeline.submit(frame(2))
+    assert not pipeline.submit(frame(3))
+    assert queued_seqs(pipeline) == [1, 2]
+    assert pipeline.stats()["dropped_newest"] == 1
+
+
+def test_oldest_policy_makes_room_for_the_new_frame(tmp_path):
+    pipeline = make_pipeline(tmp_path, drop_policy="oldest")
+    for seq in (1, 2, 3, 4):
+        pipeline.submit(frame(seq))
+    assert queued_seqs(pipeline) == [3, 4]
+    assert pipeline.stats()["dropped_oldest"] == 2
+
+
+def test_block_policy_gives_up_after_the_timeout(tmp_path):
+    pipeline = make_pipeline(tmp_path, drop_policy="block", block_timeout=0.05)
+    pipeline.submit(frame(1))
+    pipeline.submit(frame(2))
+    assert not pipeline.submit(frame(3))
+    assert pipeline.stats()["dropped_blocked"] == 1
+
+
+def test_started_pipeline_encodes_and_writes_every_frame(tmp_path):
+    pipeline = make_pipeline(tmp_path, encode_workers=2, drop_policy="block", block_timeout=5)
+    pipeline.start()
+    for seq in range(5):
+        pipeline.submit(frame(seq))
+    pipeline.stop()
+    stats = pipeline.stats()
+    assert stats["written"] == 5
+    files = sorted(os.listdir(tmp_path / "day" / "images"))
+    assert len(files) == 5
+    with open(tmp_path / "day" / "images" / files[0], "rb") as f:
+        assert f.read(2) == b"\xff\xd8" # JPEG SOI marker
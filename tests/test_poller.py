@@ -0,0 +1,70 @@
+import threading
+import time
+
+from utilities.sensors import Channel, SensorPoller
+
+
+def run_for(channels, seconds, **kwargs):
+    poller = SensorPoller(channels, **kwargs)
+    poller.start()
+    time.sleep(seconds)
+    poller.stop()
+    return poller
+
+
+def test_each_channel_keeps_its_own_period():
+    fast = Channel("fast", lambda: 1.0, ("a",), period=0.05, deadline=0.5)
+    slow = Channel("slow", lambda: 2.0, ("b",), period=0.2, deadline=0.5)
+    run_for([fast, slow], 0.5)
+    assert 8 <= fast.reads <= 12
+    assert 2 <= slow.reads <= 4
+    assert fast.value == 1.0 and slow.value == 2.0
+    assert fast.timestamp is not None
+
+
+def test_slow_read_is_not_resubmitted_while_running():
+    release = threading.Event()
+    calls = []
+
+    def hung():
+        calls.append(time.monotonic())
+        release.wait(2)
+        return 0.0
+
+    ch = Channel("hung", hung, ("a",), period=0.02, deadline=0.05)
+    poller = SensorPoller([ch], bus_lock=threading.Lock(), workers=2)
+    poller.start()
+    time.sleep(0.3)
+    assert len(calls) == 1
+    assert ch.timeouts == 1 # counted once, not on every pass
+    release.set()
+    poller.stop()
+
+
+def test_hung_channel_only_delays_the_others_by_the_bus_wait():
+    release = threading.Event()
+    hung = Channel("hung", lambda: release.wait(2), ("a",), period=10, deadline=0.05)
+    other = Channel("other", lambda: 1.0, ("b",), period=0.05, deadline=0.05)
+    poller = run_for([hung, other], 0.3, bus_lock=threading.Lock(), workers=2)
+    release.set()
+    # the hung read holds the bus, so the other channel gives up waiting instead of queueing behind it
+    assert other.bus_waits >= 1
+    assert other.reads == 0
+    assert poller.stats()["other"]["bus_waits"] == other.bus_waits
+
+
+def test_stale_values_are_reported_missing():
+    ch = Channel("a", lambda: 1.0, ("a",), period=1, deadline=0.5)
+    ch.value, ch.timestamp = 5.0, 100.0
+    assert ch.fresh_value(102.0) == 5.0
+    assert ch.fresh_value(103.0) is None
+
+
+def test_channel_without_bus_access_skips_the_bus_lock():
+    bus_lock = threading.Lock()
+    bus_lock.acquire() # another device holds the bus throughout
+    ch = Channel("wind", lambda: (1.0, 2.0, 0.5), ("a", "b", "c"), period=0.05, deadline=0.05, uses_bus=False)
+    run_for([ch], 0.2, bus_lock=bus_lock)
+    bus_lock.release()
+    assert ch.reads >= 2
+    assert ch.bus_waits == 0
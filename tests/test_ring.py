@@ -0,0 +1,45 @@
+from datetime import datetime
+
+import numpy as np
+
+from utilities.ring import FrameRing
+
+
+def push(ring, seq):
+    ring.push(np.full((4, 4, 3), seq, dtype=np.uint8), seq, datetime(2026, 6, 1, 12, 0, seq))
+
+
+def test_ring_flushes_pre_trigger_frames_then_post_frames():
+    ring = FrameRing((4, 4, 3), pre=3, post=2)
+    for seq in range(5):
+        push(ring, seq)
+        assert ring.pending(False) == []
+
+    push(ring, 5)
+    frames = ring.pending(True) # event: the 3 pre-trigger frames and the current one
+    assert [f[0] for f in frames] == [2, 3, 4, 5]
+    assert all(f[2][0, 0, 0] == f[0] for f in frames)
+
+    for seq in (6, 7):
+        push(ring, seq)
+        assert [f[0] for f in ring.pending(False)] == [seq]
+    push(ring, 8)
+    assert ring.pending(False) == []
+    assert ring.stats()["events"] == 1
+
+
+def test_ring_copies_are_independent_of_the_slots():
+    ring = FrameRing((4, 4, 3), pre=1, post=0)
+    push(ring, 1)
+    frame = ring.pending(True)[0][2]
+    push(ring, 2)
+    push(ring, 3)
+    assert frame[0, 0, 0] == 1
+
+
+def test_ring_crops_a_padded_view():
+    ring = FrameRing((4, 4, 3), pre=0, post=0)
+    view = np.zeros((4, 8, 3), dtype=np.uint8) # stride padding past the visible width
+    view[:, :4] = 9
+    ring.push(view, 0, datetime(2026, 6, 1))
+    assert (ring.pending(True)[0][2] == 9).all()
@@ -0,0 +1,161 @@
+import json
+import sqlite3
+from datetime import datetime
+
+from utilities.rollup import SensorRollup, HeartbeatRollup, Retention
+
+SENSOR_INSERT = "INSERT INTO sensor_data (name, time, lux) VALUES (?, ?, ?)"
+TIMED_INSERT = "INSERT INTO sensor_data (name, time, pressure, pressure_time) VALUES (?, ?, ?, ?)"
+HEARTBEAT_INSERT = "INSERT INTO heartbeats (camera_name, receipt_time) VALUES (?, ?)"
+
+
+def sensor_db(path):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE sensor_data (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT, time TEXT, lux REAL)")
+    return conn
+
+
+def timed_db(path):
+    conn = sqlite3.connect(path)
+    conn.execute("""CREATE TABLE sensor_data (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT, time TEXT,
+                    pressure REAL, pressure_time REAL)""")
+    return conn
+
+
+def epoch(text):
+    return datetime.strptime(text, "%Y%m%d_%H%M%S").timestamp()
+
+
+def flush(conn, rollup, rows, commit=True):
+    conn.executemany(TIMED_INSERT, rows)
+    rollup.on_flush(conn, {TIMED_INSERT: rows})
+    if commit:
+        rollup.on_commit({TIMED_INSERT: rows})
+
+
+def minute_counts(conn):
+    return conn.execute("SELECT bucket, pressure_count, pressure_mean FROM sensor_rollup_minute ORDER BY bucket").fetchall()
+
+
+def test_repeated_readings_are_counted_once_at_their_read_time(tmp_path):
+    conn = timed_db(str(tmp_path / "sensor.db"))
+    rollup = SensorRollup(("pressure",), {"pressure": "pressure_time"})
+    rollup.create_tables(conn)
+    read = epoch("20260601_120059")
+    # a 10 s pressure period with rows every 2 s: the same reading lands in several rows
+    flush(conn, rollup, [("srv", "20260601_120100", 1000.0, read), ("srv", "20260601_120102", 1000.0, read)])
+    flush(conn, rollup, [("srv", "20260601_120104", 1000.0, read),
+                         ("srv", "20260601_120110", 1002.0, epoch("20260601_120109")),
+                         ("srv", "20260601_120112", None, None)])
+    assert minute_counts(conn) == [("20260601_1200", 1, 1000.0), ("20260601_1201", 1, 1002.0)]
+
+
+def test_rolled_back_flush_counts_its_readings_again(tmp_path):
+    conn = timed_db(str(tmp_path / "sensor.db"))
+    rollup = SensorRollup(("pressure",), {"pressure": "pressure_time"})
+    rollup.create_tables(conn)
+    rows = [("srv", "20260601_120000", 1000.0, epoch("20260601_120000"))]
+    conn.execute("SAVEPOINT attempt")
+    flush(conn, rollup, rows, commit=False)
+    conn.execute("ROLLBACK TO attempt")
+    flush(conn, rollup, rows)
+    assert minute_counts(conn) == [("20260601_1200", 1, 1000.0)]
+
+
+def test_counted_readings_survive_a_restart(tmp_path):
+    path = str(tmp_path / "sensor.db")
+    conn = timed_db(path)
+    rollup = SensorRollup(("pressure",), {"pressure": "pressure_time"})
+    rollup.create_tables(conn)
+    read = epoch("20260601_120000")
+    flush(conn, rollup, [("srv", "20260601_120000", 1000.0, read)])
+
+    restarted = SensorRollup(("pressure",), {"pressure": "pressure_time"})
+    restarted.create_tables(conn)
+    flush(conn, restarted, [("srv", "20260601_120002", 1000.0, read)])
+    assert minute_counts(conn) == [("20260601_1200", 1, 1000.0)]
+
+
+def test_sensor_history_is_backfilled_before_the_hook_takes_over(tmp_path):
+    conn = sensor_db(str(tmp_path / "sensor.db"))
+    conn.executemany(SENSOR_INSERT, [("cam1", "20260601_100000", 1.0), ("cam1", "20260601_100030", 3.0),
+                                     ("cam1", "20260601_110000", None)])
+    rollup = SensorRollup(("lux",))
+    rollup.create_tables(conn)
+    assert conn.execute("SELECT bucket, lux_min, lux_max, lux_mean, lux_count FROM sensor_rollup_hour ORDER BY bucket").fetchall() == [
+        ("20260601_10", 1.0, 3.0, 2.0, 2), ("20260601_11", None, None, None, 0)
+    ]
+
+    rows = [("cam1", "20260601_120000", 5.0)]
+    conn.executemany(SENSOR_INSERT, rows)
+    rollup.on_flush(conn, {SENSOR_INSERT: rows})
+    rollup.create_tables(conn) # a restart must not count anything twice
+    assert conn.execute("SELECT sum(lux_count) FROM sensor_rollup_minute").fetchone()[0] == 3
+
+
+def test_retention_prunes_without_converting_the_database(tmp_path):
+    path = str(tmp_path / "sensor.db")
+    conn = sensor_db(path)
+    conn.executemany(SENSOR_INSERT, [("cam1", "20000101_000000", 1.0)] * 7 + [("cam1", "29990101_000000", 2.0)])
+    conn.commit()
+
+    retention = Retention(path, "sensor_data", "time", "%Y%m%d_%H%M%S", retention_days=30, chunk_rows=3)
+    prune_conn = retention._connect()
+    try:
+        assert retention.prune(prune_conn) == 7
+    finally:
+        prune_conn.close()
+    assert conn.execute("SELECT count(*) FROM sensor_data").fetchone()[0] == 1
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 0
+
+
+def test_retention_never_prunes_past_the_uplink_mark(tmp_path):
+    path = str(tmp_path / "sensor.db")
+    conn = sensor_db(path)
+    conn.executemany(SENSOR_INSERT, [("cam1", "20000101_000000", 1.0)] * 6)
+    conn.commit()
+    mark_path = tmp_path / "uplink_state.json"
+
+    retention = Retention(path, "sensor_data", "time", "%Y%m%d_%H%M%S", retention_days=30, chunk_rows=2,
+                          mark_path=str(mark_path))
+    prune_conn = retention._connect()
+    try:
+        assert retention.prune(prune_conn) == 0 # uplink has not saved a mark yet
+        assert retention.held == 6
+        mark_path.write_text(json.dumps({"sensor_data": 4}))
+        assert retention.prune(prune_conn) == 4
+        assert retention.held == 2
+    finally:
+        prune_conn.close()
+    assert conn.execute("SELECT id FROM sensor_data").fetchall() == [(5,), (6,)]
+
+
+def heartbeat_db(path):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE heartbeats (id INTEGER PRIMARY KEY AUTOINCREMENT, camera_name TEXT, receipt_time TEXT)")
+    return conn
+
+
+def test_heartbeat_history_is_backfilled(tmp_path):
+    conn = heartbeat_db(str(tmp_path / "heartbeat.db"))
+    conn.executemany(HEARTBEAT_INSERT, [("cam1", f"2026-06-01T10:00:{s:02d}") for s in range(0, 60, 10)])
+    rollup = HeartbeatRollup(HEARTBEAT_INSERT)
+    rollup.create_tables(conn)
+    rollup.create_tables(conn)
+    assert conn.execute("SELECT camera_name, hour, heartbeats FROM camera_uptime_hourly").fetchall() == [
+        ("cam1", "2026-06-01T10", 6)
+    ]
+
+
+def test_heartbeat_hook_extends_the_backfilled_hours(tmp_path):
+    conn = heartbeat_db(str(tmp_path / "heartbeat.db"))
+    conn.executemany(HEARTBEAT_INSERT, [("cam1", "2026-06-01T10:00:00")])
+    rollup = HeartbeatRollup(HEARTBEAT_INSERT)
+    rollup.create_tables(conn)
+    rows = [("cam1", "2026-06-01T10:59:50"), ("cam1", "2026-06-01T11:00:00")]
+    conn.executemany(HEARTBEAT_INSERT, rows)
+    rollup.on_flush(conn, {HEARTBEAT_INSERT: rows})
+    assert conn.execute("SELECT hour, heartbeats, first_seen, last_seen FROM camera_uptime_hourly ORDER BY hour").fetchall() == [
+        ("2026-06-01T10", 2, "2026-06-01T10:00:00", "2026-06-01T10:59:50"),
+        ("2026-06-01T11", 1, "2026-06-01T11:00:00", "2026-06-01T11:00:00")
+    ]
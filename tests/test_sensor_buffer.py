@@ -0,0 +1,48 @@
+from datetime import datetime
+
+import pytest
+
+from utilities.sensors import SensorBuffer
+
+
+def test_sensor_buffer_rows():
+    buf = SensorBuffer(("lux", "internal_temp"), capacity=4)
+    t = datetime(2026, 6, 1, 12, 0, 0).timestamp()
+    buf.append(t, {"lux": 0.04, "internal_temp": 45.7})
+    buf.append(t + 5, {"lux": None})
+    assert buf.rows("cam1") == [
+        ("cam1", "20260601_120000", 0.04, 45.7),
+        ("cam1", "20260601_120005", None, None)
+    ]
+    assert len(buf) == 2 # rows() leaves them buffered
+
+
+def test_sensor_buffer_consume_keeps_rows_appended_since():
+    buf = SensorBuffer(("lux",), capacity=8)
+    for i in range(3):
+        buf.append(float(i), {"lux": i})
+    rows = buf.rows("cam1")
+    buf.append(3.0, {"lux": 3})
+    buf.consume(len(rows))
+    times, cols = buf.take()
+    assert list(times) == [3.0]
+    assert list(cols["lux"]) == [3.0]
+    assert len(buf) == 0
+
+
+def test_sensor_buffer_drops_rows_when_full():
+    buf = SensorBuffer(("lux",), capacity=2)
+    assert buf.append(0.0, {"lux": 1})
+    assert buf.append(1.0, {"lux": 2})
+    assert not buf.append(2.0, {"lux": 3})
+    assert buf.dropped == 1
+    assert len(buf) == 2
+
+
+@pytest.mark.parametrize("n", [0, 1, 5])
+def test_sensor_buffer_consume_more_than_buffered(n):
+    buf = SensorBuffer(("lux",), capacity=4)
+    for i in range(n):
+        buf.append(float(i), {"lux": i})
+    buf.consume(10)
+    assert len(buf) == 0
@@ -0,0 +1,33 @@
+import logging
+import time
+
+import pytest
+
+from utilities import sim
+
+
+def test_callback_errors_are_logged(caplog):
+    client = sim.FakeClient("cam1")
+
+    def broken(client, userdata, flags, rc, properties):
+        raise RuntimeError("boom")
+
+    client.on_connect = broken
+    client.connect("localhost")
+    with caplog.at_level(logging.ERROR, logger="Main.Sim"):
+        client.loop_start()
+        deadline = time.monotonic() + 2
+        while not caplog.records and time.monotonic() < deadline:
+            time.sleep(0.01)
+        client.loop_stop()
+    client.disconnect()
+    assert caplog.records[0].name == "Main.Sim.MQTT.cam1"
+    assert "boom" in caplog.records[0].getMessage()
+
+
+def test_main_refuses_a_mode_the_config_was_not_written_for():
+    # the test config leaves [general] mode empty
+    with pytest.raises(SystemExit, match="mode"):
+        sim.main(["server", "0"])
+    with pytest.raises(SystemExit, match="Unknown mode"):
+        sim.main(["gateway", "0"])
@@ -0,0 +1,113 @@
+import os
+import sqlite3
+from collections import namedtuple
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from utilities import storage as storage_module
+from utilities.storage import StorageManager, RECOMPRESSED_MARKER
+
+MB = 1024 * 1024
+Usage = namedtuple("Usage", "total used free")
+
+
+def fake_disk(monkeypatch, free):
+    """Report free bytes from a mutable list so a test can change it between calls."""
+    monkeypatch.setattr(storage_module.shutil, "disk_usage", lambda path: Usage(10000 * MB, 0, free[0]))
+
+
+def make_day(data_dir, day, frames=0, size=64):
+    images = os.path.join(data_dir, day, "images")
+    os.makedirs(images)
+    noise = np.random.default_rng(0).integers(0, 255, (size, size, 3), dtype=np.uint8)
+    for i in range(frames):
+        Image.fromarray(noise).save(os.path.join(images, f"cam_{i:03d}.jpg"), "JPEG", quality=95)
+    return os.path.join(data_dir, day)
+
+
+def manager(data_dir, **kwargs):
+    return StorageManager(str(data_dir), "2026-06-03", soft_free_bytes=1000 * MB, hard_free_bytes=100 * MB, **kwargs)
+
+
+def test_plenty_of_space_does_nothing(tmp_path, monkeypatch):
+    fake_disk(monkeypatch, [5000 * MB])
+    make_day(tmp_path, "2026-06-01")
+    storage = manager(tmp_path)
+    storage.check()
+    assert storage.writes_allowed()
+    assert os.path.isdir(tmp_path / "2026-06-01")
+    assert storage.metrics()["free_mb"] == round(5000 * MB / 1e6, 1)
+
+
+def test_hard_watermark_pauses_writes_before_evicting(tmp_path, monkeypatch):
+    fake_disk(monkeypatch, [50 * MB])
+    storage = manager(tmp_path, policies=["delete_oldest"])
+    seen = []
+    monkeypatch.setattr(storage, "evict_step", lambda: seen.append(storage.writes_allowed()) or False)
+    storage.check()
+    assert seen == [False]
+    assert not storage.writes_allowed()
+
+
+def test_writes_resume_once_space_is_back(tmp_path, monkeypatch):
+    free = [50 * MB]
+    fake_disk(monkeypatch, free)
+    storage = manager(tmp_path, policies=["delete_oldest"])
+    storage.check()
+    assert not storage.writes_allowed()
+    free[0] = 5000 * MB
+    storage.check()
+    assert storage.writes_allowed()
+
+
+def test_delete_oldest_keeps_today(tmp_path, monkeypatch):
+    fake_disk(monkeypatch, [500 * MB])
+    for day in ("2026-06-01", "2026-06-02", "2026-06-03"):
+        make_day(tmp_path, day, frames=1)
+    storage = manager(tmp_path, policies=["delete_oldest"])
+    storage.check()
+    storage.check()
+    storage.check()
+    assert sorted(os.listdir(tmp_path)) == ["2026-06-03"]
+    assert storage.evictions["delete_oldest"] == 2
+
+
+def test_recompress_works_in_batches_and_updates_the_catalog(tmp_path, monkeypatch):
+    fake_disk(monkeypatch, [500 * MB])
+    day_dir = make_day(tmp_path, "2026-06-01", frames=5, size=128)
+    conn = sqlite3.connect(os.path.join(day_dir, "catalog.db"))
+    conn.execute("CREATE TABLE frames (id INTEGER PRIMARY KEY, path TEXT, size INTEGER)")
+    with conn:
+        for name in sorted(os.listdir(os.path.join(day_dir, "images"))):
+            path = os.path.join(day_dir, "images", name)
+            conn.execute("INSERT INTO frames (path, size) VALUES (?, ?)",
+                         (os.path.relpath(path, day_dir), os.path.getsize(path)))
+    storage = manager(tmp_path, policies=["recompress"], recompress_quality=20, recompress_batch=2)
+
+    storage.check()
+    assert not os.path.exists(os.path.join(day_dir, RECOMPRESSED_MARKER))
+    storage.check()
+    storage.check()
+    assert os.path.exists(os.path.join(day_dir, RECOMPRESSED_MARKER))
+    assert storage.evictions["recompress"] == 3
+    assert storage.freed_bytes > 0
+    for path, size in conn.execute("SELECT path, size FROM frames"):
+        assert size == os.path.getsize(os.path.join(day_dir, path))
+    conn.close()
+
+
+def test_recompress_skips_shard_days_without_marking_them(tmp_path, monkeypatch):
+    fake_disk(monkeypatch, [500 * MB])
+    day_dir = make_day(tmp_path, "2026-06-01")
+    os.makedirs(os.path.join(day_dir, "archive"))
+    storage = manager(tmp_path, policies=["recompress", "delete_oldest"])
+    storage.check()
+    assert storage.evictions == {"recompress": 0, "delete_oldest": 1}
+    assert not os.path.exists(day_dir)
+
+
+def test_unknown_policy_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        manager(tmp_path, policies=["shred"])
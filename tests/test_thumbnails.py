@@ -0,0 +1,67 @@
+import os
+import time
+
+import numpy as np
+import simplejpeg
+
+from utilities.thumbnails import ThumbnailCache, make_thumbnail
+
+
+def test_thumbnail_is_at_most_the_requested_width():
+    array = np.zeros((480, 640, 3), dtype=np.uint8)
+    data = make_thumbnail(array, 100)
+    height, width, _, _ = simplejpeg.decode_jpeg_header(data)
+    assert width <= 100
+    assert height == 480 * width // 640
+
+
+def test_least_recently_used_is_evicted_first(tmp_path):
+    cache = ThumbnailCache(str(tmp_path), budget_bytes=300)
+    cache.put("a", 64, b"a" * 100)
+    cache.put("b", 64, b"b" * 100)
+    cache.put("c", 64, b"c" * 100)
+    assert cache.get("a", 64) == b"a" * 100 # a is now the most recent
+    cache.put("d", 64, b"d" * 100)
+    assert cache.get("b", 64) is None
+    assert not os.path.exists(tmp_path / "64" / "b")
+    assert cache.get("a", 64) is not None
+    assert cache.stats()["evicted"] == 1
+
+
+def test_replacing_an_entry_does_not_double_count(tmp_path):
+    cache = ThumbnailCache(str(tmp_path), budget_bytes=1000)
+    cache.put("a", 64, b"x" * 400)
+    cache.put("a", 64, b"y" * 200)
+    assert cache.stats()["size_mb"] == round(200 / 1e6, 2)
+    assert cache.stats()["entries"] == 1
+    assert cache.get("a", 64) == b"y" * 200
+
+
+def test_latest_is_per_width(tmp_path):
+    cache = ThumbnailCache(str(tmp_path), budget_bytes=1000)
+    cache.put("a", 64, b"1")
+    cache.put("b", 320, b"2")
+    cache.put("c", 64, b"3")
+    assert cache.latest(64) == "c"
+    assert cache.latest(320) == "b"
+    assert cache.latest(128) is None
+
+
+def test_recency_survives_a_restart(tmp_path):
+    cache = ThumbnailCache(str(tmp_path), budget_bytes=1000)
+    cache.put("old", 64, b"o" * 100)
+    cache.put("new", 64, b"n" * 100)
+    past = time.time() - 100
+    os.utime(tmp_path / "64" / "old", (past, past))
+
+    reloaded = ThumbnailCache(str(tmp_path), budget_bytes=150) # over budget on load
+    assert reloaded.get("old", 64) is None
+    assert reloaded.get("new", 64) == b"n" * 100
+
+
+def test_file_removed_behind_the_cache_is_forgotten(tmp_path):
+    cache = ThumbnailCache(str(tmp_path), budget_bytes=1000)
+    cache.put("a", 64, b"a" * 10)
+    os.remove(tmp_path / "64" / "a")
+    assert cache.get("a", 64) is None
+    assert cache.stats()["entries"] == 0
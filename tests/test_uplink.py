@@ -0,0 +1,132 @@
+import json
+import sqlite3
+
+import pytest
+
+from utilities.uplink import UplinkQueue
+
+
+class FakeInfo:
+    def __init__(self, acked):
+        self.acked = acked
+        self.rc = 0 if acked else 4
+
+    def wait_for_publish(self, timeout=None):
+        pass
+
+    def is_published(self):
+        return self.acked
+
+
+class FakeClient:
+    def __init__(self):
+        self.acked = True
+        self.sent = [] # (topic, payload)
+
+    def publish(self, topic, payload, qos=0):
+        if self.acked:
+            self.sent.append((topic, payload))
+        return FakeInfo(self.acked)
+
+
+def encode_ids(columns, rows):
+    # fixed 10 bytes per row keeps the byte budget arithmetic obvious
+    return b"".join(b"%010d" % row[0] for row in rows)
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / "sensor.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE sensor_data (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT, time TEXT, lux REAL)")
+    conn.executemany("INSERT INTO sensor_data (name, time, lux) VALUES (?, ?, ?)",
+                     [("cam1", "20260601_120000", float(i)) for i in range(20)])
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def make_queue(db, tmp_path, client, **kwargs):
+    kwargs.setdefault("backfill", True)
+    queue = UplinkQueue(client, ":unused:", str(tmp_path / "uplink_state.json"), "hub1/sensors/batch",
+                        encode=kwargs.pop("encode", encode_ids), **kwargs)
+    queue.mark = queue._load_mark(db)
+    queue.set_connected(True)
+    return queue
+
+
+def sent_ids(client):
+    return [int(payload[i:i + 10]) for _, payload in client.sent for i in range(0, len(payload), 10)]
+
+
+def test_sends_everything_and_saves_the_mark(db, tmp_path):
+    client = FakeClient()
+    queue = make_queue(db, tmp_path, client, batch_rows=8)
+    queue.send_pending(db)
+    assert sent_ids(client) == list(range(1, 21))
+    assert [len(p) // 10 for _, p in client.sent] == [8, 8, 4]
+    with open(tmp_path / "uplink_state.json") as f:
+        assert json.load(f) == {"sensor_data": 20}
+    assert queue.stats()["backlog"] == 0
+
+
+def test_unacknowledged_batch_does_not_move_the_mark(db, tmp_path):
+    client = FakeClient()
+    client.acked = False
+    queue = make_queue(db, tmp_path, client, batch_rows=8)
+    queue.send_pending(db)
+    assert queue.mark == 0
+    assert queue.stats()["failures"] == 1
+
+    client.acked = True
+    queue.send_pending(db)
+    assert sent_ids(client) == list(range(1, 21)) # resent from the old mark, nothing lost
+
+
+def test_batch_over_the_cap_is_split_and_batch_size_restored(db, tmp_path):
+    client = FakeClient()
+    queue = make_queue(db, tmp_path, client, batch_rows=8, max_bytes=1000)
+    # the first rows are bulky: 8 or 4 of them are over the cap, 2 fit
+    queue.encode = lambda columns, rows: encode_ids(columns, rows) + (b"x" * 300 * len(rows) if rows[0][0] == 1 else b"")
+    queue.send_pending(db)
+    sizes = [len(p.rstrip(b"x")) // 10 for _, p in client.sent]
+    assert sizes[0] == 2 # 8 -> 4 -> 2 rows until it fit
+    assert sizes[1] == 8 # back to batch_rows after the split batch went out
+    assert queue.mark == 20
+
+
+def test_stops_for_the_interval_once_the_budget_is_used(db, tmp_path):
+    client = FakeClient()
+    queue = make_queue(db, tmp_path, client, batch_rows=8, max_bytes=100)
+    queue.send_pending(db)
+    assert sent_ids(client) == list(range(1, 11))
+    assert queue.stats()["throttled"] == 1
+    queue.send_pending(db)
+    assert sent_ids(client) == list(range(1, 21))
+
+
+def test_row_that_can_never_fit_is_skipped(db, tmp_path):
+    client = FakeClient()
+    queue = make_queue(db, tmp_path, client, batch_rows=8, max_bytes=100)
+    queue.encode = lambda columns, rows: b"".join(b"x" * 200 if row[0] == 3 else b"%010d" % row[0] for row in rows)
+    queue.send_pending(db)
+    queue.send_pending(db)
+    assert 3 not in sent_ids(client)
+    assert queue.mark == 20
+    assert queue.stats()["skipped"] == 1
+
+
+def test_disconnected_queue_sends_nothing(db, tmp_path):
+    client = FakeClient()
+    queue = make_queue(db, tmp_path, client)
+    queue.set_connected(False)
+    queue.send_pending(db)
+    assert client.sent == []
+
+
+def test_first_run_without_backfill_starts_from_the_newest_row(db, tmp_path):
+    client = FakeClient()
+    queue = make_queue(db, tmp_path, client, backfill=False)
+    queue.send_pending(db)
+    assert client.sent == []
+    assert queue.mark == 20
@@ -0,0 +1,81 @@
+import threading
+
+import numpy as np
+import pytest
+
+from utilities.sensors import WindSensor, adc_to_wind_speed
+
+HZ = 25
+BASE, HIGH = 0.6, 1.4 # volts
+
+
+def sampler(gust_s=3, window_s=120):
+    """A WindSensor with the sampler's ring but no thread, fed by feed()."""
+    ws = WindSensor.__new__(WindSensor)
+    ws.gust_samples = int(round(gust_s * HZ))
+    ws._ring = np.zeros(int(HZ * window_s), dtype=np.float32)
+    ws._written = 0
+    ws._taken = 0
+    ws._ring_lock = threading.Lock()
+    return ws
+
+
+def feed(ws, volts, count):
+    for _ in range(count):
+        ws._ring[ws._written % len(ws._ring)] = volts
+        ws._written += 1
+
+
+def speed(volts):
+    return float(adc_to_wind_speed(np.float64(np.float32(volts))))
+
+
+def test_gust_spans_samples_from_before_a_short_interval():
+    ws = sampler(gust_s=3)
+    feed(ws, BASE, 200)
+    feed(ws, HIGH, 38) # the gust starts 1.5 s before the interval
+    ws.interval_stats()
+
+    # a 2 s interval: the gust lasts another 1.5 s, then it is calm again
+    feed(ws, HIGH, 37)
+    feed(ws, BASE, 13)
+    mean, gust, std = ws.interval_stats()
+    assert mean == pytest.approx((37 * speed(HIGH) + 13 * speed(BASE)) / 50)
+    assert gust == pytest.approx(speed(HIGH)) # one full 3 s window of gust
+    assert gust > mean
+    assert std > 0
+
+
+def test_steady_wind_has_no_gust_above_the_mean():
+    ws = sampler()
+    feed(ws, BASE, 300)
+    ws.interval_stats()
+    feed(ws, BASE, 50)
+    mean, gust, std = ws.interval_stats()
+    assert gust == pytest.approx(mean)
+    assert std == pytest.approx(0)
+
+
+def test_first_interval_shorter_than_the_gust_window():
+    ws = sampler(gust_s=3)
+    feed(ws, HIGH, 10)
+    mean, gust, _ = ws.interval_stats()
+    assert mean == pytest.approx(speed(HIGH))
+    assert gust == pytest.approx(speed(HIGH))
+
+
+def test_stats_across_the_ring_wraparound():
+    ws = sampler(gust_s=1, window_s=4) # 100 sample ring
+    feed(ws, BASE, 90)
+    ws.interval_stats()
+    feed(ws, HIGH, 30) # wraps past the end of the ring
+    mean, gust, _ = ws.interval_stats()
+    assert mean == pytest.approx(speed(HIGH))
+    assert gust == pytest.approx(speed(HIGH))
+
+
+def test_no_new_samples():
+    ws = sampler()
+    feed(ws, BASE, 10)
+    ws.interval_stats()
+    assert ws.interval_stats() == (None, None, None)
@@ -0,0 +1,151 @@
+import configparser
+from datetime import datetime
+
+import pytest
+
+from utilities import wittypi as wittypi_module
+from utilities.wittypi import WittyPi, BLOCK_READ_FAILURES
+
+
+class FakeBus:
+    """
+    Register file that can be told to fail block reads or ignore writes. State is shared by
+    every handle, as it would be on the device, since WittyPi reopens the bus
+    after an I/O error.
+    """
+    @classmethod
+    def reset(cls):
+        cls.opened = 0
+        cls.registers = bytearray(256)
+        cls.block_failures = 0 # block reads left to fail
+        cls.ignored_writes = 0 # writes left to drop silently, like a busy RTC
+        cls.block_reads = 0
+        cls.byte_reads = 0
+
+    def __init__(self, bus=None):
+        FakeBus.opened += 1
+
+    def read_byte_data(self, addr, register):
+        FakeBus.byte_reads += 1
+        return self.registers[register]
+
+    def write_byte_data(self, addr, register, value):
+        if FakeBus.ignored_writes:
+            FakeBus.ignored_writes -= 1
+            return
+        self.registers[register] = value
+
+    def read_i2c_block_data(self, addr, register, length):
+        FakeBus.block_reads += 1
+        if FakeBus.block_failures:
+            FakeBus.block_failures -= 1
+            raise OSError(121, "Remote I/O error")
+        return list(self.registers[register:register + length])
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def fake_bus(monkeypatch):
+    FakeBus.reset()
+    monkeypatch.setattr(wittypi_module, "SMBus", FakeBus)
+    return FakeBus
+
+
+def rtc_registers():
+    # 2026-06-01 12:34:56 in BCD at registers 58..64
+    FakeBus.registers[58:65] = bytes([0x56, 0x34, 0x12, 0x01, 0x01, 0x06, 0x26])
+
+
+def test_persistent_handle_is_opened_once(fake_bus):
+    wp = WittyPi(persistent=True)
+    for _ in range(3):
+        with wp:
+            wp.get_current_time()
+    assert fake_bus.opened == 1
+
+
+def test_clock_is_read_in_one_block(fake_bus):
+    rtc_registers()
+    with WittyPi(persistent=True) as wp:
+        assert wp.get_current_time().isoformat() == "2026-06-01T12:34:56"
+    assert fake_bus.block_reads == 1
+    assert fake_bus.byte_reads == 0
+
+
+def test_a_transient_error_is_retried_on_a_reopened_bus(fake_bus):
+    rtc_registers()
+    fake_bus.block_failures = 1
+    with WittyPi(persistent=True) as wp:
+        assert wp.get_current_time().isoformat() == "2026-06-01T12:34:56"
+        assert wp.reconnects == 1
+    assert fake_bus.byte_reads == 0
+
+
+def test_a_failed_block_read_falls_back_to_bytes_for_that_call(fake_bus):
+    rtc_registers()
+    fake_bus.block_failures = 2 # the read and its retry after reconnecting
+    with WittyPi(persistent=True) as wp:
+        assert wp.get_current_time().isoformat() == "2026-06-01T12:34:56"
+        assert fake_bus.byte_reads == 7
+        wp.get_current_time()
+        assert wp._block_reads
+        assert fake_bus.byte_reads == 7 # the next call went back to a block read
+
+
+def test_block_reads_are_given_up_after_repeated_failures(fake_bus):
+    rtc_registers()
+    fake_bus.block_failures = 2 * BLOCK_READ_FAILURES
+    with WittyPi(persistent=True) as wp:
+        for _ in range(BLOCK_READ_FAILURES):
+            wp.get_current_time()
+        assert not wp._block_reads
+        block_reads = fake_bus.block_reads
+        assert wp.get_current_time().isoformat() == "2026-06-01T12:34:56"
+        assert fake_bus.block_reads == block_reads
+
+
+def test_internal_temperature_is_cached(fake_bus):
+    with WittyPi(persistent=True, temp_ttl=60) as wp:
+        fake_bus.registers[50] = 31
+        assert wp.get_internal_temperature()["temp_c"] == 31
+        fake_bus.registers[50] = 40
+        assert wp.get_internal_temperature()["temp_c"] == 31
+        wp.invalidate_cache()
+        assert wp.get_internal_temperature()["temp_c"] == 40
+
+
+def test_schedule_is_written_in_bcd_and_verified(fake_bus):
+    with WittyPi(persistent=True) as wp:
+        wp.schedule_startup(datetime(2026, 6, 2, 5, 30, 15))
+    assert list(fake_bus.registers[27:32]) == [0x15, 0x30, 0x05, 0x02, 0x02] # Tuesday is 2 on the WittyPi
+
+
+def test_an_ignored_write_is_retried(fake_bus):
+    fake_bus.ignored_writes = 2
+    with WittyPi(persistent=True) as wp:
+        wp._write_bcd_data(27, [15, 30], backoff=0.001)
+    assert list(fake_bus.registers[27:29]) == [0x15, 0x30]
+
+
+def test_a_write_that_never_sticks_raises_and_drops_the_cache(fake_bus):
+    fake_bus.ignored_writes = 100
+    with WittyPi(persistent=True) as wp:
+        wp._read_schedule(27, 5)
+        assert wp._cache
+        with pytest.raises(IOError):
+            wp._write_bcd_data(27, [15], retries=2, backoff=0.001)
+        assert not wp._cache
+
+
+def test_apply_scheduling_reports_failure(fake_bus):
+    fake_bus.ignored_writes = 1000
+    config = configparser.ConfigParser()
+    config.read_dict({"scheduling": {"sun_sched": "False"},
+                      "settings": {"default_start": "05:00:00", "default_stop": "21:00:00"}})
+    with WittyPi(persistent=True) as wp:
+        assert not wp.apply_scheduling(config)
+    fake_bus.ignored_writes = 0
+    with WittyPi(persistent=True) as wp:
+        assert wp.apply_scheduling(config)
@@ -0,0 +1,172 @@
+import os
+import glob
+import struct
+
+from utilities.logger import logger as base_logger
+logger = base_logger.getChild("Archive")
+
+# Shard record: magic, id length, data length, then id bytes and data bytes.
+# The records are self-describing, so a lost or truncated index can be rebuilt from the shard.
+RECORD_HEADER = struct.Struct("<4sHI")
+RECORD_MAGIC = b"BCF1"
+
+SHARD_EXT = ".shard"
+INDEX_EXT = ".idx"
+
+
+def _shard_number(path):
+    name = os.path.basename(path)[len("shard_"):-len(SHARD_EXT)]
+    return int(name) if name.isdigit() else None
+
+
+class ShardWriter:
+    """
+    Append-only day archive. Frames are appended to shard_NNNNN.shard and
+    each append adds "frame_id<TAB>offset<TAB>length" to the matching .idx.
+    A new shard is started once the current one reaches max_bytes.
+    """
+    def __init__(self, archive_dir, max_bytes=256 * 1024 * 1024):
+        self.archive_dir = archive_dir
+        self.max_bytes = max_bytes
+        self._data = None
+        self._index = None
+        self.shard_name = None
+        self._offset = 0
+
+    def open(self):
+        os.makedirs(self.archive_dir, exist_ok=True)
+        numbers = [_shard_number(path) for path in glob.glob(os.path.join(self.archive_dir, f"shard_*{SHARD_EXT}"))]
+        numbers = [n for n in numbers if n is not None]
+        # never append to a shard left by an earlier run, it may end in a partial record;
+        # number past the highest one, as older shards may have been deleted
+        self._roll(max(numbers) + 1 if numbers else 0)
+
+    def _roll(self, number):
+        self.close()
+        self.shard_name = f"shard_{number:05d}"
+        base = os.path.join(self.archive_dir, self.shard_name)
+        self._data = open(base + SHARD_EXT, "ab")
+        self._index = open(base + INDEX_EXT, "a")
+        self._offset = self._data.tell()
+        logger.debug(f"Writing to shard {self.shard_name}")
+
+    def append(self, frame_id, data):
+        """
+        Append one frame. Returns (shard name, offset of the frame data).
+        """
+        if self._data is None:
+            self.open()
+        elif self._offset >= self.max_bytes:
+            self._roll(_shard_number(self.shard_name + SHARD_EXT) + 1)
+
+        key = frame_id.encode()
+        self._data.write(RECORD_HEADER.pack(RECORD_MAGIC, len(key), len(data)))
+        self._data.write(key)
+        self._data.write(data)
+        self._data.flush() # data must be on disk before the index points at it
+
+        data_offset = self._offset + RECORD_HEADER.size + len(key)
+        self._index.write(f"{frame_id}\t{data_offset}\t{len(data)}\n")
+        self._index.flush()
+        self._offset = data_offset + len(data)
+        return self.shard_name, data_offset
+
+    def fsync(self):
+        if self._data is not None:
+            os.fsync(self._data.fileno())
+            os.fsync(self._index.fileno())
+
+    def close(self):
+        if self._data is not None:
+            self._data.close()
+            self._index.close()
+            self._data = None
+            self._index = None
+
+
+def rebuild_index(shard_path):
+    """
+    Regenerate the .idx for a shard by walking its records. A partial record at the end is ignored.
+    """
+    entries = []
+    size = os.path.getsize(shard_path)
+    with open(shard_path, "rb") as f:
+        offset = 0
+        while offset + RECORD_HEADER.size <= size:
+            magic, key_len, data_len = RECORD_HEADER.unpack(f.read(RECORD_HEADER.size))
+            if magic != RECORD_MAGIC:
+                logger.warning(f"Bad record magic in {shard_path} at {offset}, stopping")
+                break
+            data_offset = offset + RECORD_HEADER.size + key_len
+            if data_offset + data_len > size:
+                break
+            frame_id = f.read(key_len).decode()
+            entries.append((frame_id, data_offset, data_len))
+            f.seek(data_len, os.SEEK_CUR)
+            offset = data_offset + data_len
+
+    with open(shard_path[:-len(SHARD_EXT)] + INDEX_EXT, "w") as idx:
+        for frame_id, data_offset, data_len in entries:
+            idx.write(f"{frame_id}\t{data_offset}\t{data_len}\n")
+    return entries
+
+
+class ShardReader:
+    """
+    Random access to frames in a day archive by frame id.
+    """
+    def __init__(self, archive_dir):
+        self.archive_dir = archive_dir
+        self.index = {}
+        self._files = {}
+        self.reload()
+
+    def reload(self):
+        self.index = {}
+        for shard_path in sorted(glob.glob(os.path.join(self.archive_dir, f"shard_*{SHARD_EXT}"))):
+            shard_name = os.path.basename(shard_path)[:-len(SHARD_EXT)]
+            idx_path = os.path.join(self.archive_dir, shard_name + INDEX_EXT)
+            if os.path.exists(idx_path):
+                with open(idx_path) as idx:
+                    for line in idx:
+                        parts = line.rstrip("\n").split("\t")
+                        if len(parts) != 3: # partial last line
+                            continue
+                        self.index[parts[0]] = (shard_name, int(parts[1]), int(parts[2]))
+            else:
+                for frame_id, data_offset, data_len in rebuild_index(shard_path):
+                    self.index[frame_id] = (shard_name, data_offset, data_len)
+
+    def __contains__(self, frame_id):
+        return frame_id in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def ids(self):
+        return list(self.index)
+
+    def get(self, frame_id):
+        shard_name, offset, length = self.index[frame_id]
+        f = self._files.get(shard_name)
+        if f is None:
+            f = open(os.path.join(self.archive_dir, shard_name + SHARD_EXT), "rb")
+            self._files[shard_name] = f
+        return os.pread(f.fileno(), length, offset)
+
+    def extract(self, frame_id, dest_dir):
+        path = os.path.join(dest_dir, frame_id)
+        with open(path, "wb") as out:
+            out.write(self.get(frame_id))
+        return path
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
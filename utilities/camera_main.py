@@ -9,13 +9,24 @@ from utilities.display import Display
 from utilities.sensors import MultiSensor
 from utilities.mqtt import MQTTManager
 from utilities.wittypi import WittyPi
+from utilities.i2c_bus import I2CBusManager
+from utilities.capture import FrameScheduler, CaptureWorker, AdaptiveRate, parse_curve
+from utilities.pipeline import CapturePipeline, Frame, FORMAT_TABLE
+from utilities.motion import MotionDetector
+from utilities.ring import FrameRing
+from utilities.catalog import FrameCatalog
+from utilities.archive import ShardWriter
+from utilities.storage import StorageManager
+from utilities.thumbnails import ThumbnailCache
+from utilities.metrics import LatencyRecorder
 import board
 
-from picamera2 import Picamera2
+from picamera2 import Picamera2, MappedArray
 from time import sleep
 from datetime import datetime
 import threading
 import time
+import json
 
 class FallbackDisplay: # object that allows script to continue if disp init fails
     def display_msg(self, *args, **kwargs):
@@ -31,6 +42,18 @@ def run_camera():
 
     size = (config['imaging'].getint('w'), config['imaging'].getint('h'))
     lens_position = config['imaging'].getfloat('lens_position')
+    frame_interval = config['imaging'].getfloat('frame_interval', fallback=1.0)
+    capture_timeout = config['imaging'].getfloat('capture_timeout', fallback=3.0)
+    encode_workers = config['imaging'].getint('encode_workers', fallback=3)
+    queue_size = config['imaging'].getint('queue_size', fallback=8)
+    jpeg_quality = config['imaging'].getint('jpeg_quality', fallback=90)
+    drop_policy = config['imaging'].get('drop_policy', fallback='oldest').strip().lower()
+    capture_mode = config['imaging'].get('capture_mode', fallback='continuous').strip().lower()
+    lores_size = (config['imaging'].getint('lores_w', fallback=320), config['imaging'].getint('lores_h', fallback=240))
+    storage_format = config['imaging'].get('storage_format', fallback='files').strip().lower()
+    shard_mb = config['imaging'].getint('shard_mb', fallback=256)
+    pre_trigger = config['imaging'].getint('pre_trigger_frames', fallback=0)
+    post_trigger = config['imaging'].getint('post_trigger_frames', fallback=0)
     img_count = 0
 
     # set main and sub output dirs
@@ -44,8 +67,10 @@ def run_camera():
     path_image_dat = os.path.join(curr_date,'images') # image data will save to a sub directory 'images'
     os.makedirs(path_image_dat, exist_ok=True)
     
-    shared_i2c = board.I2C()
-    sensors = MultiSensor(i2c=shared_i2c) # Initialize the sensors
+    bus = I2CBusManager(board.I2C()) # serializes the display, sensors and WittyPi on one bus
+    shared_i2c = bus.i2c()
+    sensors = MultiSensor(i2c=shared_i2c, bus=bus) # Initialize the sensors
+    sensors.start_polling()
 
     try:
         disp = Display(i2c=shared_i2c)
@@ -55,18 +80,24 @@ def run_camera():
     disp.display_msg('Initializing')
 
     # SCHEDULING
-    try:
-        with WittyPi() as wp:
-            wp.apply_scheduling(config, disp)
-    except Exception as e:
-        logger.warning(f"Could not apply WittyPi scheduling: {e}")
+    if config.getboolean('scheduling', 'background', fallback=True):
+        WittyPi.apply_scheduling_async(config, disp, bus_manager=bus)
+    else:
+        try:
+            with WittyPi(bus_manager=bus) as wp:
+                wp.apply_scheduling(config, disp)
+        except Exception as e:
+            logger.warning(f"Could not apply WittyPi scheduling: {e}")
 
     MAX_RETRIES = 3 # MAX CAMERA TIMEOUTS
 
     for attempt in range(MAX_RETRIES):
         try:
             camera = Picamera2()
-            cam_config = camera.create_still_configuration({'size': size})
+            if capture_mode == 'motion':
+                cam_config = camera.create_still_configuration({'size': size}, lores={'size': lores_size})
+            else:
+                cam_config = camera.create_still_configuration({'size': size})
             camera.configure(cam_config)
             camera.exposure_mode = 'sports'
             camera.set_controls({"LensPosition": lens_position})
@@ -89,10 +120,33 @@ def run_camera():
             if stop_event.wait(2):
                 break
 
-    def capture_image(time_current_split):
-        filename = os.path.join("images", f"{name}_{time_current_split}.jpg")
-        camera.capture_file(filename)
-        logger.debug("Image acquired: %s", time_current_split)
+    def capture_image():
+        time_current = datetime.now()
+        with latency.time("acquire"):
+            request = camera.capture_request()
+        activity = None
+        try:
+            if detector is not None:
+                # lores is YUV420; the first lores_h rows are the luminance plane
+                activity = detector.update(request.make_array('lores')[:lores_size[1]])
+                active = detector.active(activity)
+                if ring is not None:
+                    with MappedArray(request, 'main') as m: # zero-copy view, copied once into a ring slot
+                        ring.push(m.array, seq_base + capture_worker.count, time_current, request.get_metadata(), activity)
+                elif not active:
+                    return
+            if ring is None:
+                array = request.make_array('main')
+                metadata = request.get_metadata()
+        finally:
+            request.release() # hand the buffer back to the camera before encoding
+
+        if ring is not None:
+            for seq, timestamp, array, metadata, score in ring.pending(active):
+                pipeline.submit(Frame(seq, timestamp, array, metadata, score, sensors.latest_readings.get('lux')))
+            return
+        pipeline.submit(Frame(seq_base + capture_worker.count, time_current, array, metadata, activity, sensors.latest_readings.get('lux')))
+        logger.debug("Image acquired: %s", time_current)
 
     def cleanup():
         stop_event.set()
@@ -100,11 +154,29 @@ def run_camera():
             sensor_thread.join()
         if heartbeat_thread.is_alive():
             heartbeat_thread.join()
-        if len(list(sensors.data_dict.values())[0]) != 0:
+        if capture_worker.is_alive(): # finish the in-flight capture_request before the camera goes away
+            capture_worker.join(timeout=capture_timeout)
+            if capture_worker.is_alive():
+                logger.warning("Capture worker did not stop in time")
+        logger.info(f"Capture stats: {scheduler.stats()}")
+        storage.stop()
+        if detector is not None:
+            logger.info(f"Motion stats: {detector.stats()}")
+        if ring is not None:
+            logger.info(f"Frame ring stats: {ring.stats()}")
+        pipeline.stop() # joins the encode and write workers
+        try:
+            camera.stop()
+            camera.close()
+        except Exception as e:
+            logger.warning(f"Camera close failed: {e}")
+        if len(sensors.buffer) != 0:
             sensors.insert_into_db()
         sensors.sensors_deinit()
+        logger.info(f"I2C bus stats: {bus.stats()}")
         logger.info("Sensors deinit, Exiting.")
         mqtt.send_camera_shutdown()
+        mqtt.stop()
 
     def send_local_alert(mqtt, message):
         try:
@@ -129,41 +201,150 @@ def run_camera():
     heartbeat_thread = threading.Thread(target=mqtt.send_camera_heartbeat, args=(stop_event,))
     heartbeat_thread.start()
 
-    event = threading.Event()
+    storage = StorageManager(
+        main_dir, date_folder,
+        soft_free_bytes=config.getint('storage', 'soft_free_mb', fallback=2048) * 1024 * 1024,
+        hard_free_bytes=config.getint('storage', 'hard_free_mb', fallback=512) * 1024 * 1024,
+        policies=[p.strip() for p in config.get('storage', 'policies', fallback='recompress,drop_inactive,delete_oldest').split(',') if p.strip()],
+        recompress_quality=config.getint('storage', 'recompress_quality', fallback=60),
+        recompress_batch=config.getint('storage', 'recompress_batch', fallback=200),
+        activity_threshold=config['imaging'].getfloat('motion_threshold', fallback=0.01),
+        check_freq=config.getint('storage', 'check_freq', fallback=60)
+    )
+    storage.check() # fill the projections and apply watermarks before the first frame
+    storage.start()
+
+    archive = None
+    if storage_format == 'shard':
+        archive = ShardWriter(os.path.join(curr_date, 'archive'), max_bytes=shard_mb * 1024 * 1024)
+
+    thumbnail_sizes = [int(w) for w in config['imaging'].get('thumbnail_sizes', fallback='').split(',') if w.strip()]
+    thumbnails = None
+    if thumbnail_sizes:
+        thumbnails = ThumbnailCache(
+            os.path.join(main_dir, 'thumbs'),
+            config['imaging'].getint('thumbnail_budget_mb', fallback=200) * 1024 * 1024
+        )
+        logger.info(f"Thumbnails {thumbnail_sizes}: {thumbnails.stats()}")
+
+    latency = LatencyRecorder()
+
+    # capture_worker.count restarts at 0 every run; continue after the frames
+    # already catalogued today so file names and catalog seqs stay unique
+    catalog = FrameCatalog(os.path.join(curr_date, 'catalog.db'))
+    seq_base = catalog.last_seq() + 1
+    logger.info(f"Frame sequence starts at {seq_base}")
+
+    pipeline = CapturePipeline(
+        path_image_dat, name,
+        colorspace=FORMAT_TABLE.get(cam_config['main']['format'], 'RGB'),
+        encode_workers=encode_workers,
+        queue_size=queue_size,
+        jpeg_quality=jpeg_quality,
+        drop_policy=drop_policy,
+        catalog=catalog,
+        archive=archive,
+        storage=storage,
+        thumbnails=thumbnails,
+        thumbnail_sizes=thumbnail_sizes,
+        latency=latency,
+        fsync=config['imaging'].getboolean('fsync', fallback=False)
+    )
+    pipeline.start()
+
+    detector = None
+    if capture_mode == 'motion':
+        detector = MotionDetector(
+            threshold=config['imaging'].getfloat('motion_threshold', fallback=0.01),
+            pixel_delta=config['imaging'].getint('motion_pixel_delta', fallback=20),
+            alpha=config['imaging'].getfloat('motion_alpha', fallback=0.05),
+            hold=config['imaging'].getfloat('motion_hold', fallback=2.0)
+        )
+    logger.info(f"Capture mode: {capture_mode} | Storage format: {storage_format}")
+
+    ring = None
+    if detector is not None and (pre_trigger > 0 or post_trigger > 0):
+        channels = 3 if cam_config['main']['format'] in ('BGR888', 'RGB888') else 4
+        ring = FrameRing((size[1], size[0], channels), pre=pre_trigger, post=post_trigger,
+                         max_mem_fraction=config['imaging'].getfloat('ring_mem_fraction', fallback=0.5))
+
+    scheduler = FrameScheduler(frame_interval)
+    capture_worker = CaptureWorker(capture_image, scheduler, stop_event, latency=latency)
+    capture_worker.start()
+    logger.info(f"Frame interval: {frame_interval}s | Capture timeout: {capture_timeout}s")
+
+    adaptive = None
+    interval_curve = config['imaging'].get('lux_interval_curve', fallback='').strip()
+    if interval_curve:
+        exposure_curve = config['imaging'].get('lux_exposure_curve', fallback='').strip()
+        adaptive = AdaptiveRate(
+            frame_interval,
+            parse_curve(interval_curve),
+            exposure_curve=parse_curve(exposure_curve) if exposure_curve else None,
+            activity_boost=config['imaging'].getfloat('activity_boost', fallback=0)
+        )
+        logger.info(f"Lux-adaptive capture rate enabled: {interval_curve}")
 
     MAX_RETRIES = 3
     retry_count = 0
     curr_time = time.time()
+    storage_time = time.time()
+    storage_report_freq = config.getint('storage', 'report_freq', fallback=600)
+    metrics_time = time.time()
+    metrics_freq = config['imaging'].getint('metrics_freq', fallback=300)
 
     while True:
 
         try:
+            img_count = pipeline.stats()['written']
             disp.display_msg('Imaging!', img_count)
 
-            time_current = datetime.now()
-            time_current_split = str(time_current.strftime("%Y%m%d_%H%M%S"))
-            
-            capture_thread = threading.Thread(target=capture_image, args=(time_current_split,))
-            capture_thread.start()
-
-            capture_thread.join(timeout=3) 
-            if capture_thread.is_alive(): # If thread is still alive after 3 seconds, it's probably hung
+            if capture_worker.error is not None:
+                raise capture_worker.error
+            if capture_worker.hung(capture_timeout): # capture_request has not returned, it's probably hung
                 raise TimeoutError("Camera operation took too long!")
-            
-            img_count += 1
             retry_count = 0
-        
+
+            if adaptive is not None:
+                new_interval, max_exposure = adaptive.update(
+                    sensors.latest_readings.get('lux'),
+                    detector.last_trigger if detector is not None else None
+                )
+                if new_interval is not None:
+                    scheduler.set_interval(new_interval)
+                    logger.info(f"Frame interval set to {new_interval:.2f}s (lux {sensors.latest_readings.get('lux')})")
+                if max_exposure is not None:
+                    camera.set_controls({"FrameDurationLimits": (100, max_exposure)})
+                    logger.debug(f"Max exposure set to {max_exposure}us")
+
             # if wanting a delay in saving sensor data:
             if (time.time()-curr_time) >= 30:
                 sensors.insert_into_db()
+                logger.debug(f"Capture stats: {scheduler.stats()} | Pipeline: {pipeline.stats()}")
                 curr_time = time.time()
-            sleep(.7)
+
+            if (time.time()-storage_time) >= storage_report_freq:
+                storage_metrics = storage.metrics()
+                logger.info(f"Storage: {storage_metrics}")
+                mqtt.publish_metrics("storage", storage_metrics)
+                mqtt.publish_metrics("i2c", bus.stats())
+                writer_stats = {w.name: w.stats() for w in (sensors.writer, mqtt.hb_writer)}
+                logger.info(f"DB writers: {writer_stats}")
+                mqtt.publish_metrics("db_writer", writer_stats)
+                storage_time = time.time()
+
+            if (time.time()-metrics_time) >= metrics_freq:
+                latency_summary = latency.summary()
+                logger.info(f"Capture latency (ms): {latency_summary}")
+                mqtt.publish_metrics("latency", latency_summary)
+                metrics_time = time.time()
+            sleep(1)
 
         except KeyboardInterrupt:
             stop_event.set()  # stop sensor thread
             sensor_thread.join() 
 
-            if len(list(sensors.data_dict.values())[0]) != 0: # if list is not empty then add data
+            if len(sensors.buffer) != 0: # if list is not empty then add data
                 sensors.insert_into_db()
             
             disp.display_msg('Interrupted', img_count)
@@ -174,7 +355,7 @@ def run_camera():
         except TimeoutError:
             retry_count += 1
             disp.display_msg('Cam Timeout!', img_count)
-            logger.error("Camera operation timeout!")
+            logger.error(f"Camera operation timeout! Recent latency (ms): {latency.summary(reset=False)}")
             if retry_count >= MAX_RETRIES:
                 send_local_alert(mqtt, "Camera timeout error")
                 disp.display_msg('Max retries reached!', img_count)
@@ -0,0 +1,202 @@
+import bisect
+import math
+import threading
+import time
+
+from utilities.logger import logger as base_logger
+logger = base_logger.getChild("Capture")
+
+
+class FrameScheduler:
+    """
+    Fixed-rate frame clock on time.monotonic().
+
+    Each deadline is the previous deadline plus one interval, not "now" plus one
+    interval, so time spent capturing does not accumulate as drift. If the
+    worker falls more than a whole interval behind, the deadlines it blew
+    through are counted as missed and skipped instead of being fired back to back.
+    """
+    def __init__(self, interval, stop_poll=0.25):
+        self.interval = float(interval)
+        self.stop_poll = stop_poll # longest a waiter goes without checking stop_event
+        self.next_deadline = None
+        self.frames = 0
+        self.missed = 0
+        self.last_lateness = 0.0
+        self.max_lateness = 0.0
+        self._started = None
+        self._cond = threading.Condition()
+
+    def set_interval(self, interval):
+        """
+        Change the interval from any thread. A worker already waiting is woken
+        to re-check its deadline, so a shorter interval applies immediately.
+        """
+        interval = float(interval)
+        with self._cond:
+            if interval == self.interval:
+                return
+            if self.next_deadline is not None: # re-anchor so the change takes effect on the next frame
+                self.next_deadline += interval - self.interval
+            self.interval = interval
+            self._cond.notify_all()
+
+    def wait(self, stop_event):
+        """
+        Block until the next frame deadline. Returns False if stop_event was set while waiting.
+        """
+        with self._cond:
+            now = time.monotonic()
+            if self.next_deadline is None:
+                self.next_deadline = now
+                self._started = now
+
+            while not stop_event.is_set():
+                delay = self.next_deadline - time.monotonic()
+                if delay <= 0:
+                    break
+                self._cond.wait(min(delay, self.stop_poll))
+            if stop_event.is_set():
+                return False
+
+            lateness = time.monotonic() - self.next_deadline
+            self.last_lateness = lateness
+            self.max_lateness = max(self.max_lateness, lateness)
+
+            if lateness >= self.interval:
+                skipped = int(lateness // self.interval)
+                self.missed += skipped
+                self.next_deadline += skipped * self.interval
+
+            self.next_deadline += self.interval
+            self.frames += 1
+            return True
+
+    def stats(self):
+        elapsed = time.monotonic() - self._started if self._started is not None else 0.0
+        return {
+            "interval": self.interval,
+            "frames": self.frames,
+            "missed": self.missed,
+            "fps": round(self.frames / elapsed, 3) if elapsed > 0 else 0.0,
+            "last_lateness": round(self.last_lateness, 4),
+            "max_lateness": round(self.max_lateness, 4)
+        }
+
+
+class CaptureWorker(threading.Thread):
+    """
+    Long-lived capture thread driven by a FrameScheduler.
+
+    capture_fn is called once per deadline. The supervising thread polls
+    hung() instead of joining a fresh thread per frame, and checks error
+    to pick up an exception raised by capture_fn. Scheduler lateness is
+    recorded into latency (a LatencyRecorder) when one is given.
+    """
+    def __init__(self, capture_fn, scheduler, stop_event, latency=None):
+        super().__init__(name="capture", daemon=True)
+        self.capture_fn = capture_fn
+        self.scheduler = scheduler
+        self.stop_event = stop_event
+        self.latency = latency
+        self.count = 0
+        self.error = None
+        self.busy_since = None
+
+    def run(self):
+        while self.scheduler.wait(self.stop_event):
+            if self.latency is not None:
+                self.latency.record("lateness", max(0.0, self.scheduler.last_lateness))
+            self.busy_since = time.monotonic()
+            try:
+                self.capture_fn()
+            except Exception as e:
+                logger.error(f"Capture worker stopped: {e}")
+                self.error = e
+                break
+            finally:
+                self.busy_since = None
+            self.count += 1
+
+    def hung(self, timeout):
+        busy_since = self.busy_since
+        return busy_since is not None and (time.monotonic() - busy_since) > timeout
+
+
+def parse_curve(text):
+    """
+    Parse "x:y, x:y, ..." into a sorted list of (x, y) floats.
+    """
+    points = []
+    for pair in text.split(","):
+        if not pair.strip():
+            continue
+        x, y = pair.split(":")
+        points.append((float(x), float(y)))
+    if not points:
+        raise ValueError("Empty curve")
+    return sorted(points)
+
+
+def interpolate_log(points, lux):
+    """
+    Piecewise-linear interpolation on log10(lux + 1), clamped at both ends.
+    Light levels span several decades, so a log axis keeps dawn and dusk from
+    being squeezed into the first few percent of the curve.
+    """
+    x = math.log10(max(lux, 0.0) + 1)
+    xs = [math.log10(max(px, 0.0) + 1) for px, _ in points]
+    if x <= xs[0]:
+        return points[0][1]
+    if x >= xs[-1]:
+        return points[-1][1]
+    i = bisect.bisect_right(xs, x)
+    x0, x1 = xs[i - 1], xs[i]
+    y0, y1 = points[i - 1][1], points[i][1]
+    return y0 + (y1 - y0) * (x - x0) / (x1 - x0)
+
+
+class AdaptiveRate:
+    """
+    Maps the latest lux reading to a frame interval and, optionally, a maximum
+    exposure time. While there has been activity within activity_boost seconds
+    the base interval is used regardless of light. Changes smaller than
+    hysteresis (relative) are ignored so the camera is not reconfigured on every
+    lux sample.
+    """
+    def __init__(self, base_interval, interval_curve, exposure_curve=None, activity_boost=0, hysteresis=0.1):
+        self.base_interval = base_interval
+        self.interval_curve = interval_curve
+        self.exposure_curve = exposure_curve
+        self.activity_boost = activity_boost
+        self.hysteresis = hysteresis
+        self.interval = base_interval
+        self.max_exposure = None
+
+    def _changed(self, old, new):
+        return old is None or abs(new - old) > self.hysteresis * old
+
+    def update(self, lux, last_activity=None):
+        """
+        Returns (interval, max_exposure). Either is None when it should be left as is.
+        """
+        if lux is None:
+            return None, None
+
+        interval = interpolate_log(self.interval_curve, lux)
+        if self.activity_boost and last_activity is not None and (time.monotonic() - last_activity) < self.activity_boost:
+            interval = min(interval, self.base_interval)
+
+        new_interval = None
+        if self._changed(self.interval, interval):
+            self.interval = interval
+            new_interval = interval
+
+        new_exposure = None
+        if self.exposure_curve is not None:
+            exposure = int(interpolate_log(self.exposure_curve, lux))
+            if self._changed(self.max_exposure, exposure):
+                self.max_exposure = exposure
+                new_exposure = exposure
+
+        return new_interval, new_exposure
@@ -0,0 +1,119 @@
+import os
+import sqlite3
+import time
+
+from utilities.logger import logger as base_logger
+logger = base_logger.getChild("Catalog")
+
+
+class FrameCatalog:
+    """
+    Per-day SQLite index of saved frames.
+
+    Rows are buffered by add() and written by flush() in a single transaction.
+    They stay buffered until that transaction commits, so a failed flush
+    (e.g. a locked database) is retried by the next one; only beyond
+    max_pending buffered rows are the oldest dropped. Every method except
+    last_seq() must be called from the same thread (the pipeline writer),
+    which owns the connection.
+    """
+    def __init__(self, db_path, batch_size=50, flush_interval=10, max_pending=5000):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending = []
+        self._last_flush = time.monotonic()
+        self.rows = 0
+        self.dropped = 0
+        self._failed = False
+        self.conn = None
+
+    def last_seq(self):
+        """
+        Highest frame sequence number already catalogued, or -1. Read on its
+        own connection, so it can be called before the writer thread opens the catalog.
+        """
+        if not os.path.exists(self.db_path):
+            return -1
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            return conn.execute("SELECT coalesce(max(seq), -1) FROM frames").fetchone()[0]
+        except sqlite3.OperationalError: # no frames table yet
+            return -1
+        finally:
+            conn.close()
+
+    def open(self):
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self.conn = sqlite3.connect(self.db_path, timeout=10)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS frames (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                seq INTEGER,
+                path TEXT NOT NULL,
+                capture_time TEXT NOT NULL,
+                exposure INTEGER,
+                gain REAL,
+                lux REAL,
+                size INTEGER,
+                activity REAL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_frames_time ON frames (capture_time)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_frames_time_lux ON frames (capture_time, lux)")
+        self.conn.commit()
+
+    def add(self, frame, path):
+        self._pending.append((
+            frame.seq,
+            path,
+            frame.timestamp.isoformat(timespec='milliseconds'),
+            frame.metadata.get("ExposureTime"),
+            frame.metadata.get("AnalogueGain"),
+            frame.lux,
+            len(frame.data) if frame.data is not None else None,
+            frame.activity
+        ))
+        # after a failed flush, retry on the flush interval rather than every frame
+        if len(self._pending) >= self.batch_size and not self._failed:
+            self.flush()
+
+    def maybe_flush(self):
+        if self._pending and (time.monotonic() - self._last_flush) >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        self._last_flush = time.monotonic()
+        if not self._pending:
+            return
+        rows = list(self._pending)
+        try:
+            with self.conn:
+                self.conn.executemany("""
+                    INSERT INTO frames (seq, path, capture_time, exposure, gain, lux, size, activity)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """, rows)
+        except Exception as e:
+            logger.error(f"Failed to write {len(rows)} catalog rows, keeping them for the next flush: {e}")
+            excess = len(self._pending) - self.max_pending
+            if excess > 0:
+                del self._pending[:excess]
+                self.dropped += excess
+                logger.error(f"Catalog backlog over {self.max_pending} rows, dropped the {excess} oldest")
+            self._failed = True
+            return
+        self._failed = False
+        del self._pending[:len(rows)]
+        self.rows += len(rows)
+
+    def close(self):
+        if self.conn is None:
+            return
+        self.flush()
+        if self._pending:
+            logger.error(f"Closing catalog with {len(self._pending)} unwritten rows")
+        self.conn.close()
+        self.conn = None
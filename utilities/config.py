@@ -1,10 +1,14 @@
 import configparser
+import os
+
+DEFAULT_CONFIG_PATH = '/home/pi/bee_cam/config.ini'
 
 class Config(configparser.ConfigParser):
 
-    def __init__(self, config_path='/home/pi/bee_cam/config.ini'):
+    def __init__(self, config_path=None):
         super().__init__()
-        self.read(config_path)
+        # BEE_CAM_CONFIG points off-device runs (backend = sim) at their own config
+        self.read(config_path or os.environ.get('BEE_CAM_CONFIG', DEFAULT_CONFIG_PATH))
 
     def print(self):
         for section in self.sections():
@@ -0,0 +1,202 @@
+import queue
+import sqlite3
+import threading
+import time
+
+from utilities.metrics import Histogram
+from utilities.logger import logger as base_logger
+logger = base_logger.getChild("DBWriter")
+
+_FLUSH = object()
+_STOP = object()
+
+
+class BatchWriter(threading.Thread):
+    """
+    Owns a SQLite connection and applies queued writes on its own thread.
+
+    submit(sql, rows) only enqueues, so callers never wait on the database.
+    Pending rows are grouped by statement and applied with executemany in a
+    single transaction once max_batch rows are waiting or flush_interval has
+    passed. on_open(conn) runs once after the connection is set up, and each
+    on_flush(conn, batch) hook runs inside the flush transaction, with batch
+    being the {sql: rows} that was just written. on_commit(batch) hooks run
+    after that transaction has committed, so a hook can keep in-memory state
+    in step with what is actually on disk.
+
+    Once submit() has accepted rows the writer owns them. A flush that fails
+    (e.g. the database is locked for longer than busy_timeout) is rolled
+    back and kept pending, together with anything queued since, and retried
+    after retry_backoff seconds, doubling on each failure. The rows are only
+    dropped, with an error, after max_retries failed attempts in a row.
+    """
+    def __init__(self, db_path, name="dbwriter", flush_interval=5, max_batch=500, max_queue=10000,
+                 synchronous="NORMAL", wal_autocheckpoint=1000, on_open=None,
+                 busy_timeout=30, max_retries=5, retry_backoff=1.0):
+        super().__init__(name=name, daemon=True)
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.synchronous = synchronous
+        self.wal_autocheckpoint = wal_autocheckpoint
+        self.on_open = on_open
+        self.busy_timeout = busy_timeout
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.on_flush = []
+        self.on_commit = []
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._flushed = threading.Event()
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self._started_at = None
+        self.flush_latency = Histogram()
+        self.flushes = 0
+        self.rows_written = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.errors = 0
+        self.retries = 0
+
+    def submit(self, sql, rows):
+        """
+        Queue rows for sql. Returns False if the queue is full; the rows are
+        then counted as rejected and remain the caller's to keep or discard.
+        """
+        if not rows:
+            return True
+        try:
+            self._queue.put_nowait((sql, rows))
+            return True
+        except queue.Full:
+            with self._lock:
+                self.rejected += len(rows)
+            logger.warning(f"{self.name}: queue full, rejected {len(rows)} rows")
+            return False
+
+    def flush(self, timeout=None):
+        """
+        Ask the writer to flush now. Waits up to timeout for it to finish if timeout is given.
+        """
+        self._flushed.clear()
+        self._queue.put(_FLUSH)
+        if timeout is not None:
+            return self._flushed.wait(timeout)
+        return True
+
+    def stop(self, timeout=10):
+        self._queue.put(_STOP)
+        self.join(timeout)
+        logger.info(f"{self.name} stopped: {self.stats()}")
+
+    def wait_ready(self, timeout=None):
+        return self._ready.wait(timeout)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout)
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout * 1000)}")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        conn.execute(f"PRAGMA wal_autocheckpoint={int(self.wal_autocheckpoint)}")
+        if self.on_open is not None:
+            self.on_open(conn)
+            conn.commit()
+        return conn
+
+    def run(self):
+        conn = self._connect()
+        self._ready.set()
+        self._started_at = time.monotonic()
+        pending = {}
+        pending_rows = 0
+        failures = 0 # consecutive failed flushes of the pending rows
+        deadline = time.monotonic() + self.flush_interval
+        try:
+            while True:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    item = None
+
+                if item is not None and item is not _FLUSH and item is not _STOP:
+                    sql, rows = item
+                    pending.setdefault(sql, []).extend(rows)
+                    pending_rows += len(rows)
+                    if time.monotonic() < deadline and (pending_rows < self.max_batch or failures):
+                        continue # while backing off, only the retry deadline triggers a write
+
+                deadline = time.monotonic() + self.flush_interval
+                if pending:
+                    if not self._write(conn, pending, pending_rows):
+                        failures += 1
+                        if failures > self.max_retries or item is _STOP:
+                            with self._lock:
+                                self.dropped += pending_rows
+                            logger.error(f"{self.name}: dropped {pending_rows} rows after {failures} failed writes")
+                        else:
+                            with self._lock:
+                                self.retries += 1
+                            backoff = self.retry_backoff * 2 ** (failures - 1)
+                            deadline = time.monotonic() + backoff
+                            logger.warning(f"{self.name}: retrying {pending_rows} rows in {backoff:.1f}s")
+                            if item is _FLUSH:
+                                self._flushed.set()
+                            continue
+                    failures = 0
+                    pending = {}
+                    pending_rows = 0
+                if item is _FLUSH:
+                    self._flushed.set()
+                if item is _STOP:
+                    return
+        finally:
+            try:
+                conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+            except Exception:
+                pass
+            conn.close()
+
+    def _write(self, conn, batch, n_rows):
+        """
+        Apply batch in one transaction. Returns False if it was rolled back.
+        """
+        start = time.perf_counter()
+        try:
+            with conn:
+                for sql, rows in batch.items():
+                    conn.executemany(sql, rows)
+                for hook in self.on_flush:
+                    hook(conn, batch)
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+            logger.error(f"{self.name}: failed to write {n_rows} rows: {e}")
+            return False
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.flush_latency.record(elapsed * 1000)
+            self.flushes += 1
+            self.rows_written += n_rows
+        logger.debug(f"{self.name}: wrote {n_rows} rows in {elapsed * 1000:.1f} ms")
+        for hook in self.on_commit:
+            try:
+                hook(batch)
+            except Exception as e:
+                logger.error(f"{self.name}: on_commit hook failed: {e}")
+        return True
+
+    def stats(self):
+        with self._lock:
+            elapsed = time.monotonic() - self._started_at if self._started_at else 0.0
+            return {
+                "flushes": self.flushes,
+                "rows": self.rows_written,
+                "rows_per_s": round(self.rows_written / elapsed, 2) if elapsed > 0 else 0.0,
+                "flush_ms": self.flush_latency.summary(),
+                "queued": self._queue.qsize(),
+                "dropped": self.dropped,
+                "rejected": self.rejected,
+                "errors": self.errors,
+                "retries": self.retries
+            }
@@ -1,4 +1,5 @@
 import sys
+import threading
 import time
 from PIL import Image, ImageDraw, ImageFont
 import adafruit_ssd1306
@@ -7,7 +8,12 @@ import os
 import board
 
 class Display:
+    """
+    SSD1306 status display. Drawing is serialized with a lock, as the main
+    loop and background threads (e.g. WittyPi scheduling) both update it.
+    """
     def __init__(self, i2c=None):
+        self._lock = threading.RLock()
         self.width = 128
         self.height = 64
         self.font = ImageFont.load_default()
@@ -36,8 +42,9 @@ class Display:
             if i == 0:
                 y += 2
 
-        self._disp.image(image)
-        self._disp.show()
+        with self._lock:
+            self._disp.image(image)
+            self._disp.show()
 
     def display_sensor_data(self, temperature, humidity, pressure, wind_speed, net_status=None):
         if not self.enabled:
@@ -96,8 +103,9 @@ class Display:
     def clear_display(self):
         if not self.enabled:
             return
-        self._disp.fill(0)
-        self._disp.show()
+        with self._lock:
+            self._disp.fill(0)
+            self._disp.show()
 
     def get_ip_address(self):
         try:
@@ -0,0 +1,277 @@
+"""
+Compact binary payloads for the MQTT topics, with decoders.
+
+Every message starts with MAGIC, a format version and a kind byte, then a
+flags byte (bit 0: the rest is zlib-compressed). Integers are LEB128
+varints, signed ones zigzag-encoded. Timestamps are delta-encoded against
+the previous row, and sensor values are sent as integers scaled by
+10**decimals, with 0 reserved for None. Times are naive local times, as
+stored in the databases, carried as if they were UTC.
+
+This module only uses the standard library and nothing else from bee_cam,
+so the back end can copy it as is. decode() also accepts the older JSON
+payloads (plain or zlib-compressed), so receivers can switch before senders.
+"""
+import calendar
+import json
+import zlib
+from datetime import datetime, timedelta
+
+MAGIC = b"BC"
+VERSION = 1
+
+KIND_SENSOR_BATCH = 1
+KIND_CAMERA_STATUS = 2
+KIND_HEARTBEAT = 3
+
+FLAG_ZLIB = 0x01
+
+ENCODINGS = ("json", "binary")
+
+# Decimal places kept per sensor_data column; others get DEFAULT_DECIMALS
+DECIMALS = {
+    "temperature": 2,
+    "relative_humidity": 1,
+    "pressure": 2,
+    "wind_speed": 2,
+    "wind_gust": 2,
+    "wind_std": 2,
+    "internal_temp": 2,
+    "lux": 3 # dusk and night readings are well below 1 lux
+}
+DEFAULT_DECIMALS = 3
+
+SYNC_STATUS = ("good", "out of sync", "DOWN")
+SENSOR_TIME_FORMAT = "%Y%m%d_%H%M%S"
+_EPOCH = datetime(1970, 1, 1)
+
+
+class DecodeError(ValueError):
+    pass
+
+
+# ---- primitives -------------------------------------------------------------
+
+def _put_uint(out, n):
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _zigzag(n):
+    return n * 2 if n >= 0 else -n * 2 - 1
+
+
+def _unzigzag(n):
+    return n >> 1 if not n & 1 else -(n >> 1) - 1
+
+
+def _put_int(out, n):
+    _put_uint(out, _zigzag(n))
+
+
+def _put_str(out, s):
+    data = s.encode()
+    _put_uint(out, len(data))
+    out += data
+
+
+class _Reader:
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def uint(self):
+        result = shift = 0
+        while True:
+            if self.pos >= len(self.data):
+                raise DecodeError("truncated payload")
+            b = self.data[self.pos]
+            self.pos += 1
+            result |= (b & 0x7F) << shift
+            if b < 0x80:
+                return result
+            shift += 7
+
+    def int(self):
+        return _unzigzag(self.uint())
+
+    def byte(self):
+        if self.pos >= len(self.data):
+            raise DecodeError("truncated payload")
+        self.pos += 1
+        return self.data[self.pos - 1]
+
+    def str(self):
+        n = self.uint()
+        if self.pos + n > len(self.data):
+            raise DecodeError("truncated payload")
+        self.pos += n
+        return bytes(self.data[self.pos - n:self.pos]).decode()
+
+
+def _seconds(dt):
+    return calendar.timegm(dt.timetuple())
+
+
+def _from_seconds(s):
+    return _EPOCH + timedelta(seconds=s)
+
+
+def _frame(kind, body, compress=True):
+    flags = 0
+    if compress:
+        packed = zlib.compress(bytes(body), 9)
+        if len(packed) < len(body):
+            body, flags = packed, FLAG_ZLIB
+    return MAGIC + bytes((VERSION, kind, flags)) + bytes(body)
+
+
+# ---- encoders ---------------------------------------------------------------
+
+def encode_sensor_batch(columns, rows):
+    """
+    sensor_data rows (as lists in columns order, including id, name and time).
+    """
+    id_idx, name_idx, time_idx = columns.index("id"), columns.index("name"), columns.index("time")
+    values = [(i, c) for i, c in enumerate(columns) if i not in (id_idx, name_idx, time_idx)]
+    out = bytearray()
+    _put_uint(out, len(columns))
+    for c in columns:
+        _put_str(out, c)
+        out.append(DECIMALS.get(c, DEFAULT_DECIMALS))
+    names = sorted({row[name_idx] or "" for row in rows})
+    name_pos = {n: i for i, n in enumerate(names)}
+    _put_uint(out, len(names))
+    for n in names:
+        _put_str(out, n)
+
+    _put_uint(out, len(rows))
+    prev_id = prev_t = 0
+    scales = [10 ** DECIMALS.get(c, DEFAULT_DECIMALS) for _, c in values]
+    for row in rows:
+        t = _seconds(datetime.strptime(row[time_idx], SENSOR_TIME_FORMAT))
+        _put_int(out, row[id_idx] - prev_id)
+        _put_int(out, t - prev_t)
+        prev_id, prev_t = row[id_idx], t
+        _put_uint(out, name_pos[row[name_idx] or ""])
+        for (i, _), scale in zip(values, scales):
+            v = row[i]
+            if v is None:
+                out.append(0)
+            else:
+                _put_uint(out, 1 + _zigzag(int(round(v * scale))))
+    return _frame(KIND_SENSOR_BATCH, out)
+
+
+def encode_camera_status(camera, last_seen, sync_status, camera_on):
+    """
+    last_seen is an ISO timestamp; sub-second precision is dropped.
+    """
+    out = bytearray()
+    _put_str(out, camera)
+    _put_uint(out, _seconds(datetime.fromisoformat(last_seen)))
+    if sync_status in SYNC_STATUS:
+        out.append(SYNC_STATUS.index(sync_status))
+    else:
+        out.append(0xFF)
+        _put_str(out, sync_status)
+    out.append(1 if camera_on else 0)
+    return _frame(KIND_CAMERA_STATUS, out, compress=False)
+
+
+def encode_heartbeat(name, timestamp, cam_on):
+    """
+    timestamp is an ISO timestamp, kept to the millisecond.
+    """
+    dt = datetime.fromisoformat(timestamp)
+    out = bytearray()
+    _put_str(out, name)
+    _put_uint(out, _seconds(dt) * 1000 + dt.microsecond // 1000)
+    out.append(int(cam_on) & 0xFF)
+    return _frame(KIND_HEARTBEAT, out, compress=False)
+
+
+# ---- decoders ---------------------------------------------------------------
+
+def _lookup(table, index, what):
+    if index >= len(table):
+        raise DecodeError(f"{what} {index} out of range")
+    return table[index]
+
+
+def _decode_sensor_batch(r):
+    columns, decimals = [], []
+    for _ in range(r.uint()):
+        columns.append(r.str())
+        decimals.append(r.byte())
+    names = [r.str() for _ in range(r.uint())]
+    id_idx, name_idx, time_idx = columns.index("id"), columns.index("name"), columns.index("time")
+    values = [i for i in range(len(columns)) if i not in (id_idx, name_idx, time_idx)]
+
+    rows = []
+    row_id = t = 0
+    for _ in range(r.uint()):
+        row = [None] * len(columns)
+        row_id += r.int()
+        t += r.int()
+        row[id_idx] = row_id
+        row[time_idx] = _from_seconds(t).strftime(SENSOR_TIME_FORMAT)
+        row[name_idx] = _lookup(names, r.uint(), "name index") or None
+        for i in values:
+            n = r.uint()
+            if n:
+                n = _unzigzag(n - 1)
+                row[i] = round(n / 10 ** decimals[i], decimals[i]) if decimals[i] else n
+        rows.append(row)
+    return {"v": VERSION, "cols": columns, "rows": rows}
+
+
+def _decode_camera_status(r):
+    camera = r.str()
+    last_seen = _from_seconds(r.uint()).isoformat()
+    code = r.byte()
+    sync_status = r.str() if code == 0xFF else _lookup(SYNC_STATUS, code, "sync status code")
+    return {"camera": camera, "last_seen": last_seen, "sync_status": sync_status, "camera_on": bool(r.byte())}
+
+
+def _decode_heartbeat(r):
+    name = r.str()
+    ms = r.uint()
+    timestamp = (_from_seconds(ms // 1000) + timedelta(milliseconds=ms % 1000)).isoformat(timespec="milliseconds")
+    return {"name": name, "timestamp": timestamp, "cam_on": r.byte()}
+
+
+_DECODERS = {
+    KIND_SENSOR_BATCH: _decode_sensor_batch,
+    KIND_CAMERA_STATUS: _decode_camera_status,
+    KIND_HEARTBEAT: _decode_heartbeat
+}
+
+
+def decode(payload):
+    """
+    Decode any bee_cam payload to the dict its JSON form would have:
+    binary (this module), zlib-compressed JSON (uplink batches) or plain JSON.
+    """
+    if isinstance(payload, str):
+        payload = payload.encode()
+    if payload[:2] == MAGIC:
+        if len(payload) < 5:
+            raise DecodeError("truncated header")
+        version, kind, flags = payload[2], payload[3], payload[4]
+        if version != VERSION:
+            raise DecodeError(f"unsupported payload version {version}")
+        if kind not in _DECODERS:
+            raise DecodeError(f"unknown payload kind {kind}")
+        body = payload[5:]
+        if flags & FLAG_ZLIB:
+            try:
+                body = zlib.decompress(body)
+            except zlib.error as e:
+                raise DecodeError(f"corrupt compressed body: {e}")
+        return _DECODERS[kind](_Reader(body))
+    if payload[:1] == b"\x78": # zlib header
+        payload = zlib.decompress(payload)
+    return json.loads(payload.decode())
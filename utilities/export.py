@@ -0,0 +1,238 @@
+import csv
+import glob
+import gzip
+import json
+import os
+import sqlite3
+import sys
+
+from utilities.config import Config
+from utilities.logger import logger as base_logger
+logger = base_logger.getChild("Export")
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+FORMATS = ("auto", "parquet", "csv")
+
+
+def row_day(value):
+    """
+    YYYYmmdd from either sensor_data's "%Y%m%d_%H%M%S" or an ISO timestamp.
+    """
+    if not value:
+        return "unknown"
+    value = str(value)
+    if len(value) >= 10 and value[4] == "-":
+        return value[:4] + value[5:7] + value[8:10]
+    return value[:8]
+
+
+class TableSource:
+    """
+    One exportable table: which database it lives in, the state key its
+    high-water mark is stored under, and the column rows are split into days by.
+    """
+    def __init__(self, key, db_path, table, time_col, day=None):
+        self.key = key
+        self.db_path = db_path
+        self.table = table
+        self.time_col = time_col
+        self.day = day # fixed day for per-day databases (frame catalogs)
+
+
+class ColumnarExporter:
+    """
+    Streams rows with id above the stored high-water mark into compressed
+    per-day part files under out_dir/<table>/<YYYYmmdd>/. Rows are read with
+    fetchmany(chunk_rows), so memory stays flat however far behind the
+    export is. Parquet is written when pyarrow is installed, gzipped CSV
+    otherwise.
+
+    Part files are written under a .tmp name and renamed when complete; the
+    high-water mark is only saved after that, so an interrupted run is simply
+    redone from the previous mark.
+    """
+    def __init__(self, out_dir, state_path=None, chunk_rows=5000, fmt="auto"):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown export format {fmt}, expected one of {FORMATS}")
+        if fmt == "parquet" and pa is None:
+            raise RuntimeError("Parquet export requested but pyarrow is not installed")
+        self.out_dir = out_dir
+        self.state_path = state_path or os.path.join(out_dir, "export_state.json")
+        self.chunk_rows = chunk_rows
+        self.fmt = "parquet" if fmt == "parquet" or (fmt == "auto" and pa is not None) else "csv"
+        self.state = self._load_state()
+
+    def _load_state(self):
+        try:
+            with open(self.state_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.warning(f"Export state unreadable, starting from scratch: {e}")
+            return {}
+
+    def _save_state(self):
+        os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.state, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.state_path)
+
+    def export(self, source):
+        """
+        Export new rows of one source. Returns the number of rows written.
+        """
+        if not os.path.exists(source.db_path):
+            return 0
+        last_id = self.state.get(source.key, 0)
+        conn = sqlite3.connect(f"file:{source.db_path}?mode=ro", uri=True)
+        sinks = {}
+        rows_out = 0
+        try:
+            columns, types = self._schema(conn, source.table)
+            if not columns:
+                return 0
+            day_idx = columns.index(source.time_col)
+            cur = conn.execute(f"SELECT {', '.join(columns)} FROM {source.table} WHERE id > ? ORDER BY id", (last_id,))
+            while True:
+                rows = cur.fetchmany(self.chunk_rows)
+                if not rows:
+                    break
+                by_day = {}
+                for row in rows:
+                    by_day.setdefault(source.day or row_day(row[day_idx]), []).append(row)
+                for day, day_rows in by_day.items():
+                    sink = sinks.get(day)
+                    if sink is None:
+                        sink = sinks[day] = self._open_sink(source, day, day_rows[0][0], columns, types)
+                    sink.write(day_rows)
+                rows_out += len(rows)
+                last_id = rows[-1][0]
+        except Exception:
+            for sink in sinks.values():
+                sink.abort()
+            raise
+        finally:
+            conn.close()
+
+        for sink in sinks.values():
+            sink.close()
+        if rows_out:
+            self.state[source.key] = last_id
+            self._save_state()
+            logger.info(f"Exported {rows_out} rows from {source.key} up to id {last_id}")
+        return rows_out
+
+    def _schema(self, conn, table):
+        info = conn.execute(f"PRAGMA table_info({table})").fetchall()
+        columns = [row[1] for row in info]
+        if columns and columns[0] != "id":
+            columns.remove("id")
+            columns.insert(0, "id")
+        types = {row[1]: row[2].upper() for row in info}
+        return columns, types
+
+    def _open_sink(self, source, day, first_id, columns, types):
+        part_dir = os.path.join(self.out_dir, source.table, day)
+        os.makedirs(part_dir, exist_ok=True)
+        prefix = os.path.join(part_dir, f"{source.key.replace('/', '_')}_{first_id:010d}")
+        if self.fmt == "parquet":
+            return ParquetSink(prefix + ".parquet", columns, types)
+        return CsvSink(prefix + ".csv.gz", columns)
+
+    def run(self, sources):
+        total = 0
+        for source in sources:
+            try:
+                total += self.export(source)
+            except Exception as e:
+                logger.error(f"Export of {source.key} failed: {e}")
+        return total
+
+
+class CsvSink:
+    def __init__(self, path, columns):
+        self.path = path
+        self._f = gzip.open(path + ".tmp", "wt", newline="", compresslevel=6)
+        self._writer = csv.writer(self._f)
+        self._writer.writerow(columns)
+
+    def write(self, rows):
+        self._writer.writerows(rows)
+
+    def close(self):
+        self._f.close()
+        os.replace(self.path + ".tmp", self.path)
+
+    def abort(self):
+        self._f.close()
+        os.remove(self.path + ".tmp")
+
+
+class ParquetSink:
+    def __init__(self, path, columns, types):
+        self.path = path
+        self.columns = columns
+        self.schema = pa.schema([(c, self._arrow_type(types.get(c, ""))) for c in columns])
+        self._writer = pq.ParquetWriter(path + ".tmp", self.schema, compression="zstd")
+
+    @staticmethod
+    def _arrow_type(decl):
+        # SQLite type affinity rules, reduced to what these tables use
+        if "INT" in decl or decl == "BOOLEAN":
+            return pa.int64()
+        if any(t in decl for t in ("REAL", "FLOA", "DOUB")):
+            return pa.float64()
+        return pa.string()
+
+    def write(self, rows):
+        data = {c: [row[i] for row in rows] for i, c in enumerate(self.columns)}
+        self._writer.write_table(pa.Table.from_pydict(data, schema=self.schema))
+
+    def close(self):
+        self._writer.close()
+        os.replace(self.path + ".tmp", self.path)
+
+    def abort(self):
+        self._writer.close()
+        os.remove(self.path + ".tmp")
+
+
+def default_sources(config, package_root):
+    sources = []
+    sensor_db = os.path.join(package_root, config.get('communication', 'sensor_db', fallback='data/sensor.db'))
+    sources.append(TableSource("sensor_data", sensor_db, "sensor_data", "time"))
+    hb_db = os.path.join(package_root, config.get('communication', 'mqtt_db', fallback='data/heartbeat.db'))
+    sources.append(TableSource("heartbeats", hb_db, "heartbeats", "receipt_time"))
+    # frame catalogs are per day: data/<YYYY-mm-dd>/catalog.db
+    for db_path in sorted(glob.glob(os.path.join(package_root, "data", "*", "catalog.db"))):
+        day = os.path.basename(os.path.dirname(db_path))
+        sources.append(TableSource(f"frames/{day}", db_path, "frames", "capture_time", day=day.replace("-", "")))
+    return sources
+
+
+def main(args):
+    config = Config()
+    package_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    out_dir = os.path.join(package_root, config.get('export', 'export_dir', fallback='data/export'))
+    exporter = ColumnarExporter(
+        out_dir,
+        chunk_rows=config.getint('export', 'chunk_rows', fallback=5000),
+        fmt=config.get('export', 'format', fallback='auto').strip().lower()
+    )
+    sources = default_sources(config, package_root)
+    if args: # only the named tables, e.g. "sensor_data frames"
+        sources = [s for s in sources if s.table in args or s.key in args]
+    total = exporter.run(sources)
+    print(f"Exported {total} rows as {exporter.fmt} to {out_dir}")
+
+
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,170 @@
+import threading
+import time
+from contextlib import contextmanager
+
+import board
+
+from utilities.metrics import Histogram
+from utilities.logger import logger as base_logger
+logger = base_logger.getChild("I2C")
+
+# Known devices on the bee_cam boards, for readable stats
+DEVICE_NAMES = {
+    0x08: "wittypi",
+    0x10: "veml7700",
+    0x3C: "ssd1306",
+    0x44: "sht31d",
+    0x48: "ads1115",
+    0x77: "bmp3xx"
+}
+
+
+class DeviceStats:
+    __slots__ = ("latency", "errors")
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.errors = 0
+
+
+class I2CBusManager:
+    """
+    Single owner of the I2C bus. Every user (Adafruit drivers through the
+    proxy from i2c(), WittyPi's SMBus handle through transaction(), the sensor
+    poller and wind sampler through acquire()/release()) is serialized by one
+    reentrant lock, so every wait for the bus shows up in lock_wait and
+    lock_timeouts, and every transaction is timed per device address.
+
+    The manager can be used like a lock: "with bus:" holds it across several
+    back-to-back transactions so no other thread can slip in between, e.g.
+    the two reads of one sensor, and raises TimeoutError if the bus stays busy.
+    """
+    def __init__(self, i2c=None, lock_timeout=2.0):
+        self._i2c = i2c if i2c is not None else board.I2C()
+        self.lock = threading.RLock()
+        self.lock_timeout = lock_timeout
+        self.lock_wait = Histogram()
+        self.lock_timeouts = 0
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+
+    def i2c(self):
+        """
+        busio.I2C-compatible handle to pass to Adafruit drivers and Display.
+        """
+        return SharedI2C(self)
+
+    def acquire(self, timeout=None):
+        start = time.perf_counter()
+        ok = self.lock.acquire(timeout=self.lock_timeout if timeout is None else timeout)
+        with self._stats_lock:
+            if ok:
+                self.lock_wait.record((time.perf_counter() - start) * 1000)
+            else:
+                self.lock_timeouts += 1
+        return ok
+
+    def release(self):
+        self.lock.release()
+
+    def record(self, address, seconds, error=False):
+        with self._stats_lock:
+            stats = self._stats.get(address)
+            if stats is None:
+                stats = self._stats[address] = DeviceStats()
+            stats.latency.record(seconds * 1000)
+            if error:
+                stats.errors += 1
+
+    def timed(self, address, fn, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            self.record(address, time.perf_counter() - start, error=True)
+            raise
+        self.record(address, time.perf_counter() - start)
+        return result
+
+    @contextmanager
+    def transaction(self, address):
+        """
+        Lock the bus for one device and time the block. For callers with their
+        own handle on the bus (WittyPi's SMBus).
+        """
+        if not self.acquire():
+            raise TimeoutError(f"I2C bus busy, could not reach {DEVICE_NAMES.get(address, hex(address))}")
+        start = time.perf_counter()
+        error = False
+        try:
+            yield
+        except Exception:
+            error = True
+            raise
+        finally:
+            self.record(address, time.perf_counter() - start, error)
+            self.release()
+
+    def __enter__(self):
+        if not self.acquire():
+            raise TimeoutError("I2C bus busy")
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+    def stats(self):
+        with self._stats_lock:
+            devices = {DEVICE_NAMES.get(addr, hex(addr)): dict(s.latency.summary(), errors=s.errors)
+                       for addr, s in self._stats.items()}
+            return {
+                "devices": devices,
+                "lock_wait_ms": self.lock_wait.summary(),
+                "lock_timeouts": self.lock_timeouts
+            }
+
+    def deinit(self):
+        self._i2c.deinit()
+
+
+class SharedI2C:
+    """
+    Proxy with the busio.I2C interface Adafruit drivers expect. try_lock()
+    takes the manager's lock (waiting up to its timeout instead of failing at
+    once) and each read/write is timed against the target address.
+    deinit() is a no-op: the manager owns the real bus.
+    """
+    def __init__(self, manager):
+        self._manager = manager
+        self._bus = manager._i2c
+
+    def try_lock(self):
+        return self._manager.acquire()
+
+    def unlock(self):
+        self._manager.release()
+
+    def readfrom_into(self, address, buffer, **kwargs):
+        return self._manager.timed(address, self._bus.readfrom_into, address, buffer, **kwargs)
+
+    def writeto(self, address, buffer, **kwargs):
+        return self._manager.timed(address, self._bus.writeto, address, buffer, **kwargs)
+
+    def writeto_then_readfrom(self, address, buffer_out, buffer_in, **kwargs):
+        return self._manager.timed(address, self._bus.writeto_then_readfrom, address, buffer_out, buffer_in, **kwargs)
+
+    def scan(self):
+        return self._bus.scan()
+
+    def deinit(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    @property
+    def frequency(self):
+        return getattr(self._bus, "frequency", None)
@@ -0,0 +1,125 @@
+import heapq
+import threading
+import time
+from collections import deque
+
+from utilities.logger import logger as base_logger
+logger = base_logger.getChild("Liveness")
+
+
+class LivenessTracker(threading.Thread):
+    """
+    Fires on_down(camera_name, last_seen_age) when a camera has not sent a
+    heartbeat for timeout seconds, and on_up(camera_name) when a down camera
+    is heard from again.
+
+    Each camera has at most one entry on a min-heap of expiries. A heartbeat
+    only records the time it was seen; when a camera's entry surfaces and
+    the camera has been heard from since, the entry is pushed back with the
+    new expiry instead of firing (lazy rescheduling). The heap therefore
+    never holds more than one entry per camera, and a heartbeat costs a dict
+    update. The thread sleeps on a Condition until the earliest expiry, so a
+    DOWN fires at its deadline rather than on the next poll. Callbacks run on
+    this thread, in the order the transitions happened, never on the caller's.
+    """
+    def __init__(self, timeout, on_down, on_up, grace=0.0):
+        super().__init__(name="liveness", daemon=True)
+        self.timeout = timeout
+        self.on_down = on_down
+        self.on_up = on_up
+        self.grace_end = time.monotonic() + grace # no DOWN before this
+        self._heap = [] # (expiry, camera_name)
+        self._cameras = {} # camera_name -> [scheduled (has a heap entry), last_seen (monotonic), is_down]
+        self._transitions = deque()
+        self._cond = threading.Condition()
+        self._stopped = False
+        self.downs = 0
+        self.ups = 0
+
+    def _expiry(self, cam):
+        return max(cam[1] + self.timeout, self.grace_end)
+
+    def heartbeat(self, camera_name, age=0.0):
+        """
+        Record a heartbeat received age seconds ago (0 = now).
+        """
+        seen = time.monotonic() - age
+        with self._cond:
+            cam = self._cameras.get(camera_name)
+            if cam is None:
+                cam = self._cameras[camera_name] = [False, seen, False]
+            cam[1] = max(cam[1], seen)
+            if cam[2]:
+                cam[2] = False
+                self._transitions.append(("up", camera_name, 0.0))
+            pushed = not cam[0]
+            if pushed:
+                cam[0] = True
+                heapq.heappush(self._heap, (self._expiry(cam), camera_name))
+            # an existing entry is only ever pushed back, so the thread needs waking only for news
+            if self._transitions or (pushed and self._heap[0][1] == camera_name):
+                self._cond.notify()
+
+    def track(self, camera_name, age, down=False):
+        """
+        Seed a camera known from before startup, last seen age seconds ago.
+        """
+        self.heartbeat(camera_name, age)
+        if down: # already reported, so don't fire again
+            with self._cond:
+                self._cameras[camera_name][2] = True
+
+    def is_down(self, camera_name):
+        with self._cond:
+            cam = self._cameras.get(camera_name)
+            return cam is not None and cam[2]
+
+    def run(self):
+        while True:
+            with self._cond:
+                while not self._stopped and not self._transitions:
+                    now = time.monotonic()
+                    while self._heap and self._heap[0][0] <= now:
+                        _, camera_name = heapq.heappop(self._heap)
+                        cam = self._cameras[camera_name]
+                        expiry = self._expiry(cam)
+                        if expiry > now: # heard from since this entry was pushed
+                            heapq.heappush(self._heap, (expiry, camera_name))
+                            continue
+                        cam[0] = False
+                        if not cam[2]:
+                            cam[2] = True
+                            self._transitions.append(("down", camera_name, now - cam[1]))
+                    if self._transitions:
+                        break
+                    self._cond.wait(self._heap[0][0] - now if self._heap else None)
+                if self._stopped:
+                    return
+                transitions = list(self._transitions)
+                self._transitions.clear()
+
+            for kind, camera_name, age in transitions:
+                try:
+                    if kind == "down":
+                        self.downs += 1
+                        self.on_down(camera_name, age)
+                    else:
+                        self.ups += 1
+                        self.on_up(camera_name)
+                except Exception as e:
+                    logger.error(f"Liveness {kind} callback for {camera_name} failed: {e}")
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "cameras": len(self._cameras),
+                "down": sum(1 for cam in self._cameras.values() if cam[2]),
+                "heap": len(self._heap),
+                "downs": self.downs,
+                "ups": self.ups
+            }
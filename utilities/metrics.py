@@ -0,0 +1,87 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Bucket upper bounds in milliseconds; anything slower lands in the overflow bucket
+DEFAULT_BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+
+class Histogram:
+    """
+    Fixed-bucket latency histogram. Recording is a bisect and an increment,
+    so it is cheap enough for the capture path. Percentiles are interpolated
+    linearly inside the bucket they fall in.
+    """
+    def __init__(self, bounds_ms=DEFAULT_BOUNDS_MS):
+        self.bounds = tuple(bounds_ms)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, ms):
+        self.counts[bisect.bisect_left(self.bounds, ms)] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def percentile(self, p):
+        if self.count == 0:
+            return None
+        rank = p / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = self.bounds[i - 1] if i > 0 else 0.0
+                upper = min(self.bounds[i], self.max) if i < len(self.bounds) else self.max
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return self.max
+
+    def summary(self):
+        if self.count == 0:
+            return {"n": 0}
+        return {
+            "n": self.count,
+            "mean": round(self.total / self.count, 2),
+            "p50": round(self.percentile(50), 2),
+            "p95": round(self.percentile(95), 2),
+            "p99": round(self.percentile(99), 2),
+            "max": round(self.max, 2)
+        }
+
+
+class LatencyRecorder:
+    """
+    One Histogram per named stage, safe to record into from several threads.
+    summary() returns per-stage stats in milliseconds and, by default, starts
+    a fresh window so each report covers only the time since the last one.
+    """
+    def __init__(self, bounds_ms=DEFAULT_BOUNDS_MS):
+        self.bounds_ms = bounds_ms
+        self._hists = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            hist = self._hists.get(stage)
+            if hist is None:
+                hist = self._hists[stage] = Histogram(self.bounds_ms)
+            hist.record(seconds * 1000)
+
+    @contextmanager
+    def time(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def summary(self, reset=True):
+        with self._lock:
+            hists = self._hists
+            if reset:
+                self._hists = {}
+        return {stage: hist.summary() for stage, hist in hists.items()}
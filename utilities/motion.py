@@ -0,0 +1,88 @@
+import time
+
+import numpy as np
+
+from utilities.logger import logger as base_logger
+logger = base_logger.getChild("Motion")
+
+
+class MotionDetector:
+    """
+    Activity score from frame differencing on the lores luminance plane.
+
+    Each frame is compared against an exponentially weighted background. The
+    score is the fraction of pixels whose difference exceeds pixel_delta, so
+    it does not depend on lores resolution. All working buffers are allocated
+    once on the first frame and reused.
+    """
+    def __init__(self, threshold=0.01, pixel_delta=20, alpha=0.05, hold=2.0, warmup=5):
+        self.threshold = threshold
+        self.pixel_delta = pixel_delta
+        self.alpha = alpha
+        self.hold = hold # seconds to keep saving after the last active frame
+        self.warmup = warmup # frames used to settle the background before triggering
+
+        self.background = None
+        self._frame = None
+        self._diff = None
+        self._mask = None
+
+        self.frames = 0
+        self.triggered_frames = 0
+        self.last_score = 0.0
+        self.last_trigger = None # monotonic time of the last over-threshold frame
+        self._active_until = 0.0
+
+    def _allocate(self, shape):
+        self.background = np.empty(shape, dtype=np.float32)
+        self._frame = np.empty(shape, dtype=np.float32)
+        self._diff = np.empty(shape, dtype=np.float32)
+        self._mask = np.empty(shape, dtype=bool)
+
+    def update(self, luma):
+        """
+        Score one luminance frame (2D uint8 array) and fold it into the background.
+        """
+        if self.background is None or self.background.shape != luma.shape:
+            self._allocate(luma.shape)
+            np.copyto(self.background, luma, casting='unsafe')
+            self.frames = 1
+            self.last_score = 0.0
+            return 0.0
+
+        np.copyto(self._frame, luma, casting='unsafe')
+        np.subtract(self._frame, self.background, out=self._diff)
+        np.abs(self._diff, out=self._diff)
+        np.greater(self._diff, self.pixel_delta, out=self._mask)
+        score = float(np.count_nonzero(self._mask)) / self._mask.size
+
+        # background += alpha * (frame - background)
+        np.subtract(self._frame, self.background, out=self._diff)
+        self._diff *= self.alpha
+        self.background += self._diff
+
+        self.frames += 1
+        self.last_score = score
+        return score
+
+    def active(self, score, now=None):
+        """
+        True while the score is over threshold, and for hold seconds afterwards.
+        """
+        now = time.monotonic() if now is None else now
+        if self.frames <= self.warmup:
+            return False
+        if score >= self.threshold:
+            self.last_trigger = now
+            self._active_until = now + self.hold
+        if now < self._active_until:
+            self.triggered_frames += 1
+            return True
+        return False
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "triggered": self.triggered_frames,
+            "last_score": round(self.last_score, 5)
+        }
@@ -11,6 +11,21 @@ from datetime import datetime
 import paho.mqtt.client as mqtt
 
 from utilities.config import Config
+from utilities.dbwriter import BatchWriter
+from utilities.rollup import HeartbeatRollup, Retention
+from utilities.liveness import LivenessTracker
+from utilities.uplink import UplinkQueue, encode_json_zlib
+from utilities import encoding
+
+HEARTBEAT_INSERT = "INSERT INTO heartbeats (camera_name, receipt_time) VALUES (?, ?)"
+CAMERA_STATUS_UPSERT = """
+    INSERT INTO camera_status (camera_name, last_seen, sync_status, camera_on)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(camera_name) DO UPDATE SET
+        last_seen = excluded.last_seen,
+        sync_status = excluded.sync_status,
+        camera_on = excluded.camera_on
+"""
 
 class MQTTManager:
     def __init__(self):
@@ -39,6 +54,15 @@ class MQTTManager:
         self.heartbeat_topic = "heartbeat"
         self.hub_IP = self.config['communication'].get('network_ip', '192.168.2.1')
 
+        # Payload encoding per topic (json/binary); binary is utilities.encoding
+        self.encodings = {}
+        for topic in ("sensors", "status", "heartbeat"):
+            enc = self.config.get('communication', f'encoding_{topic}', fallback='json').strip().lower()
+            if enc not in encoding.ENCODINGS:
+                logger.warning(f"Unknown encoding_{topic} '{enc}', using json")
+                enc = 'json'
+            self.encodings[topic] = enc
+
         self.last_seen_cache = {}
         self.camera_warnings = {}
         self.camera_sync_status = {}
@@ -49,29 +73,53 @@ class MQTTManager:
         cert_path = os.path.join(os.path.dirname(__file__), "mycert.crt")
         self.remote_client.tls_set(ca_certs=cert_path)
         self.remote_client.on_connect = self._on_remote_connect
+        self.remote_client.on_disconnect = self._on_remote_disconnect
 
         # Local client (LAN heartbeat)
         self.local_client = mqtt.Client(client_id=f"{self.unit_name}_local", callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
         self.local_client.on_connect = self._on_local_connect
         self.local_client.on_message = self._on_local_message
 
-        # DB connections
-        self.sensor_conn = sqlite3.connect(self.sensor_db_path, check_same_thread=False)
-        self.sensor_cursor = self.sensor_conn.cursor()
+        self.uplink = None # started by start() on the server
 
-        self.hb_conn = sqlite3.connect(self.heartbeat_db_path, check_same_thread=False)
-        self.hb_cursor = self.hb_conn.cursor()
+        # Heartbeat state lives in memory; heartbeat.db is written behind it by hb_writer
+        self.camera_state = {} # camera_name -> [last_seen, sync_status, camera_on]
+        self._state_lock = threading.Lock()
+        self.hb_rollup = HeartbeatRollup(HEARTBEAT_INSERT)
+        self.hb_retention = None
         self._init_heartbeat_db()
+        self.hb_writer = BatchWriter(
+            self.heartbeat_db_path, name="heartbeat-writer",
+            flush_interval=self.config.getint('communication', 'hb_flush_interval', fallback=10),
+            max_batch=self.config.getint('communication', 'hb_max_batch', fallback=200),
+            synchronous=self.config.get('communication', 'hb_synchronous', fallback='NORMAL')
+        )
+        self.hb_writer.on_flush.append(self.hb_rollup.on_flush)
+        self.hb_writer.start()
+
+        self.liveness = LivenessTracker(self.TIMEOUT_THRESHOLD, self._on_camera_down, self._on_camera_up,
+                                        grace=self.STARTUP_GRACE_PERIOD)
+        now = datetime.now()
+        for camera_name, (last_seen, sync_status, _) in self.camera_status().items():
+            try:
+                age = max(0.0, (now - datetime.fromisoformat(last_seen)).total_seconds())
+            except ValueError:
+                age = self.TIMEOUT_THRESHOLD
+            self.liveness.track(camera_name, age, down=sync_status == "DOWN")
+            if sync_status == "DOWN":
+                self.camera_warnings[camera_name] = "down" # announce UP when it comes back
 
     def _init_heartbeat_db(self):
-        self.hb_cursor.execute("""
+        conn = sqlite3.connect(self.heartbeat_db_path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
             CREATE TABLE IF NOT EXISTS heartbeats (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 camera_name TEXT NOT NULL,
                 receipt_time TEXT NOT NULL
             )
         """)
-        self.hb_cursor.execute("""
+        conn.execute("""
             CREATE TABLE IF NOT EXISTS camera_status (
                 camera_name TEXT PRIMARY KEY,
                 last_seen TEXT NOT NULL,
@@ -79,7 +127,42 @@ class MQTTManager:
                 camera_on BOOLEAN NOT NULL DEFAULT 0
             )
         """)
-        self.hb_conn.commit()
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_heartbeats_camera_time ON heartbeats (camera_name, receipt_time)")
+        self.hb_rollup.create_tables(conn)
+        conn.commit()
+        for camera_name, last_seen, sync_status, camera_on in conn.execute(
+                "SELECT camera_name, last_seen, sync_status, camera_on FROM camera_status"):
+            self.camera_state[camera_name] = [last_seen, sync_status, camera_on]
+        conn.close()
+
+    def _set_camera_state(self, camera_name, last_seen=None, sync_status=None, camera_on=None):
+        """
+        Update a camera's in-memory status and queue the write-through. Every
+        camera_status write uses the same upsert, so the writer's per-statement
+        batching cannot reorder them.
+        """
+        with self._state_lock:
+            state = self.camera_state.get(camera_name)
+            if state is None:
+                if last_seen is None:
+                    return None
+                state = self.camera_state[camera_name] = [last_seen, sync_status or "good", camera_on or 0]
+            if last_seen is not None:
+                state[0] = last_seen
+            if sync_status is not None:
+                state[1] = sync_status
+            if camera_on is not None:
+                state[2] = camera_on
+            row = (camera_name, *state)
+        self.hb_writer.submit(CAMERA_STATUS_UPSERT, [row])
+        return row
+
+    def camera_status(self):
+        """
+        Snapshot of {camera_name: (last_seen, sync_status, camera_on)}.
+        """
+        with self._state_lock:
+            return {name: tuple(state) for name, state in self.camera_state.items()}
 
     def _on_local_connect(self, client, userdata, flags, rc, properties=None):
         self.is_local_connected = rc == 0
@@ -97,12 +180,29 @@ class MQTTManager:
             logger.info("Connected to remote MQTT broker (EMQX)")
         else:
             logger.error(f"Remote MQTT connection failed with code {rc}")
+        if self.uplink is not None:
+            self.uplink.set_connected(self.is_remote_connected)
+
+    def _on_remote_disconnect(self, client, userdata, flags, rc, properties=None):
+        self.is_remote_connected = False
+        logger.warning(f"Disconnected from remote MQTT broker: {rc}")
+        if self.uplink is not None:
+            self.uplink.set_connected(False)
+
+    def camera_uptime(self, since=None, until=None):
+        """
+        {camera_name: (hours with heartbeats, estimated hours up)} from the hourly summary.
+        """
+        conn = sqlite3.connect(f"file:{self.heartbeat_db_path}?mode=ro", uri=True)
+        try:
+            return self.hb_rollup.uptime(conn, since, until)
+        finally:
+            conn.close()
 
     def get_network_status(self):
         try:
-            self.hb_cursor.execute("SELECT camera_name FROM camera_status WHERE camera_on = 1")
             active_cameras = [
-            ''.join(filter(str.isdigit, row[0])) for row in self.hb_cursor.fetchall()
+            ''.join(filter(str.isdigit, name)) for name, state in self.camera_status().items() if state[2]
             ]
         except Exception as e:
             logger.warning(f"Failed to fetch active camera list: {e}")
@@ -116,7 +216,7 @@ class MQTTManager:
     def _on_local_message(self, client, userdata, msg):
         try:
             logger.debug(f"[LOCAL MQTT RECEIVED] {msg.topic}: {msg.payload}")
-            data = json.loads(msg.payload.decode())
+            data = encoding.decode(msg.payload)
 
             if msg.topic == "heartbeat":
                 self._handle_heartbeat(data)
@@ -140,8 +240,6 @@ class MQTTManager:
 
     def _handle_heartbeat(self, data):
         try:
-            cursor = self.hb_conn.cursor()
-
             camera_name = data["name"]
             timestamp = datetime.fromisoformat(data["timestamp"])
             camera_on = int(data["cam_on"])
@@ -156,18 +254,11 @@ class MQTTManager:
                 self.camera_sync_status[camera_name] = "out_of_sync"
                 self.remote_client.publish('alerts', payload, qos=1)
 
-            cursor.execute("""
-                INSERT INTO heartbeats (camera_name, receipt_time) VALUES (?, ?)
-            """, (camera_name, now.isoformat()))
-            cursor.execute("""
-                INSERT INTO camera_status (camera_name, last_seen, sync_status, camera_on)
-                VALUES (?, ?, ?, ?)
-                ON CONFLICT(camera_name) DO UPDATE SET 
-                    last_seen = excluded.last_seen,
-                    sync_status = excluded.sync_status,
-                    camera_on = excluded.camera_on
-            """, (camera_name, now.isoformat(), sync_status, camera_on))
-            self.hb_conn.commit()
+            # runs on paho's network thread: only memory updates and queueing here
+            self.hb_writer.submit(HEARTBEAT_INSERT, [(camera_name, now.isoformat())])
+            self._set_camera_state(camera_name, now.isoformat(), sync_status, camera_on)
+            if self.liveness.is_alive(): # only the server runs the tracker
+                self.liveness.heartbeat(camera_name)
 
             if camera_name in self.camera_sync_status and sync_status == "good":
                 payload = f"{camera_name} is IN SYNC."
@@ -178,81 +269,30 @@ class MQTTManager:
         except Exception as e:
             logger.error(f"Error handling heartbeat: {e}")
 
-    def _monitor_camera_status(self):
-        cursor = self.hb_conn.cursor()
-
-        while True:
-            if (datetime.now() - self.startup_time).total_seconds() < self.STARTUP_GRACE_PERIOD:
-                time.sleep(5)
-                continue
-
-            try:
-                cursor.execute("SELECT camera_name, last_seen, sync_status FROM camera_status")
-                rows = cursor.fetchall()
-                now = datetime.now()
-
-                for camera_name, last_seen_str, sync_status in rows:
-                    last_seen = datetime.fromisoformat(last_seen_str)
-                    gap = (now - last_seen).total_seconds()
-
-                    if gap > self.TIMEOUT_THRESHOLD and sync_status == "good" and self.camera_warnings.get(camera_name) != "down":
-                        payload = f"{camera_name} is DOWN. Last seen: {last_seen}"
-                        logger.warning(payload)
-                        self.camera_warnings[camera_name] = "down"
-                        cursor.execute("""
-                            UPDATE camera_status SET sync_status = ?, camera_on = 0 WHERE camera_name = ?
-                        """, ("DOWN", camera_name))
-                        self.hb_conn.commit()
-                        self.remote_client.publish('alerts', payload, qos=1)
-
-                    elif gap <= self.TIMEOUT_THRESHOLD and self.camera_warnings.get(camera_name) == "down":
-                        payload = f"{camera_name} is UP."
-                        logger.info(payload)
-                        self.camera_warnings.pop(camera_name, None)
-                        cursor.execute("""
-                            UPDATE camera_status SET sync_status = ?, camera_on = 1 WHERE camera_name = ?
-                        """, ("good", camera_name))
-                        self.hb_conn.commit()
-                        self.remote_client.publish('alerts', payload, qos=1)
-
-            except Exception as e:
-                logger.error(f"Error checking camera status: {e}")
-            time.sleep(10)
-
-    def _send_sensor_data(self):
-        while True:
-            try:
-                self.sensor_cursor.execute("""
-                    SELECT time, temperature, relative_humidity, pressure, wind_speed, internal_temp
-                    FROM sensor_data ORDER BY id DESC LIMIT 1
-                """)
-                row = self.sensor_cursor.fetchone()
-                if row:
-                    ts, temp, humid, pres, wind, internal_temp = row
-                    topic = f"{self.unit_name}/sensors"
-                    payload = json.dumps({
-                        "time": ts,
-                        "temp": temp,
-                        "humid": humid,
-                        "pres": pres,
-                        "wind": wind,
-                        "int_temp": internal_temp
-                    })
-                    self.remote_client.publish(topic, payload, qos=1)
-            except Exception as e:
-                logger.warning(f"Failed to publish sensor data: {e}")
-            time.sleep(self.send_freq)
+    def _on_camera_down(self, camera_name, age):
+        # LivenessTracker thread, at the camera's deadline
+        last_seen, sync_status, _ = self.camera_status().get(camera_name, (None, None, None))
+        if sync_status != "good" or self.camera_warnings.get(camera_name) == "down":
+            return
+        payload = f"{camera_name} is DOWN. Last seen: {last_seen} ({age:.0f}s ago)"
+        logger.warning(payload)
+        self.camera_warnings[camera_name] = "down"
+        self._set_camera_state(camera_name, sync_status="DOWN", camera_on=0)
+        self.remote_client.publish('alerts', payload, qos=1)
+
+    def _on_camera_up(self, camera_name):
+        if self.camera_warnings.get(camera_name) != "down":
+            return
+        payload = f"{camera_name} is UP."
+        logger.info(payload)
+        self.camera_warnings.pop(camera_name, None)
+        self._set_camera_state(camera_name, sync_status="good", camera_on=1)
+        self.remote_client.publish('alerts', payload, qos=1)
 
     def _send_camera_status(self):
-        local_conn = sqlite3.connect(self.heartbeat_db_path, check_same_thread=False)
-        local_cursor = local_conn.cursor()
-
         while True:
             try:
-                local_cursor.execute("SELECT camera_name, last_seen, sync_status, camera_on FROM camera_status")
-                rows = local_cursor.fetchall()
-
-                for camera_name, last_seen_raw, sync_status, camera_on in rows:
+                for camera_name, (last_seen_raw, sync_status, camera_on) in self.camera_status().items():
                     try:
                         last_seen_dt = datetime.fromisoformat(last_seen_raw)
                         last_seen = last_seen_dt.replace(microsecond=0).isoformat()
@@ -264,12 +304,15 @@ class MQTTManager:
 
                     if cached != current:
                         topic = f"{self.unit_name}/status/{camera_name}"
-                        payload = json.dumps({
-                            "camera": camera_name,
-                            "last_seen": last_seen,
-                            "sync_status": sync_status,
-                            "camera_on": bool(camera_on)
-                        })
+                        if self.encodings["status"] == "binary":
+                            payload = encoding.encode_camera_status(camera_name, last_seen, sync_status, camera_on)
+                        else:
+                            payload = json.dumps({
+                                "camera": camera_name,
+                                "last_seen": last_seen,
+                                "sync_status": sync_status,
+                                "camera_on": bool(camera_on)
+                            })
                         result = self.remote_client.publish(topic, payload, qos=1)
                         if result.rc == mqtt.MQTT_ERR_SUCCESS:
                             logger.debug(f"Published camera status for {camera_name}")
@@ -282,14 +325,19 @@ class MQTTManager:
 
             time.sleep(self.camstatus_freq)
 
+    def _heartbeat_payload(self, cam_on):
+        timestamp = datetime.now().isoformat()
+        if self.encodings["heartbeat"] == "binary":
+            return encoding.encode_heartbeat(self.unit_name, timestamp, cam_on)
+        return json.dumps({
+            "name": self.unit_name,
+            "timestamp": timestamp,
+            "cam_on": cam_on
+        })
+
     def send_camera_heartbeat(self, stop_event):
         while not stop_event.is_set():
-            timestamp = datetime.now().isoformat()
-            message = json.dumps({
-                "name": self.unit_name,
-                "timestamp": timestamp,
-                "cam_on": 1
-            })
+            message = self._heartbeat_payload(1)
 
             try:
                 self.local_client.publish(self.heartbeat_topic, message)
@@ -300,13 +348,17 @@ class MQTTManager:
             if stop_event.wait(10):
                 break
 
+    def publish_metrics(self, kind, metrics):
+        try:
+            topic = f"metrics/{self.unit_name}/{kind}"
+            self.local_client.publish(topic, json.dumps(metrics))
+            logger.debug(f"Published {kind} metrics")
+        except Exception as e:
+            logger.warning(f"Failed to publish {kind} metrics: {e}")
+
     def send_camera_shutdown(self):
         try:
-            self.local_client.publish(self.heartbeat_topic, json.dumps({
-                "name": self.unit_name,
-                "timestamp": datetime.now().isoformat(),
-                "cam_on": 0
-            }))
+            self.local_client.publish(self.heartbeat_topic, self._heartbeat_payload(0))
             self.local_client.disconnect()
             logger.info(f"Camera_main stopping: {self.unit_name}")
         except Exception as e:
@@ -314,6 +366,23 @@ class MQTTManager:
 
     def start(self):
         try:
+            self.liveness.start() # before the clients connect, so no heartbeat is missed
+
+            # Sensor rows are uplinked from sensor.db once the remote broker acknowledges them
+            self.uplink = UplinkQueue(
+                self.remote_client, self.sensor_db_path,
+                os.path.join(os.path.dirname(self.sensor_db_path), "uplink_state.json"),
+                f"{self.unit_name}/sensors/batch",
+                interval=self.send_freq,
+                batch_rows=self.config.getint('communication', 'uplink_batch_rows', fallback=500),
+                max_bytes=self.config.getint('communication', 'uplink_max_kb', fallback=64) * 1024,
+                ack_timeout=self.config.getint('communication', 'uplink_ack_timeout', fallback=30),
+                backfill=self.config.getboolean('communication', 'uplink_backfill', fallback=False),
+                encode=encoding.encode_sensor_batch if self.encodings["sensors"] == "binary" else encode_json_zlib
+            )
+            self.uplink.set_connected(self.is_remote_connected)
+            self.uplink.start()
+
             # Remote client setup
             self.remote_client.connect_async(self.remote_broker, self.remote_port)
             self.remote_client.loop_start()
@@ -327,12 +396,27 @@ class MQTTManager:
             logger.debug("MQTTManager started both local and remote clients.")
             logger.info(f"send_freq: {self.send_freq}s, camstatus_freq: {self.camstatus_freq}s, monitor_freq: {self.monitor_freq}s")
 
-            threading.Thread(target=self._monitor_camera_status, daemon=True).start()
-            threading.Thread(target=self._send_sensor_data, daemon=True).start()
+            hb_retention_days = self.config.getint('communication', 'hb_retention_days', fallback=0)
+            if hb_retention_days > 0:
+                self.hb_retention = Retention(self.heartbeat_db_path, "heartbeats", "receipt_time", "%Y-%m-%dT%H:%M:%S",
+                                              hb_retention_days)
+                self.hb_retention.start()
+
             threading.Thread(target=self._send_camera_status, daemon=True).start()
         except Exception as e:
             logger.error(f"Failed to start MQTTManager: {e}")
 
+    def stop(self):
+        """
+        Write out queued heartbeats and stop the heartbeat writer and retention.
+        """
+        self.liveness.stop()
+        if self.uplink is not None:
+            self.uplink.stop()
+        if self.hb_retention is not None:
+            self.hb_retention.stop()
+        self.hb_writer.stop()
+
     def connect_local(self):
         try:
             self.local_client.connect_async(self.hub_IP, 1883)
@@ -0,0 +1,255 @@
+import os
+import queue
+import threading
+import time
+
+import simplejpeg
+
+from utilities.archive import SHARD_EXT
+from utilities.thumbnails import make_thumbnail
+from utilities.metrics import LatencyRecorder
+
+from utilities.logger import logger as base_logger
+logger = base_logger.getChild("Pipeline")
+
+# picamera2 names formats by register order, simplejpeg by memory order
+FORMAT_TABLE = {"XBGR8888": "RGBX", "XRGB8888": "BGRX", "BGR888": "RGB", "RGB888": "BGR"}
+
+DROP_POLICIES = ("newest", "oldest", "block")
+
+_STOP = object()
+
+
+class Frame:
+    """
+    One captured frame as it moves through the pipeline. array is filled by
+    the capture stage, data by the encode stage.
+    """
+    __slots__ = ("seq", "timestamp", "array", "metadata", "activity", "lux", "data", "filename", "thumbnails")
+
+    def __init__(self, seq, timestamp, array, metadata=None, activity=None, lux=None):
+        self.seq = seq
+        self.timestamp = timestamp
+        self.array = array
+        self.metadata = metadata or {}
+        self.activity = activity
+        self.lux = lux
+        self.data = None
+        self.filename = None
+        self.thumbnails = {} # width -> JPEG bytes
+
+
+class CapturePipeline:
+    """
+    capture -> encode pool -> writer, connected by bounded queues.
+
+    submit() is called from the capture thread and applies drop_policy when the
+    encode queue is full: "newest" discards the incoming frame, "oldest" discards
+    the oldest queued frame to make room, "block" waits up to block_timeout.
+    Encoders block on the write queue, so a stalled SD card backs up into the
+    encode queue where the drop policy takes over instead of stalling the sensor.
+    """
+    def __init__(self, out_dir, name, colorspace="RGB", encode_workers=3, queue_size=8,
+                 jpeg_quality=90, drop_policy="oldest", block_timeout=1.0, catalog=None, archive=None,
+                 storage=None, thumbnails=None, thumbnail_sizes=(), latency=None, fsync=False):
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"Unknown drop policy: {drop_policy}")
+        self.out_dir = out_dir
+        self.name = name
+        self.colorspace = colorspace
+        self.jpeg_quality = jpeg_quality
+        self.drop_policy = drop_policy
+        self.block_timeout = block_timeout
+        self.catalog = catalog # FrameCatalog, owned by the writer thread
+        self.archive = archive # ShardWriter, owned by the writer thread; None writes one file per frame
+        self.storage = storage # StorageManager; frames are dropped while it reports the card full
+        self.thumbnails = thumbnails # ThumbnailCache for downscaled previews
+        self.thumbnail_sizes = tuple(thumbnail_sizes) if thumbnails is not None else ()
+        self.latency = latency if latency is not None else LatencyRecorder()
+        self.fsync = fsync
+        self.day_dir = os.path.dirname(out_dir)
+
+        self.encode_queue = queue.Queue(maxsize=queue_size)
+        self.write_queue = queue.Queue(maxsize=queue_size)
+        self._encoders = [threading.Thread(target=self._encode_loop, name=f"encode-{i}", daemon=True)
+                          for i in range(max(1, encode_workers))]
+        self._writer = threading.Thread(target=self._write_loop, name="writer", daemon=True)
+
+        self._lock = threading.Lock()
+        self.counters = {
+            "submitted": 0,
+            "encoded": 0,
+            "written": 0,
+            "dropped_newest": 0,
+            "dropped_oldest": 0,
+            "dropped_blocked": 0,
+            "dropped_disk_full": 0,
+            "encode_errors": 0,
+            "write_errors": 0
+        }
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self.counters[key] += n
+
+    def start(self):
+        os.makedirs(self.out_dir, exist_ok=True)
+        for t in self._encoders:
+            t.start()
+        self._writer.start()
+        logger.info(f"Pipeline started: {len(self._encoders)} encoders, queue size {self.encode_queue.maxsize}, drop policy '{self.drop_policy}'")
+
+    def submit(self, frame):
+        """
+        Queue a captured frame for encoding. Returns False if a frame was dropped.
+        """
+        self._count("submitted")
+        if self.drop_policy == "block":
+            try:
+                self.encode_queue.put(frame, timeout=self.block_timeout)
+                return True
+            except queue.Full:
+                self._count("dropped_blocked")
+                return False
+
+        try:
+            self.encode_queue.put_nowait(frame)
+            return True
+        except queue.Full:
+            pass
+
+        if self.drop_policy == "newest":
+            self._count("dropped_newest")
+            return False
+
+        try: # "oldest": make room by discarding the head of the queue
+            self.encode_queue.get_nowait()
+            self.encode_queue.task_done()
+            self._count("dropped_oldest")
+        except queue.Empty:
+            pass
+        try:
+            self.encode_queue.put_nowait(frame)
+        except queue.Full:
+            self._count("dropped_newest")
+            return False
+        return False
+
+    def filename_for(self, frame):
+        # millisecond timestamp plus sequence number, so frames within one second never collide
+        stamp = frame.timestamp.strftime('%Y%m%d_%H%M%S_') + f"{frame.timestamp.microsecond // 1000:03d}"
+        return os.path.join(self.out_dir, f"{self.name}_{stamp}_{frame.seq:06d}.jpg")
+
+    def encode(self, frame):
+        with self.latency.time("encode"):
+            frame.data = simplejpeg.encode_jpeg(frame.array, quality=self.jpeg_quality,
+                                                colorspace=self.colorspace, colorsubsampling="420")
+        for width in self.thumbnail_sizes:
+            with self.latency.time("thumbnail"):
+                frame.thumbnails[width] = make_thumbnail(frame.array, width, self.colorspace)
+        frame.array = None # release the raw buffer as soon as it is no longer needed
+        frame.filename = self.filename_for(frame)
+
+    def write(self, frame):
+        """
+        Store an encoded frame. Returns its location relative to the day directory.
+        """
+        if self.archive is not None:
+            frame_id = os.path.basename(frame.filename)
+            with self.latency.time("write"):
+                shard_name, _ = self.archive.append(frame_id, frame.data)
+            if self.fsync:
+                with self.latency.time("fsync"):
+                    self.archive.fsync()
+            shard_path = os.path.join(os.path.relpath(self.archive.archive_dir, self.day_dir), shard_name + SHARD_EXT)
+            return f"{shard_path}#{frame_id}"
+
+        with open(frame.filename, "wb") as f:
+            with self.latency.time("write"):
+                f.write(frame.data)
+                f.flush()
+            if self.fsync:
+                with self.latency.time("fsync"):
+                    os.fsync(f.fileno())
+        return os.path.relpath(frame.filename, self.day_dir)
+
+    def _encode_loop(self):
+        while True:
+            frame = self.encode_queue.get()
+            try:
+                if frame is _STOP:
+                    return
+                try:
+                    self.encode(frame)
+                except Exception as e:
+                    self._count("encode_errors")
+                    logger.error(f"Failed to encode frame {frame.seq}: {e}")
+                    continue
+                self._count("encoded")
+                self.write_queue.put(frame) # blocks when the writer is behind (backpressure)
+            finally:
+                self.encode_queue.task_done()
+
+    def _write_loop(self):
+        if self.catalog is not None:
+            self.catalog.open()
+        if self.archive is not None:
+            self.archive.open()
+        try:
+            while True:
+                try:
+                    frame = self.write_queue.get(timeout=1.0)
+                except queue.Empty:
+                    if self.catalog is not None:
+                        self.catalog.maybe_flush()
+                    continue
+                try:
+                    if frame is _STOP:
+                        return
+                    if self.storage is not None and not self.storage.writes_allowed():
+                        self._count("dropped_disk_full")
+                        continue
+                    try:
+                        location = self.write(frame)
+                    except Exception as e:
+                        self._count("write_errors")
+                        logger.error(f"Failed to write {frame.filename}: {e}")
+                        continue
+                    self._count("written")
+                    for width, data in frame.thumbnails.items():
+                        self.thumbnails.put(os.path.basename(frame.filename), width, data)
+                    frame.thumbnails = {}
+                    if self.catalog is not None:
+                        self.catalog.add(frame, location)
+                        self.catalog.maybe_flush()
+                    logger.debug("Image written: %s", frame.filename)
+                finally:
+                    self.write_queue.task_done()
+        finally:
+            if self.archive is not None:
+                self.archive.close()
+            if self.catalog is not None:
+                self.catalog.close()
+
+    def stop(self, timeout=10):
+        """
+        Drain queued frames and stop the worker threads.
+        """
+        deadline = time.monotonic() + timeout
+        for _ in self._encoders:
+            self.encode_queue.put(_STOP)
+        for t in self._encoders:
+            t.join(max(0, deadline - time.monotonic()))
+        self.write_queue.put(_STOP)
+        self._writer.join(max(0, deadline - time.monotonic()))
+        alive = [t.name for t in self._encoders + [self._writer] if t.is_alive()]
+        if alive:
+            logger.warning(f"Pipeline threads still running after {timeout}s: {alive}")
+        logger.info(f"Pipeline stopped: {self.stats()}")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+        stats["encode_queue"] = self.encode_queue.qsize()
+        stats["write_queue"] = self.write_queue.qsize()
+        return stats
@@ -0,0 +1,90 @@
+import numpy as np
+import psutil
+
+from utilities.logger import logger as base_logger
+logger = base_logger.getChild("Ring")
+
+
+class FrameRing:
+    """
+    Fixed-size ring of preallocated frame slots for pre/post-trigger saving.
+
+    push() copies a frame into the next slot with np.copyto, so the steady state
+    does no per-frame allocation: the caller passes a zero-copy view of the
+    camera buffer (picamera2 MappedArray) and the buffer can be released as soon
+    as push() returns. Frames only get their own copies when an event flushes them.
+    """
+    def __init__(self, shape, pre=10, post=10, dtype=np.uint8, max_mem_fraction=0.5):
+        slot_bytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        budget = int(psutil.virtual_memory().available * max_mem_fraction)
+        slots = pre + 1 # the pre-trigger frames plus the current one
+        if slots * slot_bytes > budget:
+            slots = max(1, budget // slot_bytes)
+            logger.warning(f"Frame ring reduced to {slots - 1} pre-trigger frames to fit {budget / 1e6:.0f} MB")
+
+        self.pre = slots - 1
+        self.post = post
+        self.slots = np.empty((slots,) + tuple(shape), dtype=dtype)
+        self.shape = tuple(shape)
+        self._meta = [None] * slots # (seq, timestamp, metadata, activity) per slot
+        self._head = 0 # next slot to write
+        self._count = 0 # filled slots, up to len(slots)
+        self._unsent = 0 # filled slots not yet flushed
+        self._post_remaining = 0
+        self.events = 0
+        self.flushed = 0
+
+        logger.info(f"Frame ring: {slots} x {self.shape} slots, {self.nbytes / 1e6:.1f} MB")
+
+    @property
+    def nbytes(self):
+        return self.slots.nbytes
+
+    def push(self, view, seq, timestamp, metadata=None, activity=None):
+        h, w = self.shape[:2]
+        np.copyto(self.slots[self._head], view[:h, :w])
+        self._meta[self._head] = (seq, timestamp, metadata, activity)
+        self._head = (self._head + 1) % len(self.slots)
+        self._count = min(self._count + 1, len(self.slots))
+        self._unsent = min(self._unsent + 1, len(self.slots))
+
+    def _take(self, n):
+        """
+        Copy out the newest n unsent frames, oldest first.
+        """
+        out = []
+        for back in range(n, 0, -1):
+            idx = (self._head - back) % len(self.slots)
+            seq, timestamp, metadata, activity = self._meta[idx]
+            out.append((seq, timestamp, self.slots[idx].copy(), metadata, activity))
+        self._unsent = 0
+        self.flushed += len(out)
+        return out
+
+    def pending(self, active):
+        """
+        Frames to save after the latest push(). A new event returns every
+        buffered pre-trigger frame; while active, and for post frames after,
+        the newest frame is returned as it arrives.
+        """
+        if active:
+            if self._post_remaining == 0:
+                self.events += 1
+                self._post_remaining = self.post + 1
+                return self._take(min(self._unsent, self._count))
+            self._post_remaining = self.post + 1
+            return self._take(1)
+
+        if self._post_remaining > 1:
+            self._post_remaining -= 1
+            return self._take(1)
+        self._post_remaining = 0
+        return []
+
+    def stats(self):
+        return {
+            "slots": len(self.slots),
+            "mem_mb": round(self.nbytes / 1e6, 1),
+            "events": self.events,
+            "flushed": self.flushed
+        }
@@ -0,0 +1,417 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+from utilities.logger import logger as base_logger
+logger = base_logger.getChild("Rollup")
+
+TIME_FORMAT = "%Y%m%d_%H%M%S"
+
+# sensor_data.time is TIME_FORMAT, so a bucket key is just a prefix of it
+BUCKETS = {
+    "minute": 13, # YYYYmmdd_HHMM
+    "hour": 11    # YYYYmmdd_HH
+}
+
+AGGREGATES = ("min", "max", "mean", "count")
+
+
+def ensure_columns(conn, table, coldefs):
+    """
+    ALTER TABLE ADD COLUMN for any of coldefs ({name: type}) the table does not have yet.
+    """
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    for col, coltype in coldefs.items():
+        if col not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {col} {coltype}")
+
+
+class SensorRollup:
+    """
+    Keeps per-minute and per-hour min/max/mean/count of every sensor column in
+    sensor_rollup_minute and sensor_rollup_hour. on_flush is registered as a
+    BatchWriter hook, so each flush folds its new rows into the rollups inside
+    the same transaction that inserts them. create_tables backfills buckets
+    older than the rollups from sensor_data, so history recorded before the
+    rollups existed is summarized before Retention can delete it.
+
+    read_times maps a column to the sensor_data column holding the epoch time
+    its value was read (e.g. "pressure": "pressure_time"); rows then carry
+    those time_columns after the value columns. A value with a read time is
+    bucketed by that time, and counted once: a channel polled slower than
+    rows are recorded repeats its last reading in several rows. The readings
+    counted so far are only advanced by on_commit, so a flush that is rolled
+    back and retried counts them again. Backfill predates the read times and
+    counts per row.
+    """
+    def __init__(self, columns, read_times=None):
+        self.columns = tuple(columns)
+        self.read_times = dict(read_times or {})
+        self.time_columns = tuple(dict.fromkeys(self.read_times[c] for c in self.columns if c in self.read_times))
+        self._time_index = [self.time_columns.index(self.read_times[c]) if c in self.read_times else None
+                            for c in self.columns]
+        self._counted = {} # (name, column index) -> read time of the last reading counted
+        self._staged = None
+        self._upserts = {bucket: self._upsert_sql(bucket) for bucket in BUCKETS}
+
+    def table(self, bucket):
+        return f"sensor_rollup_{bucket}"
+
+    def create_tables(self, conn):
+        coldefs = {f"{c}_{agg}": "INTEGER NOT NULL DEFAULT 0" if agg == "count" else "REAL"
+                   for c in self.columns for agg in AGGREGATES}
+        for bucket in BUCKETS:
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {self.table(bucket)} (
+                    name TEXT NOT NULL,
+                    bucket TEXT NOT NULL,
+                    PRIMARY KEY (name, bucket)
+                )
+            """)
+            ensure_columns(conn, self.table(bucket), coldefs)
+        self.backfill(conn)
+        self._load_counted(conn)
+
+    def _load_counted(self, conn):
+        """
+        Resume from the read times in the newest sensor_data row, so a reading
+        already counted before a restart is not counted again.
+        """
+        present = {row[1] for row in conn.execute("PRAGMA table_info(sensor_data)")}
+        if not self.time_columns or not set(self.time_columns) <= present:
+            return
+        row = conn.execute(f"""
+            SELECT name, {', '.join(self.time_columns)} FROM sensor_data
+            WHERE id = (SELECT max(id) FROM sensor_data)
+        """).fetchone()
+        if row is None:
+            return
+        name, *times = row
+        for i, ti in enumerate(self._time_index):
+            if ti is not None and times[ti] is not None:
+                self._counted[(name, i)] = times[ti]
+
+    def backfill(self, conn):
+        """
+        Aggregate sensor_data rows from before the earliest rollup bucket (all
+        rows if the rollup is empty). Returns the number of buckets added.
+        """
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='sensor_data'").fetchone() is None:
+            return 0
+        present = {row[1] for row in conn.execute("PRAGMA table_info(sensor_data)")}
+        columns = [c for c in self.columns if c in present]
+        added = 0
+        for bucket, prefix_len in BUCKETS.items():
+            first = conn.execute(f"SELECT min(bucket) FROM {self.table(bucket)}").fetchone()[0]
+            cols, exprs = [], []
+            for c in columns:
+                cols += [f"{c}_{agg}" for agg in AGGREGATES]
+                exprs += [f"min({c})", f"max({c})", f"avg({c})", f"count({c})"]
+            cur = conn.execute(f"""
+                INSERT INTO {self.table(bucket)} (name, bucket{''.join(', ' + c for c in cols)})
+                SELECT name, substr(time, 1, {prefix_len}){''.join(', ' + e for e in exprs)}
+                FROM sensor_data WHERE time IS NOT NULL AND substr(time, 1, {prefix_len}) < ?
+                GROUP BY name, substr(time, 1, {prefix_len})
+            """, (first or "~",))
+            added += max(cur.rowcount, 0)
+        if added:
+            logger.info(f"Backfilled {added} sensor rollup buckets from sensor_data")
+        return added
+
+    def _upsert_sql(self, bucket):
+        cols = [f"{c}_{agg}" for c in self.columns for agg in AGGREGATES]
+        updates = []
+        for c in self.columns:
+            mn, mx, mean, n = (f"{c}_{agg}" for agg in AGGREGATES)
+            updates += [
+                # SQLite's scalar min/max return NULL if any argument is NULL
+                f"{mn} = min(coalesce({mn}, excluded.{mn}), coalesce(excluded.{mn}, {mn}))",
+                f"{mx} = max(coalesce({mx}, excluded.{mx}), coalesce(excluded.{mx}, {mx}))",
+                f"{mean} = CASE WHEN {n} + excluded.{n} > 0 THEN "
+                f"(coalesce({mean}, 0) * {n} + coalesce(excluded.{mean}, 0) * excluded.{n}) / ({n} + excluded.{n}) END",
+                f"{n} = {n} + excluded.{n}"
+            ]
+        return f"""
+            INSERT INTO {self.table(bucket)} (name, bucket, {', '.join(cols)})
+            VALUES ({', '.join('?' * (len(cols) + 2))})
+            ON CONFLICT(name, bucket) DO UPDATE SET {', '.join(updates)}
+        """
+
+    def readings(self, rows):
+        """
+        Split sensor_data rows (name, time, *columns, *time_columns) into
+        (name, column index, time, value), dropping missing values and
+        readings that were already counted.
+        """
+        n = len(self.columns)
+        counted = dict(self._counted)
+        formatted = {}
+        out = []
+        for name, ts, *rest in rows:
+            values, times = rest[:n], rest[n:]
+            for i, v in enumerate(values):
+                if v is None:
+                    continue
+                ti = self._time_index[i]
+                t = times[ti] if ti is not None and ti < len(times) else None
+                if t is None:
+                    out.append((name, i, ts, v))
+                    continue
+                last = counted.get((name, i))
+                if last is not None and t <= last:
+                    continue
+                counted[(name, i)] = t
+                read_ts = formatted.get(t)
+                if read_ts is None:
+                    read_ts = formatted[t] = datetime.fromtimestamp(t).strftime(TIME_FORMAT)
+                out.append((name, i, read_ts, v))
+        self._staged = counted
+        return out
+
+    def aggregate(self, readings, prefix_len):
+        """
+        Fold readings into {(name, bucket): [min, max, sum, count] per column}.
+        """
+        groups = {}
+        for name, i, ts, v in readings:
+            key = (name, ts[:prefix_len])
+            acc = groups.get(key)
+            if acc is None:
+                acc = groups[key] = [[None, None, 0.0, 0] for _ in self.columns]
+            a = acc[i]
+            if a[0] is None or v < a[0]:
+                a[0] = v
+            if a[1] is None or v > a[1]:
+                a[1] = v
+            a[2] += v
+            a[3] += 1
+        return groups
+
+    def on_flush(self, conn, batch):
+        self._staged = None
+        rows = [row for sql, sql_rows in batch.items() if "INTO sensor_data" in sql for row in sql_rows]
+        if not rows:
+            return
+        readings = self.readings(rows)
+        for bucket, prefix_len in BUCKETS.items():
+            params = []
+            for (name, key), acc in self.aggregate(readings, prefix_len).items():
+                values = []
+                for mn, mx, total, n in acc:
+                    values += [mn, mx, total / n if n else None, n]
+                params.append((name, key, *values))
+            conn.executemany(self._upserts[bucket], params)
+
+    def on_commit(self, batch):
+        if self._staged is not None:
+            self._counted = self._staged
+            self._staged = None
+
+
+class HeartbeatRollup:
+    """
+    Per-camera, per-hour heartbeat counts in camera_uptime_hourly, folded in
+    by a BatchWriter on_flush hook like SensorRollup. With heartbeats every
+    hb_interval seconds, heartbeats * hb_interval / 3600 is the share of the
+    hour the camera was up, so season uptime never has to scan heartbeats.
+    """
+    TABLE = "camera_uptime_hourly"
+
+    def __init__(self, insert_sql):
+        self.insert_sql = insert_sql
+
+    def create_tables(self, conn):
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {self.TABLE} (
+                camera_name TEXT NOT NULL,
+                hour TEXT NOT NULL,
+                heartbeats INTEGER NOT NULL DEFAULT 0,
+                first_seen TEXT,
+                last_seen TEXT,
+                PRIMARY KEY (camera_name, hour)
+            )
+        """)
+        # backfill hours older than the summary from the heartbeats recorded before it existed,
+        # so they are counted before Retention deletes them
+        first = conn.execute(f"SELECT min(hour) FROM {self.TABLE}").fetchone()[0]
+        cur = conn.execute(f"""
+            INSERT INTO {self.TABLE} (camera_name, hour, heartbeats, first_seen, last_seen)
+            SELECT camera_name, substr(receipt_time, 1, 13), count(*), min(receipt_time), max(receipt_time)
+            FROM heartbeats WHERE substr(receipt_time, 1, 13) < ? GROUP BY camera_name, substr(receipt_time, 1, 13)
+        """, (first or "~",))
+        if cur.rowcount > 0:
+            logger.info(f"Backfilled {cur.rowcount} hours of {self.TABLE} from heartbeats")
+
+    def on_flush(self, conn, batch):
+        groups = {}
+        for camera_name, receipt_time in batch.get(self.insert_sql, ()):
+            key = (camera_name, receipt_time[:13]) # YYYY-mm-ddTHH
+            acc = groups.get(key)
+            if acc is None:
+                groups[key] = [1, receipt_time, receipt_time]
+            else:
+                acc[0] += 1
+                acc[1] = min(acc[1], receipt_time)
+                acc[2] = max(acc[2], receipt_time)
+        if not groups:
+            return
+        conn.executemany(f"""
+            INSERT INTO {self.TABLE} (camera_name, hour, heartbeats, first_seen, last_seen)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(camera_name, hour) DO UPDATE SET
+                heartbeats = heartbeats + excluded.heartbeats,
+                first_seen = min(first_seen, excluded.first_seen),
+                last_seen = max(last_seen, excluded.last_seen)
+        """, [(name, hour, *acc) for (name, hour), acc in groups.items()])
+
+    def uptime(self, conn, since=None, until=None, hb_interval=10):
+        """
+        {camera_name: (hours with heartbeats, estimated hours up)} between two ISO times.
+        """
+        rows = conn.execute(f"""
+            SELECT camera_name, count(*), sum(heartbeats) FROM {self.TABLE}
+            WHERE hour >= ? AND hour <= ? GROUP BY camera_name
+        """, ((since or "")[:13], (until or "9999")[:13]))
+        return {name: (hours, round(min(beats * hb_interval / 3600, hours), 2)) for name, hours, beats in rows}
+
+
+class Retention(threading.Thread):
+    """
+    Deletes rows of table whose time_col is older than retention_days in
+    small chunks. Runs on its own connection with a busy timeout; WAL lets
+    it interleave with the writer thread. time_format is how time_col is
+    stored, so the cutoff compares as a string.
+
+    Freed pages are returned to the filesystem with incremental_vacuum when
+    the database already uses auto_vacuum=INCREMENTAL; otherwise SQLite
+    reuses them for new rows. Converting needs a full VACUUM, which locks
+    the database for its whole run, so it is left to convert_to_incremental()
+    with nothing else writing (python3 -m utilities.rollup vacuum <db>).
+
+    With mark_path set (the uplink state file), rows above the uplink's
+    acknowledged id are kept however old they are, so nothing is pruned
+    before the remote broker has it. Until that file exists nothing is
+    pruned at all.
+    """
+    def __init__(self, db_path, table, time_col, time_format, retention_days,
+                 check_freq=3600, chunk_rows=5000, vacuum_pages=1000, busy_timeout=30, mark_path=None):
+        super().__init__(name=f"{table}-retention", daemon=True)
+        self.db_path = db_path
+        self.table = table
+        self.time_col = time_col
+        self.time_format = time_format
+        self.retention_days = retention_days
+        self.check_freq = check_freq
+        self.chunk_rows = chunk_rows
+        self.vacuum_pages = vacuum_pages
+        self.busy_timeout = busy_timeout
+        self.mark_path = mark_path
+        self.stop_event = threading.Event()
+        self.deleted = 0
+        self.held = 0
+        self.incremental = False
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout)
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout * 1000)}")
+        self.incremental = conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+        if not self.incremental:
+            logger.info(f"{os.path.basename(self.db_path)} does not use incremental auto_vacuum, pruned pages will be "
+                        f"reused rather than released (convert offline with: python3 -m utilities.rollup vacuum)")
+        return conn
+
+    def run(self):
+        try:
+            conn = self._connect()
+        except Exception as e:
+            logger.error(f"{self.table} retention disabled: {e}")
+            return
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    self.prune(conn)
+                except Exception as e:
+                    logger.error(f"{self.table} retention pass failed: {e}")
+                self.stop_event.wait(self.check_freq)
+        finally:
+            conn.close()
+
+    def max_id(self):
+        """Highest id that may be pruned, None when uncapped."""
+        if self.mark_path is None:
+            return None
+        try:
+            with open(self.mark_path) as f:
+                return int(json.load(f)[self.table])
+        except FileNotFoundError:
+            return 0
+        except Exception as e:
+            logger.warning(f"Uplink state unreadable, not pruning {self.table}: {e}")
+            return 0
+
+    def prune(self, conn):
+        cutoff = (datetime.now() - timedelta(days=self.retention_days)).strftime(self.time_format)
+        max_id = self.max_id()
+        cap = "" if max_id is None else f" AND id <= {max_id}"
+        deleted = 0
+        while not self.stop_event.is_set():
+            with conn:
+                cur = conn.execute(f"""
+                    DELETE FROM {self.table} WHERE id IN (
+                        SELECT id FROM {self.table} WHERE {self.time_col} < ?{cap} ORDER BY id LIMIT ?
+                    )
+                """, (cutoff, self.chunk_rows))
+            deleted += cur.rowcount
+            if cur.rowcount < self.chunk_rows:
+                break
+            time.sleep(0.1) # let the writer in between chunks
+        if deleted:
+            self.deleted += deleted
+            logger.info(f"Pruned {deleted} {self.table} rows older than {cutoff}")
+        if max_id is not None:
+            self.held = conn.execute(f"SELECT count(*) FROM {self.table} WHERE id > ? AND {self.time_col} < ?",
+                                     (max_id, cutoff)).fetchone()[0]
+            if self.held:
+                logger.warning(f"Keeping {self.held} {self.table} rows older than {cutoff} until the uplink "
+                               f"has sent them (acknowledged up to id {max_id})")
+        if self.incremental:
+            conn.execute(f"PRAGMA incremental_vacuum({int(self.vacuum_pages)})").fetchall()
+        return deleted
+
+    def stop(self):
+        self.stop_event.set()
+
+
+def convert_to_incremental(db_path):
+    """
+    Switch a database to auto_vacuum=INCREMENTAL. Runs a full VACUUM, which
+    rewrites the file and holds an exclusive lock throughout: only run it
+    while bee_cam is stopped. Returns False if it was already converted.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            return False
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+        return True
+    finally:
+        conn.close()
+
+
+def main(args):
+    if len(args) < 2 or args[0] != "vacuum":
+        print("usage: python3 -m utilities.rollup vacuum <db> [<db> ...]")
+        sys.exit(1)
+    for db_path in args[1:]:
+        converted = convert_to_incremental(db_path)
+        print(f"{db_path}: {'converted to' if converted else 'already uses'} incremental auto_vacuum")
+
+
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    main(sys.argv[1:])
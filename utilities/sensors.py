@@ -2,7 +2,13 @@ from datetime import datetime,timedelta
 import os
 import sys
 import time
+import math
 import sqlite3
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 
 import socket
 import fcntl
@@ -22,6 +28,8 @@ logger = base_logger.getChild("Sensors")
 from utilities.display import Display
 from utilities.config import Config
 from utilities.wittypi import WittyPi
+from utilities.dbwriter import BatchWriter
+from utilities.rollup import SensorRollup, Retention, ensure_columns
 
 config = Config()
 package_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
@@ -47,8 +55,101 @@ elif mode == 'camera':
 else:
     logger.warning('Unrecognized operation mode')
 
+# Value columns buffered per mode, in sensor_data column order
+SCHEMAS = {
+    'server': ('temperature', 'relative_humidity', 'pressure', 'wind_speed', 'wind_gust', 'wind_std', 'internal_temp'),
+    'camera': ('lux', 'internal_temp')
+}
+# sensor_data column holding the epoch time each value column's channel was last read
+READ_TIMES = {
+    'server': {'temperature': 'temp_rh_time', 'relative_humidity': 'temp_rh_time', 'pressure': 'pressure_time',
+               'wind_speed': 'wind_time', 'wind_gust': 'wind_time', 'wind_std': 'wind_time',
+               'internal_temp': 'internal_temp_time'},
+    'camera': {'lux': 'lux_time', 'internal_temp': 'internal_temp_time'}
+}
+
+class SensorBuffer:
+    """
+    Preallocated columnar buffer of sensor rows with a fixed schema.
+    Times are epoch seconds and values are doubles, both in array('d')
+    columns; a value missing from a row is stored as NaN. Rows beyond
+    capacity are dropped and counted rather than growing the buffer.
+    """
+    def __init__(self, columns, capacity=1024):
+        self.columns = tuple(columns)
+        self.capacity = capacity
+        self.time = array('d', [0.0]) * capacity
+        self.values = {c: array('d', [math.nan]) * capacity for c in self.columns}
+        self.length = 0
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.length
+
+    def append(self, timestamp, values):
+        """
+        Add one row. values maps column name to reading; absent or None columns become NaN.
+        """
+        with self._lock:
+            if self.length >= self.capacity:
+                self.dropped += 1
+                if self.dropped == 1 or self.dropped % 100 == 0:
+                    logger.warning(f"Sensor buffer full, {self.dropped} rows dropped")
+                return False
+            i = self.length
+            self.time[i] = timestamp
+            for c in self.columns:
+                v = values.get(c)
+                self.values[c][i] = math.nan if v is None else v
+            self.length = i + 1
+            return True
+
+    def peek(self):
+        """
+        Copy all buffered rows as (times, {column: values}) slices, leaving them buffered.
+        """
+        with self._lock:
+            n = self.length
+            times = self.time[:n]
+            cols = {c: self.values[c][:n] for c in self.columns}
+        return times, cols
+
+    def consume(self, n):
+        """
+        Remove the n oldest rows, e.g. once they have been handed off. Rows
+        appended since they were read move to the front.
+        """
+        with self._lock:
+            n = min(n, self.length)
+            rest = self.length - n
+            self.time[:rest] = self.time[n:self.length]
+            for c in self.columns:
+                self.values[c][:rest] = self.values[c][n:self.length]
+            self.length = rest
+
+    def take(self):
+        """
+        Remove and return all buffered rows as (times, {column: values}) slices.
+        """
+        times, cols = self.peek()
+        self.consume(len(times))
+        return times, cols
+
+    def rows(self, name):
+        """
+        Buffered rows as sensor_data tuples: (name, time, *columns), NaN as None.
+        The rows stay buffered; consume(len(rows)) once they have been accepted.
+        """
+        times, cols = self.peek()
+        columns = [cols[c] for c in self.columns]
+        return [
+            (name, datetime.fromtimestamp(t).strftime("%Y%m%d_%H%M%S"),
+             *[None if v != v else v for v in vals])
+            for t, *vals in zip(times, *columns)
+        ]
+
 class Sensor:
-    data_dict = {"name": [], "time": []}
     def __init__(self, device=None, i2c=None):
          self.i2c = i2c if i2c is not None else board.I2C()
          self.sensor_device = device
@@ -65,23 +166,6 @@ class Sensor:
             self.failed = True
             return None
 
-    def add_data(self,sensor_type):
-        """
-        Add data into the dictionary, returns the current data
-        """
-        data = self.get_data(sensor_type)
-        if data is not None:
-            self.data_dict.setdefault(sensor_type, []).append(data)
-        return data
-
-    def display(self):
-        """
-        Display the sensor dictionary
-        """
-        print("Sensor Data")
-        d = self.data_dict
-        print(d)
-
     def sensor_deinit(self):
         if self.i2c is not None:
                 self.i2c.deinit() 
@@ -98,7 +182,7 @@ class TempRHSensor(Sensor):
     def temp_rh_data(self):
         if self.failed:
             return None, None
-        return self.add_data(self.sensor_types[0]), self.add_data(self.sensor_types[1])
+        return self.get_data(self.sensor_types[0]), self.get_data(self.sensor_types[1])
 
 class PresSensor(Sensor):
     def __init__(self, i2c=None):
@@ -112,14 +196,17 @@ class PresSensor(Sensor):
     def pressure_data(self):
         if self.failed:
             return None
-        return self.add_data(self.sensor_types[0])
+        return self.get_data(self.sensor_types[0])
 
 
 def map_range(value, in_min, in_max, out_min, out_max):
     return out_min + (value - in_min) * (out_max - out_min) / (in_max - in_min)
 
 def adc_to_wind_speed(voltage_val):
-    V = max(voltage_val - 0.00575, 0.4)
+    """
+    Works on a single voltage or a NumPy array of voltages.
+    """
+    V = np.maximum(voltage_val - 0.00575, 0.4)
     return ((V - 0.4) / 1.6) * 32.4
 
 class WindSensor(Sensor):
@@ -143,17 +230,102 @@ class WindSensor(Sensor):
             logger.error(f"Failed to get wind sensor data: {e}")
             return None
 
-    def add_data(self, sensor_type="wind_speed"):
+    def start_continuous(self, sample_hz=25, window_s=120, gust_s=3, cpu_budget=0.05, bus_lock=None):
+        """
+        Put the ADS1115 in continuous conversion and sample it at sample_hz on
+        a background thread into a preallocated ring of window_s seconds. If
+        the sampler uses more than cpu_budget of a core, its rate is backed off.
+        """
         if self.failed:
-            return None
+            return False
         try:
-            data = self.get_data(sensor_type)
-            if data is not None:
-                self.data_dict.setdefault(sensor_type, []).append(data)
-            return data
+            self.adc.mode = ADS.Mode.CONTINUOUS
+            self.adc.data_rate = 860
         except Exception as e:
-            logger.error(f"Failed to add wind sensor data: {e}")
-            return None
+            logger.error(f"Could not start continuous wind sampling: {e}")
+            return False
+
+        self.sample_hz = sample_hz
+        self.cpu_budget = cpu_budget
+        self.gust_samples = max(1, int(round(gust_s * sample_hz)))
+        self._period = 1.0 / sample_hz
+        self._ring = np.zeros(int(sample_hz * window_s), dtype=np.float32)
+        self._written = 0 # samples written since start
+        self._taken = 0 # samples already summarized by interval_stats
+        self._ring_lock = threading.Lock()
+        self._bus_lock = bus_lock if bus_lock is not None else threading.Lock()
+        self.read_errors = 0
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample_loop, name="wind-sampler", daemon=True)
+        self._sampler.start()
+        logger.info(f"Wind sampling at {sample_hz} Hz, {len(self._ring)} sample ring, {gust_s}s gusts")
+        return True
+
+    def _sample_loop(self):
+        size = len(self._ring)
+        next_t = time.monotonic()
+        window_start, cpu_start = next_t, time.thread_time()
+        while not self._stop.is_set():
+            try:
+                with self._bus_lock:
+                    v = self.adc_channel.voltage
+                with self._ring_lock:
+                    self._ring[self._written % size] = v
+                    self._written += 1
+            except Exception as e:
+                self.read_errors += 1
+                if self.read_errors == 1 or self.read_errors % 1000 == 0:
+                    logger.error(f"Wind sample read failed ({self.read_errors} total): {e}")
+
+            now = time.monotonic()
+            if now - window_start >= 1.0:
+                cpu = (time.thread_time() - cpu_start) / (now - window_start)
+                if cpu > self.cpu_budget:
+                    self._period *= 1.25
+                    logger.warning(f"Wind sampler at {cpu:.1%} CPU, slowing to {1 / self._period:.1f} Hz")
+                window_start, cpu_start = now, time.thread_time()
+
+            next_t += self._period
+            delay = next_t - time.monotonic()
+            if delay <= 0:
+                next_t = time.monotonic() # fell behind, don't try to catch up
+            elif self._stop.wait(delay):
+                break
+
+    def interval_stats(self):
+        """
+        Mean speed and standard deviation over the samples taken since the
+        previous call, and the max gust: the highest gust_s moving average
+        ending in that interval. Gust windows reach back into samples from
+        before the interval, so an interval shorter than gust_s still gets a
+        full-length gust rather than just its own mean.
+        """
+        with self._ring_lock:
+            size = len(self._ring)
+            n = min(self._written - self._taken, size)
+            lead = min(self.gust_samples - 1, min(self._written, size) - n) # earlier samples still in the ring
+            m = n + lead
+            end = self._written % size
+            if end >= m:
+                volts = self._ring[end - m:end].copy()
+            else:
+                volts = np.concatenate((self._ring[size - (m - end):], self._ring[:end]))
+            self._taken = self._written
+        if n == 0:
+            return None, None, None
+
+        speeds = adc_to_wind_speed(volts.astype(np.float64))
+        g = min(self.gust_samples, m)
+        csum = np.concatenate(([0.0], np.cumsum(speeds)))
+        gust = ((csum[g:] - csum[:-g]) / g).max()
+        current = speeds[lead:]
+        return float(current.mean()), float(gust), float(current.std())
+
+    def stop_continuous(self):
+        if getattr(self, "_sampler", None) is not None:
+            self._stop.set()
+            self._sampler.join(2)
+            self._sampler = None
 
 class LuxSensor(Sensor):
     def __init__(self, i2c=None):
@@ -168,19 +340,133 @@ class LuxSensor(Sensor):
     def lux_data(self):
         if self.failed:
             return None
-        return self.add_data('lux')
+        return self.get_data('lux')
+
+class Channel:
+    """
+    One independently polled reading. read_fn returns a value or a tuple of
+    values for columns; period is the sample interval and deadline the longest
+    a read may take (including waiting for the bus) before it is counted late.
+    uses_bus=False marks a read that does no I2C of its own, so the poller
+    does not take the bus lock for it.
+    """
+    def __init__(self, name, read_fn, columns, period, deadline, uses_bus=True):
+        self.name = name
+        self.read_fn = read_fn
+        self.columns = tuple(columns)
+        self.period = period
+        self.deadline = deadline
+        self.uses_bus = uses_bus
+        self.value = None
+        self.timestamp = None # wall-clock time of the last successful read
+        self.next_due = 0.0
+        self.started = None
+        self.future = None
+        self.overdue = False
+        self.reads = 0
+        self.timeouts = 0
+        self.bus_waits = 0
+
+    def fresh_value(self, now):
+        """
+        Latest value, or None if it is older than two periods plus the deadline.
+        """
+        if self.timestamp is None or (now - self.timestamp) > 2 * self.period + self.deadline:
+            return None
+        return self.value
+
+class SensorPoller(threading.Thread):
+    """
+    Polls each Channel at its own period on a small worker pool. Reads of
+    channels that use the bus are serialized by bus_lock (a Lock or an
+    I2CBusManager, anything with acquire(timeout=) and release()) since every
+    device shares one I2C bus, but a slow device only delays the others by
+    its own transaction instead of a whole round. A channel is never
+    resubmitted while its previous read is still running, so a hung device
+    cannot pile up work.
+    """
+    def __init__(self, channels, bus_lock=None, workers=2):
+        super().__init__(name="sensor-poller", daemon=True)
+        self.channels = list(channels)
+        self.bus_lock = bus_lock if bus_lock is not None else threading.Lock()
+        self.workers = workers
+        self.stop_event = threading.Event()
+
+    def _read(self, ch):
+        if ch.uses_bus and not self.bus_lock.acquire(timeout=ch.deadline):
+            ch.bus_waits += 1
+            return
+        try:
+            value = ch.read_fn()
+        finally:
+            if ch.uses_bus:
+                self.bus_lock.release()
+        ch.value = value
+        ch.timestamp = time.time()
+        ch.reads += 1
+
+    def run(self):
+        pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="sensor-read")
+        try:
+            while not self.stop_event.is_set():
+                now = time.monotonic()
+                next_wake = now + 0.05
+                for ch in self.channels:
+                    if ch.future is not None:
+                        if ch.future.done():
+                            if ch.future.exception() is not None:
+                                logger.error(f"Sensor channel {ch.name} read failed: {ch.future.exception()}")
+                            ch.future = None
+                        elif not ch.overdue and now - ch.started > ch.deadline:
+                            ch.overdue = True
+                            ch.timeouts += 1
+                            logger.warning(f"Sensor channel {ch.name} missed its {ch.deadline}s deadline")
+                            continue
+                        else:
+                            continue
+
+                    if now >= ch.next_due:
+                        ch.next_due = max(ch.next_due + ch.period, now) # fixed rate, no catch-up bursts
+                        ch.started = now
+                        ch.overdue = False
+                        ch.future = pool.submit(self._read, ch)
+                    next_wake = min(next_wake, ch.next_due)
+                self.stop_event.wait(max(0.0, next_wake - time.monotonic()))
+        finally:
+            pool.shutdown(wait=False)
+
+    def stop(self, timeout=5):
+        self.stop_event.set()
+        self.join(timeout)
+
+    def stats(self):
+        return {ch.name: {"reads": ch.reads, "timeouts": ch.timeouts, "bus_waits": ch.bus_waits}
+                for ch in self.channels}
 
 class MultiSensor(Sensor):
     """
     Class that holds the various different sensors for acquiring data
     """
-    def __init__(self, db_path=db_path, i2c=None):
+    def __init__(self, db_path=db_path, i2c=None, capacity=1024, bus=None):
         """
-        Initialize the different sensor classes
+        Initialize the different sensor classes. With bus (an I2CBusManager),
+        i2c defaults to its shared handle and every device, including the
+        WittyPi, is serialized through it.
         """
+        if bus is not None and i2c is None:
+            i2c = bus.i2c()
         super().__init__(i2c=i2c)
         self.unit_name = name
-        self.wittypi = WittyPi()
+        self.bus = bus
+        self.wittypi = WittyPi(persistent=True, temp_ttl=config.getfloat('sensors', 'internal_temp_ttl', fallback=30),
+                               bus_manager=bus)
+        columns = SCHEMAS.get(mode, ('internal_temp',))
+        self.rollup = SensorRollup(columns, READ_TIMES.get(mode, {'internal_temp': 'internal_temp_time'}))
+        # values, then the read time of each channel
+        self.buffer = SensorBuffer(columns + self.rollup.time_columns, capacity)
+        # shared by the poller and the wind sampler; through the manager so their waits count in its stats
+        self.bus_lock = bus if bus is not None else threading.Lock()
+        self.wind_continuous = False
 
         if mode == 'server':
             self._temp_rh = TempRHSensor(i2c=i2c)
@@ -198,11 +484,23 @@ class MultiSensor(Sensor):
                     relative_humidity REAL,
                     pressure REAL,
                     wind_speed REAL,
+                    wind_gust REAL,
+                    wind_std REAL,
                     internal_temp REAL
                 )
             """)
+            ensure_columns(self.sql_conn, "sensor_data", {"wind_gust": "REAL", "wind_std": "REAL"})
             self.sql_conn.commit()
 
+            self.wind_continuous = config.getboolean('sensors', 'wind_continuous', fallback=False)
+            if self.wind_continuous:
+                self.wind_continuous = self._ws.start_continuous(
+                    sample_hz=config.getfloat('sensors', 'wind_sample_hz', fallback=25),
+                    gust_s=config.getfloat('sensors', 'wind_gust_s', fallback=3),
+                    cpu_budget=config.getfloat('sensors', 'wind_cpu_budget', fallback=0.05),
+                    bus_lock=self.bus_lock
+                )
+
         if mode == 'camera':
             self._lux = LuxSensor(i2c=i2c)
 
@@ -218,7 +516,31 @@ class MultiSensor(Sensor):
                 )
             """)
             self.sql_conn.commit()
-            
+
+        ensure_columns(self.sql_conn, "sensor_data", {c: "REAL" for c in self.rollup.time_columns})
+        self.sql_conn.execute("CREATE INDEX IF NOT EXISTS idx_sensor_data_time ON sensor_data (time)")
+        self.rollup.create_tables(self.sql_conn)
+        self.sql_conn.commit()
+        self.sql_conn.execute("PRAGMA journal_mode=WAL") # readers (MQTTManager) no longer block the writer
+        self.writer = BatchWriter(
+            db_path, name="sensor-writer",
+            flush_interval=config.getint('sensors', 'db_flush_interval', fallback=5),
+            synchronous=config.get('sensors', 'db_synchronous', fallback='NORMAL'),
+            wal_autocheckpoint=config.getint('sensors', 'wal_autocheckpoint', fallback=1000)
+        )
+        self.writer.on_flush.append(self.rollup.on_flush)
+        self.writer.on_commit.append(self.rollup.on_commit)
+        self.writer.start()
+
+        self.retention = None
+        retention_days = config.getint('sensors', 'retention_days', fallback=0)
+        if retention_days > 0:
+            # the server uplinks sensor_data, so only rows the remote broker has acknowledged are pruned
+            mark_path = os.path.join(os.path.dirname(db_path), "uplink_state.json") if mode == 'server' else None
+            self.retention = Retention(db_path, "sensor_data", "time", "%Y%m%d_%H%M%S", retention_days,
+                                       mark_path=mark_path)
+            self.retention.start()
+
         # with WittyPi() as witty: ### REMOVED TO CLEAN, UPTIME CONTROLLED EXTERNALLY
         #     self._shutdown_dt = witty.get_shutdown_datetime() 
 
@@ -226,97 +548,122 @@ class MultiSensor(Sensor):
 
         self.latest_readings = {
             "temperature": None, "relative_humidity": None,
-            "pressure": None, "wind_speed": None
+            "pressure": None, "wind_speed": None,
+            "wind_gust": None, "wind_std": None,
+            "lux": None, "internal_temp": None
         }
-
-    def add_data(self,date_time):
-        # if self._shutdown_dt >= date_time: # UNCOMMENT & FIX INDENTS IF CONTINUED SAVING IS PROBLEMATIC
-        timestamp = date_time.strftime("%Y%m%d_%H%M%S")
-        self.data_dict['time'].append(timestamp)
-        self.data_dict["name"].append(self.unit_name)
-
+        self.latest_times = dict.fromkeys(self.rollup.time_columns) # <channel>_time -> epoch time of its reading
+        self.poller = None
+        self._channels = self._build_channels()
+
+    def _read_internal_temp(self):
+        with self.wittypi as wp:
+            return wp.get_internal_temperature().get("temp_c")
+
+    def _build_channels(self):
+        freq = config.getfloat('sensors', 'sensor_freq', fallback=2)
+        deadline = config.getfloat('sensors', 'read_deadline', fallback=1.0)
+
+        def period(key):
+            # a row keeps only each channel's latest reading, so reading faster than rows are recorded is wasted
+            p = config.getfloat('sensors', f'{key}_period', fallback=freq)
+            if p < freq:
+                logger.warning(f"{key}_period {p}s is shorter than sensor_freq {freq}s, using {freq}s")
+                return freq
+            return p
+
+        channels = []
         if mode == 'server':
-            temp, rh = self._temp_rh.temp_rh_data()
-            self.latest_readings["temperature"] = round(temp, 2) if temp is not None else None
-            self.latest_readings["relative_humidity"] = round(rh, 2) if rh is not None else None
-
-            pres = self._pres.pressure_data()
-            self.latest_readings["pressure"] = round(pres, 2) if pres is not None else None
-
-            wind = self._ws.add_data()
-            self.latest_readings["wind_speed"] = round(wind, 2) if wind is not None else None
-
-            for k, v in self.latest_readings.items():
-                self.data_dict.setdefault(k, []).append(v)
-
+            channels.append(Channel('temp_rh', self._temp_rh.temp_rh_data, ('temperature', 'relative_humidity'), period('temp_rh'), deadline))
+            channels.append(Channel('pressure', self._pres.pressure_data, ('pressure',), period('pressure'), deadline))
+            if self.wind_continuous: # summarizes the sampler's ring, no bus access of its own
+                channels.append(Channel('wind', self._ws.interval_stats, ('wind_speed', 'wind_gust', 'wind_std'), freq, deadline,
+                                        uses_bus=False))
+            else:
+                channels.append(Channel('wind', self._ws.get_data, ('wind_speed',), period('wind'), deadline))
         if mode == 'camera':
-            lux = self._lux.lux_data()
-            self.data_dict.setdefault("lux", []).append(round(lux, 2) if lux is not None else None)
+            channels.append(Channel('lux', self._lux.lux_data, ('lux',), period('lux'), deadline))
+        channels.append(Channel('internal_temp', self._read_internal_temp, ('internal_temp',), period('internal_temp'), deadline))
+        return channels
 
-        if hasattr(self, "wittypi"):
-            with self.wittypi as wp:
-                internal_temp_data = wp.get_internal_temperature()
-                internal_temp_c = internal_temp_data.get("temp_c")
-        else:
-            internal_temp_c = None
+    def start_polling(self):
+        """
+        Start sampling every sensor on its own period in the background. add_data then only snapshots.
+        """
+        if self.poller is None:
+            self.poller = SensorPoller(self._channels, bus_lock=self.bus_lock, workers=config.getint('sensors', 'poll_workers', fallback=2))
+            self.poller.start()
+            logger.info("Sensor polling: " + ", ".join(f"{ch.name} every {ch.period}s" for ch in self.poller.channels))
 
-        self.data_dict.setdefault("internal_temp", []).append(internal_temp_c)
+    def _poll_once(self):
+        """
+        Serial read of every sensor, used when the background poller is not running.
+        """
+        for ch in self._channels:
+            try:
+                ch.value = ch.read_fn()
+                ch.timestamp = time.time()
+            except Exception as e:
+                logger.error(f"Sensor channel {ch.name} read failed: {e}")
+
+    def add_data(self,date_time):
+        """
+        Record one row from the latest reading of every channel, along with the
+        time each channel was read (its <channel>_time column). Readings gone
+        stale are recorded as missing, without a read time.
+        """
+        # if self._shutdown_dt >= date_time: # UNCOMMENT & FIX INDENTS IF CONTINUED SAVING IS PROBLEMATIC
+        if self.poller is None:
+            self._poll_once()
+        channels = self.poller.channels if self.poller is not None else self._channels
+
+        now = time.time()
+        for ch in channels:
+            values = ch.fresh_value(now)
+            self.latest_times[f"{ch.name}_time"] = ch.timestamp if values is not None else None
+            if len(ch.columns) == 1:
+                values = (values,)
+            elif values is None:
+                values = (None,) * len(ch.columns)
+            for col, v in zip(ch.columns, values):
+                self.latest_readings[col] = round(v, 2) if v is not None else None
+
+        self.buffer.append(date_time.timestamp(), {**self.latest_readings, **self.latest_times})
 
         # else:
         #     raise ShutdownTime
 
     def insert_into_db(self):
-        if mode == 'server':
-            try:
-                len_list = len(next(iter(self.data_dict.values())))
-                for i in range(len_list):
-                    row = {k: self.data_dict[k][i] for k in self.data_dict}
-                    self.sql_cursor.execute("""
-                        INSERT INTO sensor_data (name, time, temperature, relative_humidity, pressure, wind_speed, internal_temp)
-                        VALUES (?, ?, ?, ?, ?, ?, ?)
-                    """, (
-                        row.get("name"),
-                        row.get("time"),
-                        row.get("temperature"),
-                        row.get("relative_humidity"),
-                        row.get("pressure"),
-                        row.get("wind_speed"),
-                        row.get("internal_temp")
-                    ))
-                self.sql_conn.commit()
-
-                for k in self.data_dict:
-                    self.data_dict[k] = []
-
-            except Exception as e:
-                print(f"An error occurred while inserting into DB: {e}")
-
-        else:
-            try:
-                len_list = len(next(iter(self.data_dict.values())))
-                for i in range(len_list):
-                    row = {k: self.data_dict[k][i] for k in self.data_dict}
-                    self.sql_cursor.execute("""
-                        INSERT INTO sensor_data (name, time, lux, internal_temp)
-                        VALUES (?, ?, ?, ?)
-                    """, (
-                        row.get("name"),
-                        row.get("time"),
-                        row.get("lux"),
-                        row.get("internal_temp")
-                    ))
-                self.sql_conn.commit()
-
-                for k in self.data_dict:
-                    self.data_dict[k] = []
+        """
+        Hand buffered rows to the writer thread. Never waits on SQLite.
+        Rows leave the buffer only once the writer has accepted them; from
+        then on it owns them and retries failed writes itself. If its queue
+        is full they stay buffered for the next call.
+        """
+        try:
+            columns = self.buffer.columns
+            placeholders = ", ".join("?" * (len(columns) + 2))
+            sql = f"INSERT INTO sensor_data (name, time, {', '.join(columns)}) VALUES ({placeholders})"
+            rows = self.buffer.rows(self.unit_name)
+            if self.writer.submit(sql, rows):
+                self.buffer.consume(len(rows))
 
-            except Exception as e:
-                print(f"An error occurred while inserting into DB: {e}")
+        except Exception as e:
+            logger.error(f"An error occurred while queueing rows for the DB: {e}")
 
     def sensors_deinit(self):
+        if self.poller is not None:
+            self.poller.stop()
+            logger.info(f"Sensor poller stats: {self.poller.stats()}")
         if hasattr(self, '_temp_rh'): self._temp_rh.sensor_deinit()
         if hasattr(self, '_pres'): self._pres.sensor_deinit()
-        if hasattr(self, '_ws'): self._ws.sensor_deinit()
+        if hasattr(self, '_ws'):
+            self._ws.stop_continuous()
+            self._ws.sensor_deinit()
+        self.wittypi.close()
+        if self.retention is not None:
+            self.retention.stop()
+        self.writer.stop()
         self.sql_conn.close()
         print("Deinitialized")
 
@@ -7,6 +7,7 @@ from utilities.display import Display
 from utilities.sensors import MultiSensor
 from utilities.mqtt import MQTTManager
 from utilities.wittypi import WittyPi
+from utilities.i2c_bus import I2CBusManager
 from time import sleep
 from datetime import datetime
 import threading
@@ -28,8 +29,10 @@ def run_server():
 
     logger.info("###################### INITIALIZING ##################################")
 
-    shared_i2c = board.I2C()  # Initialize the sensors
-    sensors = MultiSensor(i2c=shared_i2c)
+    bus = I2CBusManager(board.I2C()) # serializes the display, sensors and WittyPi on one bus
+    shared_i2c = bus.i2c()  # Initialize the sensors
+    sensors = MultiSensor(i2c=shared_i2c, bus=bus)
+    sensors.start_polling()
 
     try: # Initialize the display
         disp = Display(i2c=shared_i2c)
@@ -40,11 +43,14 @@ def run_server():
     disp.display_msg('Initializing')
 
     # SCHEDULING
-    try:
-        with WittyPi() as wp:
-            wp.apply_scheduling(config, disp)
-    except Exception as e:
-        logger.warning(f"Could not apply WittyPi scheduling: {e}")
+    if config.getboolean('scheduling', 'background', fallback=True):
+        WittyPi.apply_scheduling_async(config, disp, bus_manager=bus)
+    else:
+        try:
+            with WittyPi(bus_manager=bus) as wp:
+                wp.apply_scheduling(config, disp)
+        except Exception as e:
+            logger.warning(f"Could not apply WittyPi scheduling: {e}")
 
     logger.info(f"Sensor frequency: {sensor_freq}s | DB write frequency: {db_write_freq}s")
     logger.debug("Begin logging data")
@@ -78,13 +84,15 @@ def run_server():
         sensor_thread.join()
         display_thread.join()
 
-        if len(list(sensors.data_dict.values())[0]) != 0:
+        if len(sensors.buffer) != 0:
             sensors.insert_into_db()
+        logger.info(f"I2C bus stats: {bus.stats()}")
 
         mqtt_mgmt.remote_client.loop_stop()
         mqtt_mgmt.local_client.loop_stop()
         mqtt_mgmt.remote_client.disconnect()
         mqtt_mgmt.local_client.disconnect()
+        mqtt_mgmt.stop()
 
         logger.info(f"Script ended: {reason}")
 
@@ -101,12 +109,22 @@ def run_server():
 
     try:
         curr_time = time.monotonic()
+        bus_time = time.monotonic()
+        bus_report_freq = config.getint('sensors', 'bus_report_freq', fallback=600)
 
         while True:
             readings = sensors.latest_readings
             if (time.monotonic() - curr_time) >= db_write_freq:
                 sensors.insert_into_db()
                 curr_time = time.monotonic()
+            if (time.monotonic() - bus_time) >= bus_report_freq:
+                bus_stats = bus.stats()
+                logger.info(f"I2C bus stats: {bus_stats}")
+                mqtt_mgmt.publish_metrics("i2c", bus_stats)
+                writer_stats = {w.name: w.stats() for w in (sensors.writer, mqtt_mgmt.hb_writer)}
+                logger.info(f"DB writers: {writer_stats}")
+                mqtt_mgmt.publish_metrics("db_writer", writer_stats)
+                bus_time = time.monotonic()
             time.sleep(0.1)
 
     except KeyboardInterrupt:
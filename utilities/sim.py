@@ -0,0 +1,729 @@
+"""
+Hardware-free backends for running bee_cam on an ordinary Linux box.
+
+install() puts fake versions of the hardware modules (board, smbus2,
+picamera2, the Adafruit drivers and paho.mqtt) into sys.modules, so the rest
+of utilities/ imports and runs unchanged. It has to be called before any of
+those modules are imported; main.py does this when [general] backend = sim.
+
+Sensor values come from SIM, a shared table of signals that Replay can drive
+from recorded traces at accelerated time.
+"""
+import csv
+import gzip
+import heapq
+import json
+import math
+import queue
+import random
+import sqlite3
+import sys
+import threading
+import time
+import types
+from datetime import datetime
+
+from utilities.logger import logger as base_logger
+logger = base_logger.getChild("Sim")
+
+SIM_MODULES = (
+    "board", "smbus2", "picamera2",
+    "adafruit_sht31d", "adafruit_bmp3xx", "adafruit_veml7700", "adafruit_ssd1306",
+    "adafruit_ads1x15", "adafruit_ads1x15.ads1115", "adafruit_ads1x15.analog_in",
+    "paho", "paho.mqtt", "paho.mqtt.client"
+)
+
+
+class Signal:
+    """
+    base + amplitude * sin(2 pi t / period) + gaussian noise, unless a
+    replayed value has been set, which is then held until the next one.
+    """
+    def __init__(self, base, amplitude=0.0, period=86400, noise=0.0):
+        self.base = base
+        self.amplitude = amplitude
+        self.period = period
+        self.noise = noise
+        self.value = None
+
+    def read(self, t, rng):
+        if self.value is not None:
+            return self.value
+        v = self.base + self.amplitude * math.sin(2 * math.pi * t / self.period)
+        return v + rng.gauss(0, self.noise) if self.noise else v
+
+
+class SimState:
+    """
+    Shared by every fake device. i2c_latency is added to each sensor read to
+    stand in for bus time; reads are counted per signal.
+    """
+    def __init__(self, seed=0, i2c_latency=0.0):
+        self.rng = random.Random(seed)
+        self.i2c_latency = i2c_latency
+        self.frame_interval = 1 / 30
+        self.signals = {
+            "temperature": Signal(22.0, 6.0, noise=0.1),
+            "relative_humidity": Signal(55.0, -15.0, noise=0.5),
+            "pressure": Signal(1013.0, 2.0, noise=0.05),
+            "wind_speed": Signal(3.0, 2.0, period=600, noise=0.8),
+            "lux": Signal(20000.0, 19000.0, noise=200.0),
+            "internal_temp": Signal(35.0, 5.0)
+        }
+        self.reads = {}
+        self._start = time.monotonic()
+        self._lock = threading.Lock()
+
+    def read(self, name):
+        if self.i2c_latency:
+            time.sleep(self.i2c_latency)
+        with self._lock:
+            self.reads[name] = self.reads.get(name, 0) + 1
+            return self.signals[name].read(time.monotonic() - self._start, self.rng)
+
+    def set(self, name, value):
+        if name in self.signals:
+            self.signals[name].value = value
+
+    def stats(self):
+        with self._lock:
+            return {"reads": dict(self.reads)}
+
+
+SIM = SimState()
+
+
+# ---- board / busio ----------------------------------------------------------
+
+class FakeI2C:
+    def __init__(self, *args, **kwargs):
+        self._lock = threading.Lock()
+        self.frequency = 100000
+
+    def try_lock(self):
+        return self._lock.acquire(blocking=False)
+
+    def unlock(self):
+        self._lock.release()
+
+    def readfrom_into(self, address, buffer, **kwargs):
+        pass
+
+    def writeto(self, address, buffer, **kwargs):
+        pass
+
+    def writeto_then_readfrom(self, address, buffer_out, buffer_in, **kwargs):
+        pass
+
+    def scan(self):
+        return [0x08, 0x10, 0x3C, 0x44, 0x48, 0x77]
+
+    def deinit(self):
+        pass
+
+
+# ---- Adafruit drivers -------------------------------------------------------
+
+class FakeSHT31D:
+    def __init__(self, i2c, address=0x44):
+        self.i2c = i2c
+
+    @property
+    def temperature(self):
+        return SIM.read("temperature")
+
+    @property
+    def relative_humidity(self):
+        return SIM.read("relative_humidity")
+
+
+class FakeBMP3XX:
+    def __init__(self, i2c, address=0x77):
+        self.i2c = i2c
+
+    @property
+    def pressure(self):
+        return SIM.read("pressure")
+
+
+class FakeVEML7700:
+    def __init__(self, i2c, address=0x10):
+        self.i2c = i2c
+
+    @property
+    def lux(self):
+        return SIM.read("lux")
+
+
+class FakeSSD1306:
+    def __init__(self, width, height, i2c, addr=0x3C, **kwargs):
+        self.width = width
+        self.height = height
+        self.frames = 0
+
+    def fill(self, color):
+        pass
+
+    def image(self, img):
+        pass
+
+    def show(self):
+        self.frames += 1
+
+
+class FakeADS1115:
+    class Mode:
+        CONTINUOUS = 0x0000
+        SINGLE = 0x0100
+
+    def __init__(self, i2c, address=0x48):
+        self.i2c = i2c
+        self.mode = self.Mode.SINGLE
+        self.data_rate = 128
+
+
+class FakeAnalogIn:
+    def __init__(self, adc, positive_pin, negative_pin=None):
+        self.adc = adc
+
+    @property
+    def voltage(self):
+        # inverse of sensors.adc_to_wind_speed
+        return 0.4 + max(SIM.read("wind_speed"), 0.0) / 32.4 * 1.6 + 0.00575
+
+
+# ---- smbus2 (WittyPi registers) ---------------------------------------------
+
+class FakeSMBus:
+    """
+    WittyPi register file. Writes are kept, so the schedule registers read
+    back what was written; register 50 reports the simulated internal temperature.
+    """
+    registers = bytearray(256)
+    _lock = threading.Lock()
+
+    def __init__(self, bus=None):
+        self.bus = bus
+
+    def read_byte_data(self, addr, register):
+        if register == 50:
+            return int(round(SIM.read("internal_temp")))
+        with self._lock:
+            return self.registers[register]
+
+    def write_byte_data(self, addr, register, value):
+        with self._lock:
+            self.registers[register] = value & 0xFF
+
+    def read_i2c_block_data(self, addr, register, length):
+        with self._lock:
+            return list(self.registers[register:register + length])
+
+    def close(self):
+        pass
+
+
+# ---- picamera2 --------------------------------------------------------------
+
+class FakeRequest:
+    def __init__(self, camera, index):
+        self.camera = camera
+        self.index = index
+        self.metadata = {
+            "ExposureTime": camera.exposure,
+            "AnalogueGain": 1.0,
+            "Lux": SIM.signals["lux"].read(0, SIM.rng),
+            "SensorTimestamp": time.monotonic_ns()
+        }
+
+    def make_array(self, name):
+        return self.camera.render(name, self.index)
+
+    def get_metadata(self):
+        return dict(self.metadata)
+
+    def release(self):
+        pass
+
+
+class FakeMappedArray:
+    def __init__(self, request, stream):
+        self.array = request.make_array(stream)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+
+class FakePicamera2:
+    """
+    Synthetic frames: a fixed noise background with a bright square moving
+    across it, so motion detection and JPEG encoding do realistic work.
+    capture_request() is paced to the frame duration like a real sensor.
+    """
+    def __init__(self, camera_num=0):
+        import numpy as np
+        self._np = np
+        self.config = None
+        self.controls = {}
+        self.exposure = 10000
+        self.started = False
+        self.frames = 0
+        self._backgrounds = {}
+        self._next = time.monotonic()
+
+    def create_still_configuration(self, main=None, lores=None, **kwargs):
+        config = {"main": {"size": (2304, 1296), "format": "BGR888"}}
+        config["main"].update(main or {})
+        if lores is not None:
+            config["lores"] = {"size": (320, 240), "format": "YUV420"}
+            config["lores"].update(lores)
+        return config
+
+    create_video_configuration = create_still_configuration
+
+    def configure(self, config):
+        self.config = config
+        rng = self._np.random.default_rng(0)
+        for name, stream in config.items():
+            w, h = stream["size"]
+            shape = (h * 3 // 2, w) if stream["format"] == "YUV420" else (h, w, 3)
+            self._backgrounds[name] = rng.integers(0, 64, size=shape, dtype=self._np.uint8)
+
+    def set_controls(self, controls):
+        self.controls.update(controls)
+        limits = controls.get("FrameDurationLimits")
+        if limits:
+            self.exposure = limits[1]
+
+    def start(self):
+        self.started = True
+
+    def stop(self):
+        self.started = False
+
+    def close(self):
+        self.stop()
+
+    def capture_request(self):
+        if not self.started:
+            raise RuntimeError("Camera not started")
+        self._next = max(self._next + SIM.frame_interval, time.monotonic())
+        delay = self._next - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self.frames += 1
+        return FakeRequest(self, self.frames)
+
+    def render(self, name, index):
+        frame = self._backgrounds[name].copy()
+        w, h = self.config[name]["size"]
+        side = max(4, h // 8)
+        x = (index * max(1, w // 60)) % (w - side)
+        y = h // 2 - side // 2
+        frame[y:y + side, x:x + side] = 255
+        return frame
+
+
+# ---- paho.mqtt --------------------------------------------------------------
+
+MQTT_ERR_SUCCESS = 0
+MQTT_ERR_NO_CONN = 4
+
+
+def topic_matches(sub, topic):
+    sub_parts, topic_parts = sub.split("/"), topic.split("/")
+    for i, part in enumerate(sub_parts):
+        if part == "#":
+            return True
+        if i >= len(topic_parts) or (part != "+" and part != topic_parts[i]):
+            return False
+    return len(sub_parts) == len(topic_parts)
+
+
+class FakeMessage:
+    def __init__(self, topic, payload, qos=0):
+        self.topic = topic
+        self.payload = payload if isinstance(payload, bytes) else str(payload).encode()
+        self.qos = qos
+
+
+class FakeMessageInfo:
+    def __init__(self, mid, rc):
+        self.mid = mid
+        self.rc = rc
+
+    def wait_for_publish(self, timeout=None):
+        pass
+
+    def is_published(self):
+        return self.rc == MQTT_ERR_SUCCESS
+
+
+class FakeBroker:
+    """
+    In-process stand-in for both the LAN mosquitto and the remote EMQX broker.
+    Set online = False to simulate a lost uplink: clients get on_disconnect
+    and publishes fail with MQTT_ERR_NO_CONN until it is set back.
+    """
+    def __init__(self):
+        self.clients = []
+        self.published = {}
+        self.bytes = 0
+        self._online = True
+        self._lock = threading.Lock()
+
+    @property
+    def online(self):
+        return self._online
+
+    @online.setter
+    def online(self, value):
+        self._online = value
+        for client in list(self.clients):
+            client._push(("connect" if value else "disconnect", None))
+
+    def attach(self, client):
+        with self._lock:
+            if client not in self.clients:
+                self.clients.append(client)
+
+    def detach(self, client):
+        with self._lock:
+            if client in self.clients:
+                self.clients.remove(client)
+
+    def publish(self, topic, payload, qos):
+        msg = FakeMessage(topic, payload, qos)
+        with self._lock:
+            self.published[topic] = self.published.get(topic, 0) + 1
+            self.bytes += len(msg.payload)
+            targets = [c for c in self.clients if any(topic_matches(s, topic) for s in c._subs)]
+        for client in targets:
+            client._push(("message", msg))
+
+    def stats(self):
+        with self._lock:
+            return {"messages": dict(self.published), "bytes": self.bytes, "clients": len(self.clients)}
+
+
+BROKER = FakeBroker()
+
+
+class FakeClient:
+    def __init__(self, client_id="", callback_api_version=None, **kwargs):
+        self.client_id = client_id
+        self.logger = logger.getChild(f"MQTT.{client_id or 'client'}")
+        self.on_connect = None
+        self.on_disconnect = None
+        self.on_message = None
+        self.on_publish = None
+        self._subs = set()
+        self._mid = 0
+        self._connected = False
+        self._events = queue.Queue()
+        self._thread = None
+
+    def username_pw_set(self, username, password=None):
+        pass
+
+    def tls_set(self, *args, **kwargs):
+        pass
+
+    def reconnect_delay_set(self, min_delay=1, max_delay=120):
+        pass
+
+    def connect(self, host, port=1883, keepalive=60, **kwargs):
+        BROKER.attach(self)
+        self._push(("connect", None))
+        return MQTT_ERR_SUCCESS
+
+    connect_async = connect
+
+    def reconnect(self):
+        return self.connect(None)
+
+    def disconnect(self, *args, **kwargs):
+        BROKER.detach(self)
+        self._push(("disconnect", None))
+        return MQTT_ERR_SUCCESS
+
+    def is_connected(self):
+        return self._connected
+
+    def subscribe(self, topic, qos=0, **kwargs):
+        self._subs.add(topic)
+        return (MQTT_ERR_SUCCESS, self._next_mid())
+
+    def unsubscribe(self, topic, **kwargs):
+        self._subs.discard(topic)
+        return (MQTT_ERR_SUCCESS, self._next_mid())
+
+    def publish(self, topic, payload=None, qos=0, retain=False, **kwargs):
+        mid = self._next_mid()
+        if not (self._connected and BROKER.online):
+            return FakeMessageInfo(mid, MQTT_ERR_NO_CONN)
+        BROKER.publish(topic, payload if payload is not None else b"", qos)
+        if self.on_publish is not None:
+            self._push(("publish", mid))
+        return FakeMessageInfo(mid, MQTT_ERR_SUCCESS)
+
+    def loop_start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name=f"mqtt-{self.client_id}", daemon=True)
+            self._thread.start()
+        return MQTT_ERR_SUCCESS
+
+    def loop_stop(self, force=False):
+        if self._thread is not None:
+            self._events.put(None)
+            self._thread.join(2)
+            self._thread = None
+        return MQTT_ERR_SUCCESS
+
+    def loop_forever(self, *args, **kwargs):
+        self._loop()
+
+    def _next_mid(self):
+        self._mid += 1
+        return self._mid
+
+    def _push(self, event):
+        self._events.put(event)
+
+    def _loop(self):
+        # callbacks run here, like paho's network thread
+        while True:
+            event = self._events.get()
+            if event is None:
+                return
+            kind, arg = event
+            try:
+                if kind == "connect":
+                    self._connected = BROKER.online and self in BROKER.clients
+                    if self.on_connect is not None:
+                        self.on_connect(self, None, {}, 0 if self._connected else 3, None)
+                elif kind == "disconnect":
+                    self._connected = False
+                    if self.on_disconnect is not None:
+                        self.on_disconnect(self, None, {}, 7, None)
+                elif kind == "message" and self.on_message is not None:
+                    self.on_message(self, None, arg)
+                elif kind == "publish" and self.on_publish is not None:
+                    self.on_publish(self, None, arg, 0, None)
+            except Exception as e:
+                self.logger.error(f"Callback for {kind} failed: {e}")
+
+
+# ---- installation -----------------------------------------------------------
+
+def _module(name, **attrs):
+    mod = types.ModuleType(name)
+    mod.__dict__.update(attrs)
+    mod.__sim__ = True
+    return mod
+
+
+def build_modules():
+    ads1115 = _module("adafruit_ads1x15.ads1115", ADS1115=FakeADS1115, Mode=FakeADS1115.Mode, P0=0, P1=1, P2=2, P3=3)
+    analog_in = _module("adafruit_ads1x15.analog_in", AnalogIn=FakeAnalogIn)
+    client = _module(
+        "paho.mqtt.client",
+        Client=FakeClient, MQTTMessage=FakeMessage, MQTTMessageInfo=FakeMessageInfo,
+        CallbackAPIVersion=types.SimpleNamespace(VERSION1=1, VERSION2=2),
+        MQTT_ERR_SUCCESS=MQTT_ERR_SUCCESS, MQTT_ERR_NO_CONN=MQTT_ERR_NO_CONN
+    )
+    mqtt = _module("paho.mqtt", client=client)
+    return {
+        "board": _module("board", I2C=FakeI2C, SCL=3, SDA=2),
+        "smbus2": _module("smbus2", SMBus=FakeSMBus),
+        "picamera2": _module("picamera2", Picamera2=FakePicamera2, MappedArray=FakeMappedArray, Preview=None),
+        "adafruit_sht31d": _module("adafruit_sht31d", SHT31D=FakeSHT31D),
+        "adafruit_bmp3xx": _module("adafruit_bmp3xx", BMP3XX_I2C=FakeBMP3XX),
+        "adafruit_veml7700": _module("adafruit_veml7700", VEML7700=FakeVEML7700),
+        "adafruit_ssd1306": _module("adafruit_ssd1306", SSD1306_I2C=FakeSSD1306),
+        "adafruit_ads1x15": _module("adafruit_ads1x15", ads1115=ads1115, analog_in=analog_in),
+        "adafruit_ads1x15.ads1115": ads1115,
+        "adafruit_ads1x15.analog_in": analog_in,
+        "paho": _module("paho", mqtt=mqtt),
+        "paho.mqtt": mqtt,
+        "paho.mqtt.client": client
+    }
+
+
+def install(config=None):
+    """
+    Replace the hardware modules with the fakes. Must run before anything in
+    utilities/ that touches hardware is imported.
+    """
+    already = [name for name in SIM_MODULES if name in sys.modules and not getattr(sys.modules[name], "__sim__", False)]
+    if already:
+        raise RuntimeError(f"sim.install() called after real hardware modules were imported: {already}")
+    if config is not None:
+        SIM.rng.seed(config.getint('sim', 'seed', fallback=0))
+        SIM.i2c_latency = config.getfloat('sim', 'i2c_latency_ms', fallback=0) / 1000
+        SIM.frame_interval = 1 / config.getfloat('sim', 'camera_fps', fallback=30)
+    sys.modules.update(build_modules())
+    return SIM
+
+
+# ---- replay -----------------------------------------------------------------
+
+def _parse_time(value):
+    value = str(value)
+    if "_" in value and "-" not in value:
+        return datetime.strptime(value, "%Y%m%d_%H%M%S")
+    return datetime.fromisoformat(value)
+
+
+def load_trace(path, table):
+    """
+    Rows of a recorded trace as dicts, oldest first. Accepts a SQLite
+    database (reads the given table), or a CSV / gzipped CSV such as the
+    files written by utilities.export.
+    """
+    if path.endswith(".db"):
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        conn.row_factory = sqlite3.Row
+        try:
+            for row in conn.execute(f"SELECT * FROM {table} ORDER BY id"):
+                yield dict(row)
+        finally:
+            conn.close()
+        return
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", newline="") as f:
+        for row in csv.DictReader(f):
+            yield {k: (v if v != "" else None) for k, v in row.items()}
+
+
+class Replay(threading.Thread):
+    """
+    Plays recorded sensor rows into SIM and heartbeats into the broker,
+    compressing the recorded gaps by speed (speed=60 plays an hour in a minute).
+    Heartbeats are re-stamped with the current time so the server's drift
+    check sees them as live.
+    """
+    def __init__(self, sensor_trace=None, heartbeat_trace=None, speed=60.0, loop=False):
+        super().__init__(name="sim-replay", daemon=True)
+        self.sensor_trace = sensor_trace
+        self.heartbeat_trace = heartbeat_trace
+        self.speed = speed
+        self.loop = loop
+        self.stop_event = threading.Event()
+        self.events = 0
+        self.elapsed = 0.0
+        self._client = FakeClient("sim-replay")
+
+    def _events(self):
+        """
+        (time, kind, row) from both traces merged into time order. Each trace
+        is read lazily and is already in time order, so memory stays flat
+        however long the traces are.
+        """
+        streams = []
+        if self.sensor_trace:
+            streams.append(self._stream("sensor", "time", load_trace(self.sensor_trace, "sensor_data")))
+        if self.heartbeat_trace:
+            streams.append(self._stream("heartbeat", "receipt_time", load_trace(self.heartbeat_trace, "heartbeats")))
+        return heapq.merge(*streams, key=lambda e: e[0])
+
+    @staticmethod
+    def _stream(kind, time_col, rows):
+        for row in rows:
+            yield _parse_time(row[time_col]), kind, row
+
+    def _apply(self, kind, row):
+        if kind == "sensor":
+            for name, value in row.items():
+                if name in SIM.signals and value is not None:
+                    SIM.set(name, float(value))
+        else:
+            self._client.publish("heartbeat", json.dumps({
+                "name": row["camera_name"],
+                "timestamp": datetime.now().isoformat(),
+                "cam_on": 1
+            }))
+
+    def run(self):
+        self._client.connect(None)
+        self._client.loop_start()
+        start = time.monotonic()
+        while not self.stop_event.is_set():
+            t0 = None
+            for t, kind, row in self._events():
+                if t0 is None:
+                    t0, wall0 = t, time.monotonic()
+                delay = (t - t0).total_seconds() / self.speed - (time.monotonic() - wall0)
+                if delay > 0 and self.stop_event.wait(delay):
+                    break
+                self._apply(kind, row)
+                self.events += 1
+            if t0 is None or not self.loop:
+                break
+        self.elapsed = time.monotonic() - start
+        self._client.loop_stop()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def stats(self):
+        elapsed = self.elapsed or 1e-9
+        return {"events": self.events, "elapsed_s": round(self.elapsed, 2), "events_per_s": round(self.events / elapsed, 1)}
+
+
+def start_replay(config):
+    """
+    Start a Replay thread from the [sim] section, or return None if no traces are configured.
+    """
+    sensor_trace = config.get('sim', 'sensor_trace', fallback='').strip()
+    heartbeat_trace = config.get('sim', 'heartbeat_trace', fallback='').strip()
+    if not sensor_trace and not heartbeat_trace:
+        return None
+    replay = Replay(
+        sensor_trace or None, heartbeat_trace or None,
+        speed=config.getfloat('sim', 'replay_speed', fallback=60),
+        loop=config.getboolean('sim', 'replay_loop', fallback=False)
+    )
+    replay.start()
+    return replay
+
+
+def main(args):
+    """
+    python3 -m utilities.sim [server|camera] [seconds]: run a mode on the fake
+    backends for a fixed time, then print what went through them. The mode
+    defaults to, and has to match, [general] mode in the config.
+    """
+    from utilities.config import Config
+    config = Config()
+    config_mode = config['general'].get('mode', '').strip().lower()
+    mode = args[0].strip().lower() if args else config_mode or 'camera'
+    duration = float(args[1]) if len(args) > 1 else 60.0
+    if mode not in ("server", "camera"):
+        raise SystemExit(f"Unknown mode {mode!r}, expected server or camera")
+    if mode != config_mode:
+        # sensors, mqtt and the rest pick their behaviour from [general] mode at import
+        raise SystemExit(f"Asked to run {mode} but the config has mode = {config_mode or '(unset)'}; "
+                         f"set [general] mode = {mode} in it")
+    install(config)
+
+    if mode == "server":
+        from utilities.server_main import run_server as run
+    else:
+        from utilities.camera_main import run_camera as run
+    replay = start_replay(config)
+    threading.Thread(target=run, name=f"sim-{mode}", daemon=True).start()
+    time.sleep(duration)
+
+    report = {"mode": mode, "duration_s": duration, "broker": BROKER.stats(), "sensors": SIM.stats()}
+    if replay is not None:
+        report["replay"] = replay.stats()
+    print(json.dumps(report, indent=1))
+
+
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,250 @@
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+
+from PIL import Image
+
+from utilities.logger import logger as base_logger
+logger = base_logger.getChild("Storage")
+
+DAY_DIR = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+RECOMPRESSED_MARKER = ".recompressed"
+RECOMPRESS_PROGRESS = ".recompress_progress" # last file re-encoded in a day that is not finished yet
+
+POLICIES = ("recompress", "drop_inactive", "delete_oldest")
+
+
+class StorageManager(threading.Thread):
+    """
+    Watches free space on the data partition and frees room before it runs out.
+
+    Below soft_free_bytes, the configured policies are applied to the oldest
+    day directories (never today's), one step per check, in order:
+      recompress    - re-encode up to recompress_batch of a day's JPEGs at recompress_quality
+      drop_inactive - delete frames whose catalog activity score is under activity_threshold
+      delete_oldest - remove the oldest day directory
+    Below hard_free_bytes, writes_allowed() turns False so the pipeline drops
+    frames instead of failing on a full card. That is decided before any
+    eviction work starts, so frames are not written while a step runs.
+    """
+    def __init__(self, data_dir, current_day, soft_free_bytes, hard_free_bytes, policies=POLICIES,
+                 recompress_quality=60, recompress_batch=200, activity_threshold=0.01, check_freq=60,
+                 rate_alpha=0.2):
+        super().__init__(name="storage", daemon=True)
+        for policy in policies:
+            if policy not in POLICIES:
+                raise ValueError(f"Unknown storage policy: {policy}")
+        self.data_dir = data_dir
+        self.current_day = current_day
+        self.soft_free_bytes = soft_free_bytes
+        self.hard_free_bytes = hard_free_bytes
+        self.policies = list(policies)
+        self.recompress_quality = recompress_quality
+        self.recompress_batch = recompress_batch
+        self.activity_threshold = activity_threshold
+        self.check_freq = check_freq
+        self.rate_alpha = rate_alpha
+        self.stop_event = threading.Event()
+
+        self._lock = threading.Lock()
+        self._paused = False
+        self._last_free = None
+        self._last_check = None
+        self.free_bytes = None
+        self.total_bytes = None
+        self.write_rate = 0.0 # bytes/s, exponentially smoothed
+        self.evictions = {policy: 0 for policy in self.policies}
+        self.freed_bytes = 0
+        self._skipped_days = set() # shard-format days already reported by _recompress
+
+    def writes_allowed(self):
+        return not self._paused
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"Storage check failed: {e}")
+            self.stop_event.wait(self.check_freq)
+
+    def stop(self):
+        self.stop_event.set()
+
+    def check(self):
+        usage = shutil.disk_usage(self.data_dir)
+        now = time.monotonic()
+        self._update_rate(usage.free, now)
+        self._apply_hard_watermark(usage.free)
+
+        if usage.free < self.soft_free_bytes:
+            logger.warning(f"Free space {usage.free / 1e6:.0f} MB below soft watermark, evicting")
+            if not self.evict_step():
+                logger.warning("Nothing left to evict")
+            usage = shutil.disk_usage(self.data_dir)
+            self._apply_hard_watermark(usage.free)
+
+        with self._lock:
+            self.free_bytes = usage.free
+            self.total_bytes = usage.total
+
+    def _apply_hard_watermark(self, free):
+        paused = free < self.hard_free_bytes
+        if paused != self._paused:
+            if paused:
+                logger.error(f"Free space {free / 1e6:.0f} MB below hard watermark, pausing image writes")
+            else:
+                logger.info("Free space recovered, resuming image writes")
+            self._paused = paused
+
+    def _update_rate(self, free, now):
+        if self._last_free is not None and now > self._last_check:
+            rate = max(0.0, (self._last_free - free) / (now - self._last_check))
+            self.write_rate += self.rate_alpha * (rate - self.write_rate)
+        self._last_free = free
+        self._last_check = now
+
+    def old_days(self):
+        days = sorted(d for d in os.listdir(self.data_dir)
+                      if DAY_DIR.match(d) and os.path.isdir(os.path.join(self.data_dir, d)))
+        return [d for d in days if d != self.current_day]
+
+    def evict_step(self):
+        """
+        Apply the first policy that still has something to do. Returns False if none did.
+        """
+        for policy in self.policies:
+            freed = getattr(self, f"_{policy}")()
+            if freed is not None:
+                self.evictions[policy] += 1
+                self.freed_bytes += freed
+                logger.info(f"Storage policy {policy} freed {freed / 1e6:.1f} MB")
+                return True
+        return False
+
+    def _recompress(self):
+        for day in self.old_days():
+            day_dir = os.path.join(self.data_dir, day)
+            marker = os.path.join(day_dir, RECOMPRESSED_MARKER)
+            images = os.path.join(day_dir, "images")
+            if os.path.exists(marker) or not os.path.isdir(images):
+                continue
+            progress = os.path.join(day_dir, RECOMPRESS_PROGRESS)
+            done_up_to = ""
+            if os.path.exists(progress):
+                with open(progress) as f:
+                    done_up_to = f.read().strip()
+            names = sorted(n for n in os.listdir(images) if n.endswith(".jpg") and n > done_up_to)
+            if not names:
+                if not done_up_to and os.path.isdir(os.path.join(day_dir, "archive")):
+                    # frames live inside shards, which cannot be re-encoded in place
+                    if day not in self._skipped_days:
+                        logger.info(f"Skipping recompression of {day}: frames are stored in shards")
+                        self._skipped_days.add(day)
+                    continue
+                open(marker, "w").close()
+                if os.path.exists(progress):
+                    os.remove(progress)
+                continue
+
+            batch = names[:self.recompress_batch]
+            freed = 0
+            sizes = []
+            for name in batch:
+                path = os.path.join(images, name)
+                before = os.path.getsize(path)
+                tmp = path + ".tmp"
+                try:
+                    with Image.open(path) as img:
+                        img.save(tmp, "JPEG", quality=self.recompress_quality)
+                    os.replace(tmp, path)
+                    after = os.path.getsize(path)
+                    freed += before - after
+                    sizes.append((after, os.path.relpath(path, day_dir)))
+                except Exception as e:
+                    logger.warning(f"Could not recompress {path}: {e}")
+                    if os.path.exists(tmp):
+                        os.remove(tmp)
+            self._update_catalog_sizes(day_dir, sizes)
+            with open(progress, "w") as f:
+                f.write(batch[-1])
+            if len(batch) == len(names):
+                open(marker, "w").close()
+                os.remove(progress)
+            logger.info(f"Recompressed {len(batch)} frames of {day}, {len(names) - len(batch)} left")
+            return freed
+        return None
+
+    def _update_catalog_sizes(self, day_dir, sizes):
+        db_path = os.path.join(day_dir, "catalog.db")
+        if not sizes or not os.path.exists(db_path):
+            return
+        conn = sqlite3.connect(db_path, timeout=10)
+        try:
+            with conn:
+                conn.executemany("UPDATE frames SET size = ? WHERE path = ?", sizes)
+        except sqlite3.Error as e:
+            logger.warning(f"Could not update catalog sizes in {db_path}: {e}")
+        finally:
+            conn.close()
+
+    def _drop_inactive(self):
+        for day in self.old_days():
+            day_dir = os.path.join(self.data_dir, day)
+            db_path = os.path.join(day_dir, "catalog.db")
+            if not os.path.exists(db_path):
+                continue
+            conn = sqlite3.connect(db_path)
+            try:
+                # shard members cannot be deleted one by one, so only loose files are dropped
+                rows = conn.execute("""
+                    SELECT id, path FROM frames
+                    WHERE activity IS NOT NULL AND activity < ? AND path NOT LIKE '%#%'
+                """, (self.activity_threshold,)).fetchall()
+                if not rows:
+                    continue
+                freed = 0
+                for _, path in rows:
+                    full = os.path.join(day_dir, path)
+                    try:
+                        freed += os.path.getsize(full)
+                        os.remove(full)
+                    except FileNotFoundError:
+                        pass
+                with conn:
+                    conn.executemany("DELETE FROM frames WHERE id = ?", [(row_id,) for row_id, _ in rows])
+                return freed
+            finally:
+                conn.close()
+        return None
+
+    def _delete_oldest(self):
+        days = self.old_days()
+        if not days:
+            return None
+        day_dir = os.path.join(self.data_dir, days[0])
+        freed = sum(os.path.getsize(os.path.join(root, f))
+                    for root, _, files in os.walk(day_dir) for f in files)
+        shutil.rmtree(day_dir)
+        return freed
+
+    def metrics(self):
+        with self._lock:
+            free, total = self.free_bytes, self.total_bytes
+        if free is None:
+            return {}
+        usable = max(0, free - self.hard_free_bytes)
+        hours_to_full = usable / self.write_rate / 3600 if self.write_rate > 0 else None
+        return {
+            "free_mb": round(free / 1e6, 1),
+            "total_mb": round(total / 1e6, 1),
+            "write_rate_kbps": round(self.write_rate / 1e3, 2),
+            "hours_to_full": round(hours_to_full, 1) if hours_to_full is not None else None,
+            "days_headroom": round(hours_to_full / 24, 2) if hours_to_full is not None else None,
+            "writes_paused": self._paused,
+            "evictions": dict(self.evictions),
+            "freed_mb": round(self.freed_bytes / 1e6, 1)
+        }
@@ -0,0 +1,109 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import simplejpeg
+
+from utilities.logger import logger as base_logger
+logger = base_logger.getChild("Thumbnails")
+
+
+def make_thumbnail(array, width, colorspace="RGB", quality=75):
+    """
+    Downscale by integer striding and encode as JPEG. Striding is aliased
+    compared to a proper resample but costs almost nothing, which is what
+    matters on the encode threads.
+    """
+    step = max(1, -(-array.shape[1] // width)) # ceil division
+    small = np.ascontiguousarray(array[::step, ::step])
+    return simplejpeg.encode_jpeg(small, quality=quality, colorspace=colorspace, colorsubsampling="420")
+
+
+class ThumbnailCache:
+    """
+    On-disk LRU of derivative JPEGs, stored as <cache_dir>/<width>/<frame_id>.
+    Recency is kept in memory and mirrored to file mtimes, so the order
+    survives a restart. Files are evicted oldest-first once the total size
+    exceeds budget_bytes.
+    """
+    def __init__(self, cache_dir, budget_bytes):
+        self.cache_dir = cache_dir
+        self.budget_bytes = budget_bytes
+        self._entries = OrderedDict() # (frame_id, width) -> size in bytes
+        self._total = 0
+        self._lock = threading.Lock()
+        self.evicted = 0
+        self._load()
+
+    def _path(self, frame_id, width):
+        return os.path.join(self.cache_dir, str(width), frame_id)
+
+    def _load(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        found = []
+        for size_dir in os.scandir(self.cache_dir):
+            if not size_dir.is_dir() or not size_dir.name.isdigit():
+                continue
+            for entry in os.scandir(size_dir.path):
+                st = entry.stat()
+                found.append((st.st_mtime, entry.name, int(size_dir.name), st.st_size))
+        for _, frame_id, width, size in sorted(found):
+            self._entries[(frame_id, width)] = size
+            self._total += size
+        self._evict()
+
+    def _evict(self):
+        while self._total > self.budget_bytes and self._entries:
+            (frame_id, width), size = self._entries.popitem(last=False)
+            self._total -= size
+            self.evicted += 1
+            try:
+                os.remove(self._path(frame_id, width))
+            except FileNotFoundError:
+                pass
+
+    def put(self, frame_id, width, data):
+        path = self._path(frame_id, width)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        with self._lock:
+            old = self._entries.pop((frame_id, width), 0)
+            self._entries[(frame_id, width)] = len(data)
+            self._total += len(data) - old
+            self._evict()
+
+    def get(self, frame_id, width):
+        with self._lock:
+            if (frame_id, width) not in self._entries:
+                return None
+            self._entries.move_to_end((frame_id, width))
+        path = self._path(frame_id, width)
+        try:
+            os.utime(path)
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            with self._lock:
+                self._total -= self._entries.pop((frame_id, width), 0)
+            return None
+
+    def latest(self, width):
+        """
+        Most recently added or read frame id at this width, or None.
+        """
+        with self._lock:
+            for frame_id, w in reversed(self._entries):
+                if w == width:
+                    return frame_id
+        return None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "size_mb": round(self._total / 1e6, 2),
+                "budget_mb": round(self.budget_bytes / 1e6, 2),
+                "evicted": self.evicted
+            }
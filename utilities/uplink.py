@@ -0,0 +1,184 @@
+import json
+import os
+import sqlite3
+import threading
+import zlib
+
+from utilities.logger import logger as base_logger
+logger = base_logger.getChild("Uplink")
+
+
+def encode_json_zlib(columns, rows):
+    """
+    {"cols": [...], "rows": [[...], ...]} as compact JSON, zlib-compressed.
+    Column names are sent once per batch instead of once per reading.
+    """
+    doc = {"v": 1, "cols": columns, "rows": rows}
+    return zlib.compress(json.dumps(doc, separators=(",", ":")).encode(), 9)
+
+
+class UplinkQueue(threading.Thread):
+    """
+    Store-and-forward of sensor_data to the remote broker. sensor.db is the
+    queue: every row with id above the persisted high-water mark is unsent.
+
+    Each interval, unsent rows are read in batches of batch_rows, encoded
+    and published with QoS 1. The mark only moves (and is saved) once the
+    broker has acknowledged the batch, so nothing is lost across outages or
+    restarts; at worst a batch is sent twice. A batch over the remaining
+    budget is halved until it fits, and sending stops for the interval once
+    not even one row fits; a row bigger than max_bytes on its own is logged
+    and skipped. Sending pauses while the client is disconnected and resumes
+    as soon as set_connected(True) is called.
+    """
+    def __init__(self, client, db_path, state_path, topic, interval=60, batch_rows=500,
+                 max_bytes=64 * 1024, ack_timeout=30, backfill=False, encode=encode_json_zlib):
+        super().__init__(name="uplink", daemon=True)
+        self.client = client
+        self.db_path = db_path
+        self.state_path = state_path
+        self.topic = topic
+        self.interval = interval
+        self.batch_rows = batch_rows
+        self.max_bytes = max_bytes
+        self.ack_timeout = ack_timeout
+        self.backfill = backfill
+        self.encode = encode
+
+        self.connected = threading.Event()
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self.mark = None
+        self.backlog = 0
+        self.rows_sent = 0
+        self.bytes_sent = 0
+        self.batches = 0
+        self.failures = 0
+        self.throttled = 0
+        self.skipped = 0
+
+    def set_connected(self, connected):
+        if connected:
+            self.connected.set()
+            self._wake.set()
+        else:
+            self.connected.clear()
+
+    def _load_mark(self, conn):
+        try:
+            with open(self.state_path) as f:
+                return json.load(f)["sensor_data"]
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Uplink state unreadable, restarting from the newest row: {e}")
+        if self.backfill:
+            return 0
+        # first run: only send what is recorded from now on
+        return conn.execute("SELECT coalesce(max(id), 0) FROM sensor_data").fetchone()[0]
+
+    def _save_mark(self):
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"sensor_data": self.mark}, f)
+        os.replace(tmp, self.state_path)
+
+    def run(self):
+        try:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            self.mark = self._load_mark(conn)
+            self._save_mark()
+        except Exception as e:
+            logger.error(f"Uplink disabled: {e}")
+            return
+        logger.info(f"Uplink to {self.topic} from id {self.mark}, {self.max_bytes} bytes per {self.interval}s")
+        try:
+            while not self._stop_event.is_set():
+                if self.connected.is_set():
+                    try:
+                        self.send_pending(conn)
+                    except Exception as e:
+                        self.failures += 1
+                        logger.warning(f"Uplink pass failed: {e}")
+                self._wake.clear()
+                self._wake.wait(self.interval)
+        finally:
+            conn.close()
+
+    def send_pending(self, conn):
+        """
+        Send unsent rows until caught up, disconnected or over the byte budget.
+        """
+        budget = self.max_bytes
+        limit = self.batch_rows
+        backlog = conn.execute("SELECT count(*) FROM sensor_data WHERE id > ?", (self.mark,)).fetchone()[0]
+        with self._lock:
+            self.backlog = backlog
+        while not self._stop_event.is_set() and self.connected.is_set():
+            cur = conn.execute("SELECT * FROM sensor_data WHERE id > ? ORDER BY id LIMIT ?", (self.mark, limit))
+            rows = cur.fetchall()
+            if not rows:
+                return
+            columns = [d[0] for d in cur.description]
+            payload = self.encode(columns, [list(row) for row in rows])
+            if len(payload) > budget:
+                if len(rows) > 1:
+                    limit = len(rows) // 2 # send what still fits in this interval
+                    continue
+                if len(payload) > self.max_bytes: # a row that can never fit
+                    logger.error(f"Uplink row {rows[0][0]} encodes to {len(payload)} bytes, over the "
+                                 f"{self.max_bytes} byte cap; skipping it")
+                    self._advance(rows[0][0], skipped=1)
+                    continue
+                self.throttled += 1
+                logger.debug(f"Uplink budget used, {self.backlog} rows waiting for the next interval")
+                return
+            if not self._publish(payload):
+                return
+            budget -= len(payload)
+            limit = self.batch_rows
+            self._advance(rows[-1][0], sent=len(rows), size=len(payload))
+            logger.debug(f"Uplinked {len(rows)} rows in {len(payload)} bytes, mark {self.mark}")
+
+    def _advance(self, mark, sent=0, size=0, skipped=0):
+        with self._lock:
+            self.mark = mark
+            self.backlog = max(0, self.backlog - sent - skipped)
+            self.rows_sent += sent
+            self.bytes_sent += size
+            self.batches += 1 if sent else 0
+            self.skipped += skipped
+        self._save_mark()
+
+    def _publish(self, payload):
+        try:
+            info = self.client.publish(self.topic, payload, qos=1)
+            info.wait_for_publish(timeout=self.ack_timeout)
+            if info.is_published():
+                return True
+            logger.warning(f"Uplink batch not acknowledged (rc {info.rc}), will retry")
+        except Exception as e:
+            logger.warning(f"Uplink publish failed: {e}")
+        self.failures += 1
+        return False
+
+    def stop(self):
+        self._stop_event.set()
+        self._wake.set()
+        self.join(self.ack_timeout + 5)
+        logger.info(f"Uplink stopped: {self.stats()}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "mark": self.mark,
+                "backlog": self.backlog,
+                "rows": self.rows_sent,
+                "bytes": self.bytes_sent,
+                "bytes_per_row": round(self.bytes_sent / self.rows_sent, 1) if self.rows_sent else None,
+                "batches": self.batches,
+                "failures": self.failures,
+                "throttled": self.throttled,
+                "skipped": self.skipped
+            }
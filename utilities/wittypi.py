@@ -1,6 +1,7 @@
 import time
 import os
 import csv
+import threading
 from datetime import datetime, timedelta
 from smbus2 import SMBus
 from utilities.config import Config
@@ -11,18 +12,82 @@ class ShutdownTime(Exception):
     """Raised when the shutdown time is reached."""
     pass
 
+I2C_ADDR = 8
+BLOCK_READ_FAILURES = 3 # consecutive block read failures before falling back to byte reads
+
 class WittyPi:
-    def __init__(self, bus_num: int = 1):
+    """
+    With persistent=True the SMBus handle opened by the first `with` block is
+    kept for the life of the object instead of being reopened every time,
+    which is what the sensor sampling loop wants. Slowly changing values
+    (internal temperature, schedule registers) are cached for their TTL.
+    """
+    def __init__(self, bus_num: int = 1, persistent: bool = False, temp_ttl: float = 30, schedule_ttl: float = 300,
+                 bus_manager=None):
         self._bus_num = bus_num
+        self.bus_manager = bus_manager # I2CBusManager to serialize with the other devices on the bus
         self._bus = None
+        self.persistent = persistent
+        self.temp_ttl = temp_ttl
+        self.schedule_ttl = schedule_ttl
+        self._block_reads = True
+        self._block_failures = 0 # consecutive failed block reads
+        self._cache = {} # key -> (monotonic expiry, value)
+        self.reconnects = 0
         self.latest_temp = {}
 
     def __enter__(self):
-        self._bus = SMBus(self._bus_num)
+        if self._bus is None:
+            self._bus = SMBus(self._bus_num)
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self._bus.close()
+        if not self.persistent:
+            self.close()
+
+    def close(self):
+        if self._bus is not None:
+            try:
+                self._bus.close()
+            finally:
+                self._bus = None
+
+    def _reconnect(self):
+        self.close()
+        self._bus = SMBus(self._bus_num)
+        self.reconnects += 1
+        logger.warning(f"Reopened I2C bus {self._bus_num} (reconnect #{self.reconnects})")
+
+    def _call(self, method: str, *args):
+        """
+        Run an SMBus call, reopening the bus and retrying once on an I/O error.
+        """
+        if self.bus_manager is not None:
+            with self.bus_manager.transaction(I2C_ADDR):
+                return self._call_unlocked(method, *args)
+        return self._call_unlocked(method, *args)
+
+    def _call_unlocked(self, method: str, *args):
+        if self._bus is None:
+            self._bus = SMBus(self._bus_num)
+        try:
+            return getattr(self._bus, method)(*args)
+        except OSError as e:
+            logger.debug(f"I2C {method}{args} failed: {e}, reconnecting")
+            self._reconnect()
+            return getattr(self._bus, method)(*args)
+
+    def _cached(self, key, ttl: float, read):
+        now = time.monotonic()
+        hit = self._cache.get(key)
+        if hit is not None and hit[0] > now:
+            return hit[1]
+        value = read()
+        self._cache[key] = (now + ttl, value)
+        return value
+
+    def invalidate_cache(self):
+        self._cache.clear()
 
     @staticmethod
     def int_to_bcd(value: int) -> int:
@@ -36,13 +101,55 @@ class WittyPi:
     def weekday_conv(val: int) -> int:
         return (val + 1) % 7
 
-    def _write_bcd_data(self, start_register: int, values: list[int]):
-        for offset, val in enumerate(values):
-            self._bus.write_byte_data(8, start_register + offset, self.int_to_bcd(val))
-            time.sleep(1)
+    def _write_bcd_data(self, start_register: int, values: list[int], retries: int = 5, backoff: float = 0.01):
+        """
+        Write each register and read it back. Only a mismatch waits, starting
+        at backoff seconds and doubling per retry; raises IOError if the value
+        never sticks.
+        """
+        try:
+            for offset, val in enumerate(values):
+                register = start_register + offset
+                expected = self.int_to_bcd(val)
+                for attempt in range(retries + 1):
+                    self._call("write_byte_data", I2C_ADDR, register, expected)
+                    actual = self._call("read_byte_data", I2C_ADDR, register)
+                    if actual == expected:
+                        break
+                    logger.debug(f"Register {register} read back {actual:#04x}, expected {expected:#04x} (attempt {attempt + 1})")
+                    time.sleep(backoff * (2 ** attempt))
+                else:
+                    raise IOError(f"WittyPi register {register} did not accept {expected:#04x}")
+        finally:
+            self.invalidate_cache()
+
+    def _read_block(self, start_register: int, count: int) -> list[int]:
+        """
+        Read a register range in one transaction. A failed block read falls
+        back to byte reads for that call; block reads are only given up for
+        good after BLOCK_READ_FAILURES failures in a row, so a transient bus
+        error does not disable them.
+        """
+        if self._block_reads:
+            try:
+                values = self._call("read_i2c_block_data", I2C_ADDR, start_register, count)
+                self._block_failures = 0
+                return values
+            except OSError as e:
+                self._block_failures += 1
+                if self._block_failures >= BLOCK_READ_FAILURES:
+                    logger.warning(f"Block read failed {self._block_failures} times in a row ({e}), using byte reads")
+                    self._block_reads = False
+                else:
+                    logger.debug(f"Block read failed ({e}), reading bytes this time")
+        return [self._call("read_byte_data", I2C_ADDR, start_register + i) for i in range(count)]
 
     def _read_bcd_data(self, start_register: int, count: int) -> list[int]:
-        return [self.bcd_to_int(self._bus.read_byte_data(8, start_register + i)) for i in range(count)]
+        return [self.bcd_to_int(v) for v in self._read_block(start_register, count)]
+
+    def _read_schedule(self, start_register: int, count: int) -> list[int]:
+        return self._cached(("bcd", start_register, count), self.schedule_ttl,
+                            lambda: self._read_bcd_data(start_register, count))
 
     def get_current_time(self) -> datetime:
         try:
@@ -100,8 +207,8 @@ class WittyPi:
             self.weekday_conv(shutdown_time.weekday())
         ]
         self._write_bcd_data(32, shutdown_values)
-        status = self.bcd_to_int(self._bus.read_byte_data(8, 40))
-        scheduled = self._read_bcd_data(32, 5)
+        status = self.bcd_to_int(self._call("read_byte_data", I2C_ADDR, 40))
+        scheduled = self._read_schedule(32, 5)
         dt = datetime(shutdown_time.year, shutdown_time.month, scheduled[3], scheduled[2], scheduled[1], scheduled[0])
         logger.debug(f"Shutdown time scheduled at {dt}. Status: {'Triggered' if status else 'Not Triggered'}")
 
@@ -114,8 +221,8 @@ class WittyPi:
             self.weekday_conv(startup_time.weekday())
         ]
         self._write_bcd_data(27, startup_values)
-        status = self.bcd_to_int(self._bus.read_byte_data(8, 39))
-        scheduled = self._read_bcd_data(27, 5)
+        status = self.bcd_to_int(self._call("read_byte_data", I2C_ADDR, 39))
+        scheduled = self._read_schedule(27, 5)
         dt = datetime(startup_time.year, startup_time.month, scheduled[3], scheduled[2], scheduled[1], scheduled[0])
         logger.debug(f"Startup time scheduled at {dt}. Status: {'Triggered' if status else 'Not Triggered'}")
 
@@ -137,9 +244,13 @@ class WittyPi:
     def get_internal_temperature(self) -> dict:
         """
         Reads the internal temperature from the WittyPi and returns it as a dict.
-        The dict contains both Celsius and Fahrenheit values.
+        The dict contains both Celsius and Fahrenheit values. Readings are
+        reused for temp_ttl seconds.
         """
-        temp_c = self._bus.read_byte_data(8, 50)
+        return self._cached("temp", self.temp_ttl, self._read_internal_temperature)
+
+    def _read_internal_temperature(self) -> dict:
+        temp_c = self._call("read_byte_data", I2C_ADDR, 50)
         temp_f = temp_c * (9 / 5) + 32
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
@@ -181,7 +292,34 @@ class WittyPi:
 
         return self.get_current_time()
 
-    def apply_scheduling(self, config: Config, disp=None):
+    @classmethod
+    def apply_scheduling_async(cls, config: Config, disp=None, bus_num: int = 1, bus_manager=None) -> threading.Thread:
+        """
+        Apply the schedule on a background thread with its own bus handle, so
+        callers can start imaging straight away. Returns the started thread.
+        disp must be safe to use from another thread (Display locks itself).
+        """
+        def worker():
+            start = time.monotonic()
+            try:
+                with cls(bus_num, bus_manager=bus_manager) as wp:
+                    applied = wp.apply_scheduling(config, disp)
+            except Exception as e:
+                logger.warning(f"Could not apply WittyPi scheduling: {e}")
+                return
+            if applied:
+                logger.info(f"Scheduling applied in {time.monotonic() - start:.2f}s")
+            else:
+                logger.warning(f"Scheduling not applied (gave up after {time.monotonic() - start:.2f}s)")
+
+        thread = threading.Thread(target=worker, name="wittypi-schedule", daemon=True)
+        thread.start()
+        return thread
+
+    def apply_scheduling(self, config: Config, disp=None) -> bool:
+        """
+        Program the startup/shutdown times. Returns False if that failed.
+        """
         try:
             if config.getboolean('scheduling', 'sun_sched'):
                 logger.debug('Using sunrise/sunset schedule')
@@ -203,4 +341,6 @@ class WittyPi:
 
                 self.shutdown_startup(start_dt, stop_dt, start_dt)
         except Exception as e:
-            logger.warning(f"Failed to apply scheduling: {e}")
\ No newline at end of file
+            logger.warning(f"Failed to apply scheduling: {e}")
+            return False
+        return True
\ No newline at end of file